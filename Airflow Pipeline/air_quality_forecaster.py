@@ -8,22 +8,35 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error
 from sklearn.preprocessing import StandardScaler
 import xgboost as xgb
 import lightgbm as lgb
+from feature_builder import LatestFeatureBuilder, TIME_FEATURES, time_feature_frame
+from satellite_cube import SatelliteFeatureCube
+from out_of_core import FeaturePartitionStore, OutOfCoreTrainer
+from backtest import RollingOriginBacktester
+from aqi import aqi_frame, aqi_category, composite_aqi, rows_to_table_units
 import warnings
 warnings.filterwarnings('ignore')
 
+MODEL_FAMILIES = {'rf': 'Random Forest', 'xgb': 'XGBoost', 'lgb': 'LightGBM'}
+
+# Lead times (hours) stacked into the multi-horizon training set
+MULTI_HORIZONS = [1, 6, 12, 24, 48, 72, 96, 120, 144, 168]
+
 class AirQualityForecaster:
     """
     Comprehensive Air Quality Forecasting System
     Implements multiple modeling approaches with time-series aware training
     """
     
-    def __init__(self, db_config):
+    def __init__(self, db_config, satellite_cube=None):
         self.db_config = db_config
         self.conn = None
         self.models = {}
         self.scalers = {}
         self.feature_importance = {}
         self.training_features = {}  # Store feature names used during training
+        self.horizon_ranges = {}  # Lead-time range learned by each multi-horizon model
+        self.satellite_cube = satellite_cube or SatelliteFeatureCube()
+        self.feature_builder = LatestFeatureBuilder(self)
         
     def connect_db(self):
         """Connect to PostgreSQL database"""
@@ -266,6 +279,10 @@ class AirQualityForecaster:
         if not fire_df.empty:
             station_wide = self._add_fire_proximity(station_wide, fire_df)
         
+        # Satellite columns come from the gridded cube (index lookup per station-hour);
+        # fetched rows only fill gaps, the shared cube is left untouched
+        station_wide = self.satellite_cube.sample_frame(station_wide, fallback=sat_data)
+        
         print(f"✓ Engineered features: {station_wide.shape[1]} columns")
         return station_wide
     
@@ -400,6 +417,193 @@ class AirQualityForecaster:
         print(f"  Target: {target_col}")
         return X, y_dict, metadata, feature_cols
     
+    def prepare_design_matrix(self, df):
+        """
+        Build the float feature matrix once for every pollutant and horizon.
+        Same columns and fill as prepare_training_data; rows are selected
+        per target through the y_dict indexes, so X is shared read-only.
+        """
+        exclude_cols = ['datetime_utc', 'location_id', 'location_name', 'city',
+                       'latitude', 'longitude']
+        
+        feature_cols = [col for col in df.columns if col not in exclude_cols and df[col].dtype in ['float64', 'int64']]
+        X = df[feature_cols].fillna(0)
+        
+        print(f"✓ Prepared shared design matrix: {X.shape[0]} rows, {X.shape[1]} features")
+        return X, feature_cols
+    
+    def prepare_targets(self, df, target_col, horizons=[1, 6, 24], grouped=None):
+        """
+        Target vectors for one pollutant over the shared design matrix,
+        keeping the same rows prepare_training_data would
+        """
+        grouped = grouped if grouped is not None else df.groupby('location_id')
+        targets = {h: grouped[target_col].shift(-h) for h in horizons}
+        
+        keep = df[target_col].notna()
+        keep &= np.logical_or.reduce([t.notna().to_numpy() for t in targets.values()])
+        
+        if keep.sum() < 20:
+            raise ValueError(f"Insufficient data after cleaning: only {keep.sum()} samples. Need at least 20.")
+        
+        return {h: t[keep & t.notna()] for h, t in targets.items()}
+    
+    def train_pollutants(self, feature_df, pollutants, horizons=[1, 6, 24], multi_horizons=MULTI_HORIZONS):
+        """
+        Train every pollutant from one shared design matrix; only the
+        target vectors differ between pollutants. Also fits one
+        multi-horizon model per pollutant unless multi_horizons is None.
+        Returns the pollutants that trained successfully.
+        """
+        X, feature_cols = self.prepare_design_matrix(feature_df)
+        grouped = feature_df.groupby('location_id')
+        trained = []
+        
+        for pollutant in pollutants:
+            print(f"\n{'='*60}")
+            print(f"Training models for {pollutant}")
+            print(f"{'='*60}")
+            
+            try:
+                y_dict = self.prepare_targets(feature_df, pollutant, horizons, grouped)
+                self.time_series_split_train(
+                    X, y_dict, feature_cols,
+                    target_name=pollutant,
+                    horizons=horizons
+                )
+                if multi_horizons:
+                    self.train_multi_horizon(
+                        X, feature_df, pollutant, multi_horizons, grouped
+                    )
+                trained.append(pollutant)
+            except Exception as e:
+                print(f"⚠ Could not train models for {pollutant}: {e}")
+                continue
+        
+        return trained
+    
+    def train_multi_horizon(self, X, feature_df, target_col, horizons=MULTI_HORIZONS,
+                            grouped=None, max_rows_per_horizon=50000):
+        """
+        Train one model per pollutant with the lead time as an input
+        ('horizon_h'), so any trajectory comes from a single predict.
+        Rows of the shared design matrix are stacked once per horizon
+        (sampled down to max_rows_per_horizon), given the calendar features
+        of their target hour and split chronologically.
+        """
+        grouped = grouped if grouped is not None else feature_df.groupby('location_id')
+        has_value = feature_df[target_col].notna()
+        origin_times = pd.to_datetime(feature_df['datetime_utc'])
+        rng = np.random.default_rng(42)
+        
+        blocks, targets, leads = [], [], []
+        for h in horizons:
+            y = grouped[target_col].shift(-h)[has_value].dropna()
+            if len(y) > max_rows_per_horizon:
+                y = y.iloc[np.sort(rng.choice(len(y), max_rows_per_horizon, replace=False))]
+            blocks.append(y.index.to_numpy())
+            targets.append(y.to_numpy())
+            leads.append(np.full(len(y), h))
+        
+        rows = np.concatenate(blocks)
+        y_all = np.concatenate(targets)
+        lead = np.concatenate(leads)
+        
+        X_all = X.loc[rows].reset_index(drop=True)
+        X_all['horizon_h'] = lead
+        
+        # Calendar features describe the target hour, as in multi_horizon_matrix
+        origin = origin_times.loc[rows].to_numpy()
+        target_time = origin + lead.astype('timedelta64[h]')
+        calendar = time_feature_frame(target_time)
+        for col in TIME_FEATURES:
+            if col in X_all.columns:
+                X_all[col] = calendar[col].to_numpy()
+        
+        # Validate on the latest origins; train only on targets observed before them
+        cutoff = np.datetime64(int(np.quantile(origin.astype('datetime64[ns]').astype(np.int64), 0.8)), 'ns')
+        train_mask = target_time < cutoff
+        val_mask = origin >= cutoff
+        
+        if train_mask.sum() < 20 or val_mask.sum() < 1:
+            print(f"  ⚠ Insufficient data for the {target_col} multi-horizon model. Skipping.")
+            return None
+        
+        X_train, y_train = X_all[train_mask], y_all[train_mask]
+        X_val, y_val = X_all[val_mask], y_all[val_mask]
+        print(f"\n→ Training multi-horizon {target_col} model ({min(horizons)}-{max(horizons)}h)")
+        print(f"  Training samples: {len(X_train)}, Validation samples: {len(X_val)}")
+        
+        model_key = f'{target_col}_multi'
+        models, results = {}, {}
+        for model_name, model in self.make_estimators().items():
+            print(f"  Training {MODEL_FAMILIES[model_name]} for all horizons...")
+            model.fit(X_train, y_train)
+            pred = model.predict(X_val)
+            models[model_name] = model
+            results[model_name] = {
+                'rmse': np.sqrt(mean_squared_error(y_val, pred)),
+                'mae': mean_absolute_error(y_val, pred),
+                'predictions': pred
+            }
+        
+        self.models[model_key] = models
+        self.scalers[model_key] = StandardScaler().fit(X_train)
+        self.training_features[model_key] = list(X_train.columns)
+        self.horizon_ranges[model_key] = (min(horizons), max(horizons))
+        
+        best_model_name = min(results.keys(), key=lambda k: results[k]['rmse'])
+        self.feature_importance[model_key] = dict(
+            zip(X_train.columns, models[best_model_name].feature_importances_)
+        )
+        
+        ensemble = np.mean([r['predictions'] for r in results.values()], axis=0)
+        val_lead = X_val['horizon_h'].to_numpy()
+        print(f"\n  Results for {target_col} multi-horizon model:")
+        for model_name, metrics in results.items():
+            print(f"    {model_name.upper()}: RMSE={metrics['rmse']:.2f}, MAE={metrics['mae']:.2f}")
+        for h in horizons:
+            at_h = val_lead == h
+            if at_h.any():
+                print(f"    Ensemble RMSE at {h}h: {np.sqrt(mean_squared_error(y_val[at_h], ensemble[at_h])):.2f}")
+        
+        return results
+    
+    def make_estimators(self, n_jobs=-1):
+        """
+        Fresh, unfitted ensemble members (Random Forest, XGBoost, LightGBM)
+        """
+        return {
+            'rf': RandomForestRegressor(
+                n_estimators=100,
+                max_depth=20,
+                min_samples_split=10,
+                min_samples_leaf=5,
+                random_state=42,
+                n_jobs=n_jobs
+            ),
+            'xgb': xgb.XGBRegressor(
+                n_estimators=100,
+                max_depth=6,
+                learning_rate=0.1,
+                subsample=0.8,
+                colsample_bytree=0.8,
+                random_state=42,
+                n_jobs=n_jobs
+            ),
+            'lgb': lgb.LGBMRegressor(
+                n_estimators=100,
+                max_depth=6,
+                learning_rate=0.1,
+                num_leaves=31,
+                subsample=0.8,
+                colsample_bytree=0.8,
+                random_state=42,
+                n_jobs=n_jobs,
+                verbose=-1
+            )
+        }
+    
     def train_models(self, X_train, y_train, X_val, y_val, horizon, target_name='pm25'):
         """
         Train multiple models for a specific forecast horizon
@@ -417,69 +621,17 @@ class AirQualityForecaster:
         # Store feature names for later alignment
         self.training_features[f'{target_name}_{horizon}h'] = list(X_train.columns)
         
-        # 1. Random Forest
-        print(f"  Training Random Forest for {horizon}h horizon...")
-        rf = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=20,
-            min_samples_split=10,
-            min_samples_leaf=5,
-            random_state=42,
-            n_jobs=-1
-        )
-        rf.fit(X_train, y_train)
-        rf_pred = rf.predict(X_val)
-        
-        models['rf'] = rf
-        results['rf'] = {
-            'rmse': np.sqrt(mean_squared_error(y_val, rf_pred)),
-            'mae': mean_absolute_error(y_val, rf_pred),
-            'predictions': rf_pred
-        }
-        
-        # 2. XGBoost
-        print(f"  Training XGBoost for {horizon}h horizon...")
-        xgb_model = xgb.XGBRegressor(
-            n_estimators=100,
-            max_depth=6,
-            learning_rate=0.1,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            random_state=42,
-            n_jobs=-1
-        )
-        xgb_model.fit(X_train, y_train)
-        xgb_pred = xgb_model.predict(X_val)
-        
-        models['xgb'] = xgb_model
-        results['xgb'] = {
-            'rmse': np.sqrt(mean_squared_error(y_val, xgb_pred)),
-            'mae': mean_absolute_error(y_val, xgb_pred),
-            'predictions': xgb_pred
-        }
-        
-        # 3. LightGBM
-        print(f"  Training LightGBM for {horizon}h horizon...")
-        lgb_model = lgb.LGBMRegressor(
-            n_estimators=100,
-            max_depth=6,
-            learning_rate=0.1,
-            num_leaves=31,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            random_state=42,
-            n_jobs=-1,
-            verbose=-1
-        )
-        lgb_model.fit(X_train, y_train)
-        lgb_pred = lgb_model.predict(X_val)
-        
-        models['lgb'] = lgb_model
-        results['lgb'] = {
-            'rmse': np.sqrt(mean_squared_error(y_val, lgb_pred)),
-            'mae': mean_absolute_error(y_val, lgb_pred),
-            'predictions': lgb_pred
-        }
+        for model_name, model in self.make_estimators().items():
+            print(f"  Training {MODEL_FAMILIES[model_name]} for {horizon}h horizon...")
+            model.fit(X_train, y_train)
+            pred = model.predict(X_val)
+            
+            models[model_name] = model
+            results[model_name] = {
+                'rmse': np.sqrt(mean_squared_error(y_val, pred)),
+                'mae': mean_absolute_error(y_val, pred),
+                'predictions': pred
+            }
         
         # Store feature importance from best model
         best_model_name = min(results.keys(), key=lambda k: results[k]['rmse'])
@@ -542,53 +694,150 @@ class AirQualityForecaster:
         
         return all_results
     
-    def calculate_aqi(self, pollutants):
+    def build_partition_store(self, start_date, end_date, pollutants, horizons=[1, 6, 24],
+                              partition_days=30, store_dir=None):
+        """
+        Engineer features window by window and write them to an on-disk
+        partition store, so only one window is ever held in memory
+        """
+        store = FeaturePartitionStore(
+            **({'root_dir': store_dir} if store_dir else {}),
+            pollutants=pollutants, horizons=horizons, reset=True
+        )
+        # Padding keeps lags and future targets complete at window edges
+        pad = timedelta(days=2)
+        window_start = start_date
+
+        while window_start < end_date:
+            window_end = min(window_start + timedelta(days=partition_days), end_date)
+            print(f"\n→ Building partition {window_start.date()} to {window_end.date()}")
+
+            station_df = self.fetch_station_data(window_start - pad, window_end + pad)
+            if not station_df.empty:
+                feature_df = self.engineer_features(
+                    station_df,
+                    self.fetch_meteorological_data(window_start - pad, window_end + pad),
+                    self.fetch_satellite_data(window_start - pad, window_end + pad),
+                    self.fetch_pblh_data(window_start - pad, window_end + pad),
+                    self.fetch_fire_data(window_start - pad, window_end + pad)
+                )
+                rows = store.write_partition(feature_df, keep_from=window_start, keep_until=window_end)
+                print(f"✓ Wrote {rows} rows")
+                del feature_df
+            del station_df
+            window_start = window_end
+
+        return store
+
+    def train_out_of_core(self, start_date, end_date, pollutants, horizons=[1, 6, 24],
+                          partition_days=30, memory_limit_mb=2048, store_dir=None):
+        """
+        Train on long histories with bounded memory: features are streamed
+        from disk partitions into the boosting libraries' native datasets
+        and the RandomForest is fit on a sample sized to memory_limit_mb
+        """
+        store = self.build_partition_store(
+            start_date, end_date, pollutants, horizons, partition_days, store_dir
+        )
+        if not store.partitions:
+            raise ValueError("No training data in the requested period")
+
+        trainer = OutOfCoreTrainer(store, memory_limit_mb=memory_limit_mb)
+        all_results = {}
+
+        for pollutant in pollutants:
+            for horizon in horizons:
+                model_key = f'{pollutant}_{horizon}h'
+                print(f"\n→ Training {model_key} out-of-core")
+
+                trained = trainer.train(pollutant, horizon)
+                if trained is None:
+                    continue
+                models, results, scaler = trained
+
+                self.models[model_key] = models
+                self.scalers[model_key] = scaler
+                self.training_features[model_key] = list(store.feature_cols)
+
+                best_model_name = min(results.keys(), key=lambda k: results[k]['rmse'])
+                self.feature_importance[model_key] = dict(
+                    zip(store.feature_cols, models[best_model_name].feature_importances_)
+                )
+                all_results[model_key] = results
+
+                for model_name, metrics in results.items():
+                    print(f"    {model_name.upper()}: RMSE={metrics['rmse']:.2f}, MAE={metrics['mae']:.2f}")
+
+        return all_results
+    
+    def backtest(self, feature_df, target_col='pm25', horizons=[1, 6, 24], n_folds=5,
+                 max_workers=None, families=None):
+        """
+        Rolling-origin backtest of every model family for one pollutant,
+        reporting per-fold accuracy next to training time and inference cost
+        """
+        X, feature_cols = self.prepare_design_matrix(feature_df)
+        y_dict = self.prepare_targets(feature_df, target_col, horizons)
+        backtester = RollingOriginBacktester(self, n_folds=n_folds, max_workers=max_workers)
+        
+        reports = {}
+        for horizon in horizons:
+            reports[f'{horizon}h'] = backtester.run(
+                X, y_dict[horizon], feature_df['datetime_utc'], feature_cols,
+                target_name=target_col, horizon=horizon, families=families
+            )
+        return reports
+    
+    def calculate_aqi(self, pollutants, units=None):
         """
         Calculate AQI from pollutant concentrations (US EPA standard)
+        Accepts any of PM2.5, PM10, O3, NO2, CO and SO2 keyed by parameter name
+        """
+        return composite_aqi(pollutants, units)
+    
+    def multi_horizon_matrix(self, snapshot, pollutant, lead_hours):
+        """
+        Model input for a whole trajectory from the pollutant's
+        multi-horizon model: one row per lead time, with calendar features
+        of the target hour. Returns (model_key, X_new), or None when no
+        multi-horizon model is trained.
         """
-        def calculate_individual_aqi(conc, breakpoints):
-            for bp_low, bp_high, aqi_low, aqi_high in breakpoints:
-                if bp_low <= conc <= bp_high:
-                    return ((aqi_high - aqi_low) / (bp_high - bp_low)) * (conc - bp_low) + aqi_low
+        model_key = f'{pollutant}_multi'
+        training_features = self.training_features.get(model_key)
+        if model_key not in self.models or not training_features:
             return None
         
-        # US EPA breakpoints
-        pm25_bp = [
-            (0.0, 12.0, 0, 50),
-            (12.1, 35.4, 51, 100),
-            (35.5, 55.4, 101, 150),
-            (55.5, 150.4, 151, 200),
-            (150.5, 250.4, 201, 300),
-            (250.5, 500.0, 301, 500)
-        ]
-        
-        pm10_bp = [
-            (0, 54, 0, 50),
-            (55, 154, 51, 100),
-            (155, 254, 101, 150),
-            (255, 354, 151, 200),
-            (355, 424, 201, 300),
-            (425, 604, 301, 500)
-        ]
-        
-        aqi_values = []
-        
-        if 'pm25' in pollutants:
-            pm25_aqi = calculate_individual_aqi(pollutants['pm25'], pm25_bp)
-            if pm25_aqi: aqi_values.append(pm25_aqi)
-        
-        if 'pm10' in pollutants:
-            pm10_aqi = calculate_individual_aqi(pollutants['pm10'], pm10_bp)
-            if pm10_aqi: aqi_values.append(pm10_aqi)
-        
-        return max(aqi_values) if aqi_values else None
+        lead = np.asarray(lead_hours, dtype=float)
+        forecast_times = [snapshot['latest_time'] + timedelta(hours=float(h)) for h in lead]
+        X_new = self.feature_builder.build_matrix(snapshot, training_features, forecast_times)
+        
+        # Trees cannot extrapolate past the lead times they were trained on
+        low, high = self.horizon_ranges.get(model_key, (lead.min(), lead.max()))
+        X_new['horizon_h'] = np.clip(lead, low, high)
+        return model_key, X_new
+    
+    def predict_trajectory(self, snapshot, pollutant, lead_hours):
+        """
+        Forecast every lead time in one batched predict per ensemble member.
+        Returns the predict_with_uncertainty dict, or None without a
+        multi-horizon model.
+        """
+        matrix = self.multi_horizon_matrix(snapshot, pollutant, lead_hours)
+        if matrix is None:
+            return None
+        model_key, X_new = matrix
+        return self.predict_model_key(model_key, X_new)
     
     def predict_with_uncertainty(self, X_new, target_name='pm25', horizon=24):
         """
         Generate predictions with uncertainty bands using ensemble
         """
-        model_key = f'{target_name}_{horizon}h'
-        
+        return self.predict_model_key(f'{target_name}_{horizon}h', X_new)
+    
+    def predict_model_key(self, model_key, X_new):
+        """
+        Ensemble mean, spread and 95% band from the models stored under model_key
+        """
         if model_key not in self.models:
             raise ValueError(f"Model for {model_key} not trained")
         
@@ -626,203 +875,96 @@ class AirQualityForecaster:
         """
         print(f"\nGenerating AQI forecast for {city_name}...")
         
-        # Fetch recent data for the city
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
+        snapshot = self.feature_builder.get(city_name)
         
-        query = """
-        SELECT 
-            datetime_utc,
-            latitude,
-            longitude,
-            city,
-            parameter_name,
-            value,
-            location_name,
-            location_id
-        FROM air_quality_data
-        WHERE city ILIKE %s
-        AND datetime_utc >= %s
-        ORDER BY datetime_utc DESC
-        LIMIT 1000
-        """
-        
-        station_df = pd.read_sql(query, self.conn, params=[f'%{city_name}%', start_date])
-        
-        if station_df.empty:
+        if snapshot is None:
             print(f"No data found for city: {city_name}")
             return None
         
-        # Get the most recent complete observation
-        latest_time = station_df['datetime_utc'].max()
-        latest_data = station_df[station_df['datetime_utc'] == latest_time]
-        
-        # Pivot to get all pollutants
-        latest_pivot = latest_data.pivot_table(
-            index=['datetime_utc', 'latitude', 'longitude', 'location_id', 'city'],
-            columns='parameter_name',
-            values='value',
-            aggfunc='mean'
-        ).reset_index()
-        
-        lat = float(latest_pivot['latitude'].iloc[0])
-        lon = float(latest_pivot['longitude'].iloc[0])
-        location = latest_pivot['location_id'].iloc[0] if 'location_id' in latest_pivot else 'N/A'
+        latest_time = snapshot['latest_time']
+        lat = snapshot['latitude']
+        lon = snapshot['longitude']
+        location = snapshot['location_id']
         
         # Get current AQI
         current_pollutants = {}
         for pol in ['PM10', 'PM2.5', 'PM25']:
-            if pol in latest_pivot.columns:
-                current_pollutants[pol.lower().replace('.', '')] = latest_pivot[pol].iloc[0]
+            if pol in snapshot['pollutants']:
+                current_pollutants[pol.lower().replace('.', '')] = snapshot['pollutants'][pol]
         
         current_aqi = self.calculate_aqi(current_pollutants) if current_pollutants else None
         
-        # Prepare features for forecasting
-        latest_pivot['datetime_utc'] = pd.to_datetime(latest_pivot['datetime_utc'])
-        latest_pivot['hour'] = latest_pivot['datetime_utc'].dt.hour
-        latest_pivot['day_of_week'] = latest_pivot['datetime_utc'].dt.dayofweek
-        latest_pivot['month'] = latest_pivot['datetime_utc'].dt.month
-        latest_pivot['is_weekend'] = latest_pivot['day_of_week'].isin([5, 6]).astype(int)
-        latest_pivot['hour_sin'] = np.sin(2 * np.pi * latest_pivot['hour'] / 24)
-        latest_pivot['hour_cos'] = np.cos(2 * np.pi * latest_pivot['hour'] / 24)
-        
-        # Fetch and add meteorological features
-        met_query = """
-        SELECT 
-            granule_time_start as datetime,
-            variable_name,
-            variable_value
-        FROM merra2_slv_data
-        WHERE latitude BETWEEN %s AND %s
-        AND longitude BETWEEN %s AND %s
-        AND granule_time_start >= %s
-        ORDER BY granule_time_start DESC
-        LIMIT 100
-        """
-        
-        met_df = pd.read_sql(met_query, self.conn, 
-                            params=[lat-0.5, lat+0.5, lon-0.5, lon+0.5, start_date])
-        
-        if not met_df.empty:
-            met_latest = met_df.pivot_table(
-                index='datetime',
-                columns='variable_name',
-                values='variable_value',
-                aggfunc='mean'
-            )
-            if len(met_latest) > 0:
-                latest_met = met_latest.iloc[-1]
-                for var, val in latest_met.items():
-                    latest_pivot[var] = val
-        
-        # Add PBLH
-        pblh_query = """
-        SELECT 
-            timestamp as datetime,
-            pbl_height_m
-        FROM pblh_data
-        WHERE latitude BETWEEN %s AND %s
-        AND longitude BETWEEN %s AND %s
-        AND timestamp >= %s
-        ORDER BY timestamp DESC
-        LIMIT 50
-        """
-        
-        pblh_df = pd.read_sql(pblh_query, self.conn,
-                             params=[lat-0.5, lat+0.5, lon-0.5, lon+0.5, start_date])
-        
-        if not pblh_df.empty:
-            latest_pivot['pbl_height_m'] = pblh_df['pbl_height_m'].iloc[0]
-        else:
-            latest_pivot['pbl_height_m'] = 0
-        
-        latest_pivot['fire_count_50km'] = 0
-        latest_pivot['fire_frp_sum_50km'] = 0
-        latest_pivot = latest_pivot.fillna(0)
-        
         # Generate forecasts for 24h, 48h, 72h
         forecast_horizons = [24, 48, 72]
         aqi_forecasts = {}
         
         print(f"  Available trained models: {list(self.models.keys())}")
         
-        for target_horizon in forecast_horizons:
-            pollutant_forecasts = {}
+        # One batched prediction per pollutant covering every target horizon
+        horizon_predictions = {}
+        
+        for pollutant in ['PM10', 'PM2.5', 'PM25']:
+            if pollutant not in snapshot['pollutants']:
+                continue
             
-            # Try to forecast PM10 and PM2.5/PM25 for AQI calculation
-            for pollutant in ['PM10', 'PM2.5', 'PM25']:
-                if pollutant not in latest_pivot.columns:
-                    continue
-                
-                # Find the best available trained horizon (prefer 24h, then 6h, then 1h)
-                available_horizons = [24, 6, 1]
-                use_horizon = None
-                
-                for h in available_horizons:
-                    model_key = f'{pollutant}_{h}h'
-                    if model_key in self.models:
-                        use_horizon = h
-                        break
+            pol_key = pollutant.lower().replace('.', '')
+            
+            # Prefer the multi-horizon model: every lead time in one predict
+            try:
+                trajectory = self.predict_trajectory(snapshot, pollutant, forecast_horizons)
+            except Exception as e:
+                print(f"  ✗ Error predicting {pollutant} trajectory: {e}")
+                trajectory = None
+            
+            if trajectory is not None:
+                horizon_predictions[pol_key] = dict(zip(forecast_horizons, trajectory['mean']))
+                print(f"  Using model {pollutant}_multi for {pollutant} at {forecast_horizons}h")
+                continue
+            
+            # Otherwise fall back to the best single-horizon model (24h, then 6h, then 1h)
+            available_horizons = [24, 6, 1]
+            use_horizon = None
+            
+            for h in available_horizons:
+                model_key = f'{pollutant}_{h}h'
+                if model_key in self.models:
+                    use_horizon = h
+                    break
+            
+            if use_horizon is None:
+                print(f"  ⚠ No trained model found for {pollutant}")
+                continue
+            
+            model_key = f'{pollutant}_{use_horizon}h'
+            training_features = self.training_features.get(model_key, [])
+            
+            if not training_features:
+                print(f"  ⚠ No training features found for {model_key}")
+                continue
+            
+            try:
+                forecast_times = [latest_time + timedelta(hours=h) for h in forecast_horizons]
+                X_new = self.feature_builder.build_matrix(snapshot, training_features, forecast_times)
+                prediction = self.predict_with_uncertainty(X_new, pollutant, use_horizon)
                 
-                if use_horizon is None:
-                    print(f"  ⚠ No trained model found for {pollutant}")
-                    continue
+                # Apply persistence decay for longer horizons
+                horizons = np.array(forecast_horizons, dtype=float)
+                decay = np.where(horizons > use_horizon,
+                                 0.95 ** ((horizons - use_horizon) / use_horizon), 1.0)
                 
-                model_key = f'{pollutant}_{use_horizon}h'
-                print(f"  Using model {model_key} for {target_horizon}h forecast of {pollutant}")
+                horizon_predictions[pol_key] = dict(zip(forecast_horizons, prediction['mean'] * decay))
+                print(f"  Using model {model_key} for {pollutant} at {forecast_horizons}h")
                 
-                try:
-                    # Get the training features for this model
-                    training_features = self.training_features.get(model_key, [])
-                    
-                    if not training_features:
-                        print(f"  ⚠ No training features found for {model_key}")
-                        continue
-                    
-                    # Align features with training features
-                    X_new = pd.DataFrame()
-                    for feat in training_features:
-                        if feat in latest_pivot.columns:
-                            X_new[feat] = latest_pivot[feat]
-                        else:
-                            X_new[feat] = 0  # Fill missing features with 0
-                    
-                    # Update temporal features for target horizon
-                    forecast_time = latest_pivot['datetime_utc'].iloc[0] + timedelta(hours=target_horizon)
-                    if 'hour' in X_new.columns:
-                        X_new['hour'] = forecast_time.hour
-                    if 'day_of_week' in X_new.columns:
-                        X_new['day_of_week'] = forecast_time.dayofweek
-                    if 'is_weekend' in X_new.columns:
-                        X_new['is_weekend'] = int(forecast_time.dayofweek in [5, 6])
-                    if 'hour_sin' in X_new.columns:
-                        X_new['hour_sin'] = np.sin(2 * np.pi * forecast_time.hour / 24)
-                    if 'hour_cos' in X_new.columns:
-                        X_new['hour_cos'] = np.cos(2 * np.pi * forecast_time.hour / 24)
-                    
-                    # Get prediction
-                    prediction = self.predict_with_uncertainty(X_new, pollutant, use_horizon)
-                    
-                    # Apply persistence decay for longer horizons
-                    decay_factor = 1.0
-                    if target_horizon > use_horizon:
-                        # Gradually increase uncertainty for longer forecasts
-                        decay_factor = 0.95 ** ((target_horizon - use_horizon) / use_horizon)
-                    
-                    predicted_value = prediction['mean'][0] * decay_factor
-                    
-                    # Store with normalized key
-                    pol_key = pollutant.lower().replace('.', '').replace('25', '25')
-                    if pol_key == 'pm25':
-                        pol_key = 'pm25'  # Normalize PM2.5 to pm25
-                    
-                    pollutant_forecasts[pol_key] = predicted_value
-                    print(f"  ✓ Predicted {pollutant} for {target_horizon}h: {predicted_value:.2f}")
-                    
-                except Exception as e:
-                    print(f"  ✗ Error predicting {pollutant} for {target_horizon}h: {e}")
-                    import traceback
-                    traceback.print_exc()
+            except Exception as e:
+                print(f"  ✗ Error predicting {pollutant}: {e}")
+                import traceback
+                traceback.print_exc()
+        
+        for target_horizon in forecast_horizons:
+            pollutant_forecasts = {
+                pol_key: float(values[target_horizon])
+                for pol_key, values in horizon_predictions.items()
+            }
             
             if pollutant_forecasts:
                 aqi = self.calculate_aqi(pollutant_forecasts)
@@ -906,18 +1048,7 @@ class AirQualityForecaster:
     
     def _get_aqi_category(self, aqi):
         """Get AQI category from value"""
-        if aqi <= 50:
-            return "Good"
-        elif aqi <= 100:
-            return "Moderate"
-        elif aqi <= 150:
-            return "Unhealthy for Sensitive Groups"
-        elif aqi <= 200:
-            return "Unhealthy"
-        elif aqi <= 300:
-            return "Very Unhealthy"
-        else:
-            return "Hazardous"
+        return aqi_category(aqi)
     
     def _print_health_advisory(self, aqi):
         """Print health advisory based on AQI"""
@@ -962,52 +1093,43 @@ class AirQualityForecaster:
             print("No cities found")
             return
         
-        city_aqi_list = []
+        cities = cities_df.head(30)['city'].tolist()  # Limit to top 30 cities
         
-        for idx, row in cities_df.head(30).iterrows():  # Limit to top 30 cities
-            city = row['city']
-            
-            # Get latest data for this city
-            query = """
-            SELECT 
-                datetime_utc,
-                parameter_name,
-                value,
-                latitude,
-                longitude
+        # Latest observation of every city in one query
+        query = """
+        SELECT a.city, a.datetime_utc, a.parameter_name, a.value, a.units, a.latitude, a.longitude
+        FROM air_quality_data a
+        JOIN (
+            SELECT city, MAX(datetime_utc) AS latest_time
             FROM air_quality_data
-            WHERE city = %s
-            ORDER BY datetime_utc DESC
-            LIMIT 100
-            """
-            
-            df = pd.read_sql(query, self.conn, params=[city])
-            
-            if df.empty:
-                continue
-            
-            # Get most recent observation
-            latest_time = df['datetime_utc'].max()
-            latest = df[df['datetime_utc'] == latest_time]
-            
-            # Calculate AQI
-            pollutants = {}
-            for pol in ['PM10', 'PM2.5', 'PM25']:
-                pol_data = latest[latest['parameter_name'] == pol]
-                if not pol_data.empty:
-                    pollutants[pol.lower().replace('.', '')] = pol_data['value'].mean()
+            WHERE city = ANY(%s)
+            GROUP BY city
+        ) l ON a.city = l.city AND a.datetime_utc = l.latest_time
+        """
+        
+        df = pd.read_sql(query, self.conn, params=[cities])
+        
+        city_aqi_list = []
+        
+        if not df.empty:
+            # Each row converted with its own unit before readings are averaged
+            df['value'] = rows_to_table_units(df['parameter_name'], df['value'], df['units'])
+            readings = df.pivot_table(index='city', columns='parameter_name', values='value', aggfunc='mean')
+            aqi_df = aqi_frame(readings)
+            meta = df.groupby('city').agg(time=('datetime_utc', 'max'),
+                                          latitude=('latitude', 'first'),
+                                          longitude=('longitude', 'first'))
+            aqi_df = aqi_df.join(meta).dropna(subset=['aqi'])
             
-            if pollutants:
-                aqi = self.calculate_aqi(pollutants)
-                if aqi:
-                    city_aqi_list.append({
-                        'city': city,
-                        'aqi': aqi,
-                        'category': self._get_aqi_category(aqi),
-                        'time': latest_time,
-                        'latitude': latest['latitude'].iloc[0],
-                        'longitude': latest['longitude'].iloc[0]
-                    })
+            for city, row in aqi_df.iterrows():
+                city_aqi_list.append({
+                    'city': city,
+                    'aqi': row['aqi'],
+                    'category': self._get_aqi_category(row['aqi']),
+                    'time': row['time'],
+                    'latitude': row['latitude'],
+                    'longitude': row['longitude']
+                })
         
         # Sort by AQI (worst first)
         city_aqi_list.sort(key=lambda x: x['aqi'], reverse=True)
@@ -1111,8 +1233,10 @@ if __name__ == "__main__":
         print("1. Train new models (required for first time)")
         print("2. City forecast (requires trained models)")
         print("3. Train and then forecast")
+        print("4. Train on a long history out-of-core (bounded memory)")
+        print("5. Backtest model families (rolling-origin folds)")
         
-        choice = input("\nEnter your choice (1/2/3): ").strip()
+        choice = input("\nEnter your choice (1/2/3/4/5): ").strip()
         
         if choice in ['1', '3']:
             # Training mode
@@ -1140,35 +1264,40 @@ if __name__ == "__main__":
             
             print(f"\n📋 Available pollutants for training: {', '.join(available_pollutants)}")
             
-            # Train models for each pollutant
-            for pollutant in available_pollutants:
-                print(f"\n{'='*60}")
-                print(f"Training models for {pollutant}")
-                print(f"{'='*60}")
-                
-                try:
-                    # Prepare training data for multiple horizons
-                    print(f"\n📝 Preparing training data for {pollutant}...")
-                    X, y_dict, metadata, feature_cols = forecaster.prepare_training_data(
-                        feature_df.copy(), 
-                        target_col=pollutant,
-                        horizons=[1, 6, 24]
-                    )
-                    
-                    # Train models
-                    print(f"\n🚀 Training models for {pollutant}...")
-                    results = forecaster.time_series_split_train(
-                        X, y_dict, feature_cols,
-                        target_name=pollutant,
-                        horizons=[1, 6, 24]
-                    )
-                    
-                except Exception as e:
-                    print(f"⚠ Could not train models for {pollutant}: {e}")
-                    continue
+            # Train all pollutants from one shared design matrix
+            forecaster.train_pollutants(feature_df, available_pollutants, horizons=[1, 6, 24])
             
             print("\n✅ Model training complete!")
         
+        if choice == '4':
+            years = float(input("Years of history to train on [2]: ").strip() or 2)
+            memory_mb = int(input("Memory ceiling in MB [2048]: ").strip() or 2048)
+            
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=int(years * 365))
+            
+            print(f"\n📊 Streaming data from {start_date.date()} to {end_date.date()}")
+            forecaster.train_out_of_core(
+                start_date, end_date,
+                pollutants=['PM10', 'PM2.5', 'PM25', 'NO2', 'O3', 'CO', 'SO2'],
+                memory_limit_mb=memory_mb
+            )
+            print("\n✅ Out-of-core training complete!")
+        
+        if choice == '5':
+            pollutant = input("Pollutant to backtest [PM25]: ").strip() or 'PM25'
+            n_folds = int(input("Number of folds [5]: ").strip() or 5)
+            
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=90)
+            
+            backtester = RollingOriginBacktester(forecaster, n_folds=n_folds)
+            feature_df = backtester.cached_features(
+                start_date.replace(minute=0, second=0, microsecond=0),
+                end_date.replace(minute=0, second=0, microsecond=0)
+            )
+            forecaster.backtest(feature_df, target_col=pollutant, n_folds=n_folds)
+        
         if choice in ['2', '3']:
             # Interactive forecast mode
             if choice == '2' and not forecaster.models:
@@ -9,6 +9,7 @@ from contextlib import asynccontextmanager
 import pandas as pd
 import numpy as np
 import os
+import asyncio
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -20,6 +21,9 @@ from apscheduler.schedulers.background import BackgroundScheduler
 load_dotenv()
 
 from air_quality_forecaster import AirQualityForecaster
+from aqi import aqi_frame, aqi_category, pollutant_aqi, rows_to_table_units
+from nowcast import NowcastEngine
+from inference_queue import InferenceBatcher, summarize
 from llm_generator import ImprovedEnvironmentalQuerySystem
 
 # Pydantic models
@@ -217,11 +221,21 @@ DB_CONFIG = {
 # Global instances
 forecaster = None
 query_system = None
+nowcast_engine = None
+nowcast_scheduler = None
+nowcast_conn = None
+inference_batcher = None
+
+
+def sync_nowcast_engine():
+    """Fold newly inserted station readings into the in-memory nowcast state"""
+    if nowcast_engine and nowcast_conn:
+        nowcast_engine.sync(nowcast_conn)
 
 # MERGED LIFESPAN
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global forecaster, query_system
+    global forecaster, query_system, nowcast_engine, nowcast_scheduler, nowcast_conn, inference_batcher
     
     # Initialize forecaster
     print("Initializing Air Quality Forecaster...")
@@ -255,24 +269,7 @@ async def lifespan(app: FastAPI):
                 
                 print(f"Training models for: {', '.join(available_pollutants)}")
                 
-                for pollutant in available_pollutants:
-                    try:
-                        print(f"Training {pollutant} models...")
-                        X, y_dict, metadata, feature_cols = forecaster.prepare_training_data(
-                            feature_df.copy(), 
-                            target_col=pollutant,
-                            horizons=[1, 6, 24]
-                        )
-                        
-                        forecaster.time_series_split_train(
-                            X, y_dict, feature_cols,
-                            target_name=pollutant,
-                            horizons=[1, 6, 24]
-                        )
-                        print(f"✓ Trained {pollutant} models successfully")
-                    except Exception as e:
-                        print(f"⚠ Error training {pollutant}: {e}")
-                        continue
+                forecaster.train_pollutants(feature_df, available_pollutants, horizons=[1, 6, 24])
                 
                 print(f"✓ Auto-training complete: {len(forecaster.models)} models loaded")
             else:
@@ -283,6 +280,30 @@ async def lifespan(app: FastAPI):
     else:
         print("⚠ Warning: Forecaster connection failed")
     
+    # Batch concurrent model calls from the forecast endpoints
+    inference_batcher = InferenceBatcher(forecaster)
+    inference_batcher.start()
+    
+    # Initialize nowcast engine on its own connection so syncs never block requests
+    try:
+        nowcast_conn = psycopg2.connect(**DB_CONFIG)
+        nowcast_engine = NowcastEngine()
+        synced = nowcast_engine.sync(nowcast_conn)
+        print(f"✓ Nowcast engine warmed up with {synced} observations")
+        
+        nowcast_scheduler = BackgroundScheduler()
+        nowcast_scheduler.add_job(
+            func=sync_nowcast_engine,
+            trigger='interval',
+            minutes=1,
+            id='nowcast_sync',
+            replace_existing=True,
+            max_instances=1
+        )
+        nowcast_scheduler.start()
+    except Exception as e:
+        print(f"⚠ Warning: Nowcast engine initialization failed: {e}")
+    
     # Initialize query system
     try:
         query_system = ImprovedEnvironmentalQuerySystem(DB_CONFIG)
@@ -293,6 +314,12 @@ async def lifespan(app: FastAPI):
     yield
     
     # Cleanup
+    if inference_batcher:
+        inference_batcher.stop()
+    if nowcast_scheduler:
+        nowcast_scheduler.shutdown(wait=False)
+    if nowcast_conn:
+        nowcast_conn.close()
     if forecaster:
         forecaster.close()
         print("✓ Forecaster closed")
@@ -419,39 +446,48 @@ async def get_cities():
     try:
         cities_df = forecaster.get_available_cities()
         
+        # Last 10 readings of every city in one query, AQI computed column-wise
+        # (index scan per city on idx_air_quality_city_time, no full-table window)
+        query = """
+        SELECT c.city, r.parameter_name, r.value, r.units
+        FROM (
+            SELECT DISTINCT city
+            FROM air_quality_data
+            WHERE city IS NOT NULL AND city != ''
+        ) c
+        CROSS JOIN LATERAL (
+            SELECT parameter_name, value, units
+            FROM air_quality_data a
+            WHERE a.city = c.city
+            ORDER BY a.datetime_utc DESC
+            LIMIT 10
+        ) r
+        """
+        
+        city_aqi = pd.DataFrame(columns=['aqi'])
+        try:
+            recent_df = pd.read_sql(query, forecaster.conn)
+            if not recent_df.empty:
+                # Each row converted with its own unit before readings are averaged
+                recent_df['value'] = rows_to_table_units(recent_df['parameter_name'], recent_df['value'], recent_df['units'])
+                readings = recent_df.pivot_table(index='city', columns='parameter_name', values='value', aggfunc='mean')
+                city_aqi = aqi_frame(readings)
+        except Exception as e:
+            print(f"Error calculating city AQI: {e}")
+        
         cities_list = []
-        for _, row in cities_df.iterrows():
+        for city_name, record_count in zip(cities_df['city'], cities_df['record_count']):
             current_aqi = None
             category = None
             
-            try:
-                query = """
-                SELECT parameter_name, value
-                FROM air_quality_data
-                WHERE city = %s
-                ORDER BY datetime_utc DESC
-                LIMIT 10
-                """
-                aqi_df = pd.read_sql(query, forecaster.conn, params=[row['city']])
-                
-                if not aqi_df.empty:
-                    pollutants = {}
-                    for pol in ['PM10', 'PM2.5', 'PM25']:
-                        pol_data = aqi_df[aqi_df['parameter_name'] == pol]
-                        if not pol_data.empty:
-                            pollutants[pol.lower().replace('.', '')] = float(pol_data['value'].mean())
-                    
-                    if pollutants:
-                        aqi_value = forecaster.calculate_aqi(pollutants)
-                        if aqi_value:
-                            current_aqi = int(round(aqi_value))
-                            category = forecaster._get_aqi_category(current_aqi)
-            except Exception as e:
-                print(f"Error calculating AQI for {row['city']}: {e}")
+            aqi_value = city_aqi['aqi'].get(city_name)
+            if aqi_value is not None and pd.notna(aqi_value):
+                current_aqi = int(aqi_value)
+                category = aqi_category(current_aqi)
             
             cities_list.append(CityInfo(
-                city=row['city'],
-                record_count=int(row['record_count']),
+                city=city_name,
+                record_count=int(record_count),
                 current_aqi=current_aqi,
                 category=category
             ))
@@ -479,95 +515,77 @@ async def get_forecast(
         )
     
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
+        snapshot = forecaster.feature_builder.get(city)
         
-        query = """
-        SELECT datetime_utc, latitude, longitude, city, parameter_name, value, location_name, location_id
-        FROM air_quality_data
-        WHERE city ILIKE %s AND datetime_utc >= %s
-        ORDER BY datetime_utc DESC
-        LIMIT 1000
-        """
-        
-        station_df = pd.read_sql(query, forecaster.conn, params=[f'%{city}%', start_date])
-        
-        if station_df.empty:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail=f"No data found for city: {city}")
         
-        latest_time = station_df['datetime_utc'].max()
-        latest_data = station_df[station_df['datetime_utc'] == latest_time]
-        
-        latest_pivot = latest_data.pivot_table(
-            index=['datetime_utc', 'latitude', 'longitude', 'location_id', 'city', 'location_name'],
-            columns='parameter_name',
-            values='value',
-            aggfunc='mean'
-        ).reset_index()
-        
-        lat = float(latest_pivot['latitude'].iloc[0])
-        lon = float(latest_pivot['longitude'].iloc[0])
-        location_name = latest_pivot['location_name'].iloc[0] if 'location_name' in latest_pivot else 'Unknown'
-        
-        latest_pivot['datetime_utc'] = pd.to_datetime(latest_pivot['datetime_utc'])
-        latest_pivot['hour'] = latest_pivot['datetime_utc'].dt.hour
-        latest_pivot['day_of_week'] = latest_pivot['datetime_utc'].dt.dayofweek
-        latest_pivot['month'] = latest_pivot['datetime_utc'].dt.month
-        latest_pivot['is_weekend'] = latest_pivot['day_of_week'].isin([5, 6]).astype(int)
-        latest_pivot['hour_sin'] = np.sin(2 * np.pi * latest_pivot['hour'] / 24)
-        latest_pivot['hour_cos'] = np.cos(2 * np.pi * latest_pivot['hour'] / 24)
-        
-        met_query = """
-        SELECT granule_time_start as datetime, variable_name, variable_value
-        FROM merra2_slv_data
-        WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s
-        AND granule_time_start >= %s
-        ORDER BY granule_time_start DESC
-        LIMIT 100
-        """
-        
-        met_df = pd.read_sql(met_query, forecaster.conn, 
-                            params=[lat-0.5, lat+0.5, lon-0.5, lon+0.5, start_date])
-        
-        if not met_df.empty:
-            met_latest = met_df.pivot_table(
-                index='datetime',
-                columns='variable_name',
-                values='variable_value',
-                aggfunc='mean'
-            )
-            if len(met_latest) > 0:
-                latest_met = met_latest.iloc[-1]
-                for var, val in latest_met.items():
-                    latest_pivot[var] = val
-        
-        pblh_query = """
-        SELECT timestamp as datetime, pbl_height_m
-        FROM pblh_data
-        WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s
-        AND timestamp >= %s
-        ORDER BY timestamp DESC
-        LIMIT 50
-        """
+        latest_time = snapshot['latest_time']
+        lat = snapshot['latitude']
+        lon = snapshot['longitude']
+        location_name = snapshot['location_name']
+        temp = forecaster.feature_builder.temperature_f(snapshot)
         
-        pblh_df = pd.read_sql(pblh_query, forecaster.conn,
-                             params=[lat-0.5, lat+0.5, lon-0.5, lon+0.5, start_date])
+        forecast_horizons = [24 * i for i in range(days)]
+        forecast_times = [latest_time + timedelta(hours=h) for h in forecast_horizons]
         
-        if not pblh_df.empty:
-            latest_pivot['pbl_height_m'] = pblh_df['pbl_height_m'].iloc[0]
-        else:
-            latest_pivot['pbl_height_m'] = 0
+        # One batched prediction per pollutant covering every forecast day
+        daily_values = {}
         
-        latest_pivot['fire_count_50km'] = 0
-        latest_pivot['fire_frp_sum_50km'] = 0
-        latest_pivot = latest_pivot.fillna(0)
+        for pollutant in ['PM10', 'PM2.5', 'PM25']:
+            if pollutant not in snapshot['pollutants']:
+                continue
+            
+            # Multi-horizon model: the whole trajectory in one predict, no decay curve
+            multi = forecaster.multi_horizon_matrix(snapshot, pollutant, forecast_horizons)
+            if multi is not None:
+                try:
+                    model_key, X_new = multi
+                    values = summarize(await inference_batcher.predict(model_key, X_new))['mean']
+                    values[0] = snapshot['features'][pollutant]
+                    daily_values[pollutant] = values
+                    continue
+                except Exception as e:
+                    print(f"Error predicting {pollutant} trajectory: {e}")
+            
+            available_horizons = [24, 6, 1]
+            use_horizon = None
+            
+            for h in available_horizons:
+                model_key = f'{pollutant}_{h}h'
+                if model_key in forecaster.models:
+                    use_horizon = h
+                    break
+            
+            if use_horizon is None:
+                continue
+            
+            model_key = f'{pollutant}_{use_horizon}h'
+            training_features = forecaster.training_features.get(model_key, [])
+            
+            if not training_features:
+                continue
+            
+            try:
+                X_new = forecaster.feature_builder.build_matrix(snapshot, training_features, forecast_times)
+                prediction = await inference_batcher.predict_with_uncertainty(X_new, pollutant, use_horizon)
+                
+                horizons = np.array(forecast_horizons, dtype=float)
+                decay = np.where(horizons > use_horizon,
+                                 0.95 ** ((horizons - use_horizon) / use_horizon), 1.0)
+                values = prediction['mean'] * decay
+                
+                # Today is the latest observation, not a prediction
+                values[0] = snapshot['features'][pollutant]
+                daily_values[pollutant] = values
+                
+            except Exception as e:
+                print(f"Error predicting {pollutant}: {e}")
+                continue
         
         forecast_days = []
-        forecast_horizons = [24 * i for i in range(days)]
         
-        for day_offset, target_horizon in enumerate(forecast_horizons):
-            forecast_time = latest_time + timedelta(hours=target_horizon)
-            
+        for day_offset, forecast_time in enumerate(forecast_times):
             if day_offset == 0:
                 day_name = "Today"
             elif day_offset == 1:
@@ -578,72 +596,14 @@ async def get_forecast(
             pollutants_dict = {}
             pollutant_list = []
             
-            for pollutant in ['PM10', 'PM2.5', 'PM25']:
-                if pollutant not in latest_pivot.columns:
-                    continue
-                
-                available_horizons = [24, 6, 1]
-                use_horizon = None
-                
-                for h in available_horizons:
-                    model_key = f'{pollutant}_{h}h'
-                    if model_key in forecaster.models:
-                        use_horizon = h
-                        break
-                
-                if use_horizon is None:
-                    continue
-                
-                model_key = f'{pollutant}_{use_horizon}h'
-                training_features = forecaster.training_features.get(model_key, [])
-                
-                if not training_features:
-                    continue
-                
-                try:
-                    X_new = pd.DataFrame()
-                    for feat in training_features:
-                        if feat in latest_pivot.columns:
-                            X_new[feat] = latest_pivot[feat]
-                        else:
-                            X_new[feat] = 0
-                    
-                    if 'hour' in X_new.columns:
-                        X_new['hour'] = forecast_time.hour
-                    if 'day_of_week' in X_new.columns:
-                        X_new['day_of_week'] = forecast_time.dayofweek
-                    if 'is_weekend' in X_new.columns:
-                        X_new['is_weekend'] = int(forecast_time.dayofweek in [5, 6])
-                    if 'hour_sin' in X_new.columns:
-                        X_new['hour_sin'] = np.sin(2 * np.pi * forecast_time.hour / 24)
-                    if 'hour_cos' in X_new.columns:
-                        X_new['hour_cos'] = np.cos(2 * np.pi * forecast_time.hour / 24)
-                    
-                    prediction = forecaster.predict_with_uncertainty(X_new, pollutant, use_horizon)
-                    
-                    decay_factor = 1.0
-                    if target_horizon > use_horizon:
-                        decay_factor = 0.95 ** ((target_horizon - use_horizon) / use_horizon)
-                    
-                    predicted_value = prediction['mean'][0] * decay_factor
-                    
-                    if day_offset == 0:
-                        predicted_value = latest_pivot[pollutant].iloc[0]
-                    
-                    pol_key = pollutant.lower().replace('.', '').replace('25', '25')
-                    if pol_key == 'pm25':
-                        pol_key = 'pm25'
-                    
-                    pollutants_dict[pol_key] = predicted_value
-                    pollutant_list.append(PollutantData(
-                        name=pollutant,
-                        value=round(predicted_value, 2),
-                        unit="µg/m³"
-                    ))
-                    
-                except Exception as e:
-                    print(f"Error predicting {pollutant}: {e}")
-                    continue
+            for pollutant, values in daily_values.items():
+                predicted_value = float(values[day_offset])
+                pollutants_dict[pollutant.lower().replace('.', '')] = predicted_value
+                pollutant_list.append(PollutantData(
+                    name=pollutant,
+                    value=round(predicted_value, 2),
+                    unit="µg/m³"
+                ))
             
             if pollutants_dict:
                 aqi = forecaster.calculate_aqi(pollutants_dict)
@@ -653,7 +613,6 @@ async def get_forecast(
                     health_message = get_health_message(aqi)
                     color = get_aqi_color(aqi)
                     weather_icon = get_weather_icon(aqi)
-                    temp = 72 - day_offset * 2
                     
                     forecast_days.append(DayForecast(
                         date=forecast_time.strftime("%Y-%m-%d"),
@@ -943,7 +902,8 @@ async def get_monitoring_stations(city: str):
             longitude,
             datetime_utc,
             parameter_name,
-            value
+            value,
+            units
         FROM air_quality_data
         WHERE city ILIKE %s
         AND datetime_utc >= NOW() - INTERVAL '24 hours'
@@ -955,31 +915,26 @@ async def get_monitoring_stations(city: str):
         if df.empty:
             raise HTTPException(status_code=404, detail=f"No monitoring stations found for {city}")
         
-        # Group by station and get latest data
+        # Latest reading per station, AQI for every station in one pass
+        latest_times = df.groupby('station_id')['datetime_utc'].transform('max')
+        latest_df = df[df['datetime_utc'] == latest_times]
+        table_values = latest_df.assign(
+            value=rows_to_table_units(latest_df['parameter_name'], latest_df['value'], latest_df['units'])
+        )
+        readings = table_values.pivot_table(index='station_id', columns='parameter_name', values='value', aggfunc='mean')
+        station_aqi = aqi_frame(readings)['aqi']
+        
         stations = []
-        station_groups = df.groupby('station_id')
         
-        for station_id, station_data in station_groups:
-            # Get latest timestamp for this station
-            latest_time = station_data['datetime_utc'].max()
-            latest_data = station_data[station_data['datetime_utc'] == latest_time]
-            
-            # Calculate AQI from available pollutants
-            pollutants = {}
-            for pol in ['PM10', 'PM2.5', 'PM25']:
-                pol_data = latest_data[latest_data['parameter_name'] == pol]
-                if not pol_data.empty:
-                    pollutants[pol.lower().replace('.', '')] = float(pol_data['value'].mean())
+        for station_id, latest_data in latest_df.groupby('station_id'):
+            latest_time = latest_data['datetime_utc'].iloc[0]
+            aqi = station_aqi.get(station_id)
             
-            aqi = None
-            if pollutants:
-                aqi = forecaster.calculate_aqi(pollutants)
-            
-            if not aqi:
+            if aqi is None or pd.isna(aqi) or not aqi:
                 continue
             
-            aqi = int(round(aqi))
-            category = forecaster._get_aqi_category(aqi)
+            aqi = int(aqi)
+            category = aqi_category(aqi)
             color = get_aqi_color(aqi)
             
             # Determine network type from station name
@@ -1347,26 +1302,7 @@ async def train_models(days: int = Query(default=90, ge=30, le=180)):
         pollutant_cols = ['PM10', 'PM2.5', 'PM25', 'NO2', 'O3']
         available_pollutants = [col for col in pollutant_cols if col in feature_df.columns]
         
-        trained_models = []
-        
-        for pollutant in available_pollutants:
-            try:
-                X, y_dict, metadata, feature_cols = forecaster.prepare_training_data(
-                    feature_df.copy(), 
-                    target_col=pollutant,
-                    horizons=[1, 6, 24]
-                )
-                
-                forecaster.time_series_split_train(
-                    X, y_dict, feature_cols,
-                    target_name=pollutant,
-                    horizons=[1, 6, 24]
-                )
-                
-                trained_models.append(pollutant)
-            except Exception as e:
-                print(f"Error training {pollutant}: {e}")
-                continue
+        trained_models = forecaster.train_pollutants(feature_df, available_pollutants, horizons=[1, 6, 24])
         
         return {
             "status": "success",
@@ -1673,48 +1609,19 @@ async def get_ensemble_forecast(city: str, pollutant: str = "PM25"):
         raise HTTPException(status_code=503, detail="No trained models")
     
     try:
-        # Get recent data
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
-        
-        query = """
-        SELECT datetime_utc, latitude, longitude, city, parameter_name, value, location_name, location_id
-        FROM air_quality_data
-        WHERE city ILIKE %s AND datetime_utc >= %s
-        ORDER BY datetime_utc DESC
-        LIMIT 1000
-        """
-        
-        station_df = pd.read_sql(query, forecaster.conn, params=[f'%{city}%', start_date])
+        snapshot = forecaster.feature_builder.get(city)
         
-        if station_df.empty:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail=f"No data for {city}")
         
-        latest_time = station_df['datetime_utc'].max()
-        latest_data = station_df[station_df['datetime_utc'] == latest_time]
-        
-        latest_pivot = latest_data.pivot_table(
-            index=['datetime_utc', 'latitude', 'longitude', 'location_id', 'city', 'location_name'],
-            columns='parameter_name',
-            values='value',
-            aggfunc='mean'
-        ).reset_index()
-        
-        if pollutant not in latest_pivot.columns:
+        if pollutant not in snapshot['pollutants']:
             raise HTTPException(status_code=404, detail=f"No {pollutant} data")
         
-        # Prepare features
-        latest_pivot['datetime_utc'] = pd.to_datetime(latest_pivot['datetime_utc'])
-        latest_pivot['hour'] = latest_pivot['datetime_utc'].dt.hour
-        latest_pivot['day_of_week'] = latest_pivot['datetime_utc'].dt.dayofweek
-        latest_pivot['month'] = latest_pivot['datetime_utc'].dt.month
-        latest_pivot['is_weekend'] = latest_pivot['day_of_week'].isin([5, 6]).astype(int)
-        latest_pivot['hour_sin'] = np.sin(2 * np.pi * latest_pivot['hour'] / 24)
-        latest_pivot['hour_cos'] = np.cos(2 * np.pi * latest_pivot['hour'] / 24)
-        latest_pivot = latest_pivot.fillna(0)
+        latest_time = snapshot['latest_time']
         
         # Generate ensemble forecasts for 1, 6, 24 hours
         ensemble_forecasts = []
+        pending = []
         
         for horizon in [1, 6, 24]:
             model_key = f'{pollutant}_{horizon}h'
@@ -1725,21 +1632,16 @@ async def get_ensemble_forecast(city: str, pollutant: str = "PM25"):
             if not training_features:
                 continue
             
-            X_new = pd.DataFrame()
-            for feat in training_features:
-                X_new[feat] = latest_pivot[feat] if feat in latest_pivot.columns else 0
-            
             forecast_time = latest_time + timedelta(hours=horizon)
-            if 'hour' in X_new.columns:
-                X_new['hour'] = forecast_time.hour
-                X_new['hour_sin'] = np.sin(2 * np.pi * forecast_time.hour / 24)
-                X_new['hour_cos'] = np.cos(2 * np.pi * forecast_time.hour / 24)
-            
-            # Get predictions from all models in ensemble
-            predictions = []
-            for model_name, model in forecaster.models[model_key].items():
-                pred = model.predict(X_new)
-                predictions.append(pred[0])
+            X_new = forecaster.feature_builder.build_matrix(snapshot, training_features, [forecast_time])
+            pending.append((forecast_time, inference_batcher.predict(model_key, X_new)))
+        
+        # All horizons go through the inference queue together
+        results = await asyncio.gather(*[request for _, request in pending])
+        
+        for (forecast_time, _), per_model in zip(pending, results):
+            # Predictions from all models in ensemble
+            predictions = [pred[0] for pred in per_model.values()]
             
             predictions = np.array(predictions)
             mean_pred = predictions.mean()
@@ -2057,91 +1959,37 @@ async def get_wind_dispersion_forecast(city: str):
 async def get_nowcast(city: str):
     """
     0-6 hour ultra-short-term forecast (nowcast) for immediate planning
+    Served from the in-memory incremental nowcast state (no database or model calls)
     """
-    if not forecaster or not forecaster.conn:
-        raise HTTPException(status_code=503, detail="Forecaster not available")
-    
-    if not forecaster.models:
-        raise HTTPException(status_code=503, detail="No trained models")
+    if not nowcast_engine:
+        raise HTTPException(status_code=503, detail="Nowcast engine not available")
     
     try:
-        # Similar to regular forecast but only 1h and 6h horizons
-        end_date = datetime.now()
-        start_date = end_date - timedelta(hours=6)
+        results = nowcast_engine.city_nowcast(city, pollutants=['PM10', 'PM2.5', 'PM25'])
         
-        query = """
-        SELECT datetime_utc, latitude, longitude, city, parameter_name, value, location_name, location_id
-        FROM air_quality_data
-        WHERE city ILIKE %s AND datetime_utc >= %s
-        ORDER BY datetime_utc DESC
-        LIMIT 500
-        """
-        
-        station_df = pd.read_sql(query, forecaster.conn, params=[f'%{city}%', start_date])
+        # Only stations that reported within the last 6 hours
+        cutoff = datetime.now() - timedelta(hours=6)
+        results = {pol: r for pol, r in results.items() if r['base_time'] >= cutoff}
         
-        if station_df.empty:
+        if not results:
             raise HTTPException(status_code=404, detail=f"No recent data for {city}")
         
-        latest_time = station_df['datetime_utc'].max()
-        latest_data = station_df[station_df['datetime_utc'] == latest_time]
-        
-        latest_pivot = latest_data.pivot_table(
-            index=['datetime_utc', 'latitude', 'longitude', 'location_id', 'city', 'location_name'],
-            columns='parameter_name',
-            values='value',
-            aggfunc='mean'
-        ).reset_index()
-        
-        # Prepare features
-        latest_pivot['datetime_utc'] = pd.to_datetime(latest_pivot['datetime_utc'])
-        latest_pivot['hour'] = latest_pivot['datetime_utc'].dt.hour
-        latest_pivot['day_of_week'] = latest_pivot['datetime_utc'].dt.dayofweek
-        latest_pivot['month'] = latest_pivot['datetime_utc'].dt.month
-        latest_pivot['is_weekend'] = latest_pivot['day_of_week'].isin([5, 6]).astype(int)
-        latest_pivot['hour_sin'] = np.sin(2 * np.pi * latest_pivot['hour'] / 24)
-        latest_pivot['hour_cos'] = np.cos(2 * np.pi * latest_pivot['hour'] / 24)
-        latest_pivot = latest_pivot.fillna(0)
-        
+        latest_time = max(r['base_time'] for r in results.values())
         nowcasts = []
         
-        for horizon in [1, 6]:  # 1 hour and 6 hours only
-            for pollutant in ['PM10', 'PM2.5', 'PM25']:
-                if pollutant not in latest_pivot.columns:
-                    continue
-                
-                model_key = f'{pollutant}_{horizon}h'
-                if model_key not in forecaster.models:
-                    continue
-                
-                training_features = forecaster.training_features.get(model_key, [])
-                if not training_features:
-                    continue
-                
-                # Create X_new HERE, before try block
-                X_new = pd.DataFrame()
-                for feat in training_features:
-                    X_new[feat] = latest_pivot[feat] if feat in latest_pivot.columns else 0
-                
-                forecast_time = latest_time + timedelta(hours=horizon)
-                if 'hour' in X_new.columns:
-                    X_new['hour'] = forecast_time.hour
-                    X_new['hour_sin'] = np.sin(2 * np.pi * forecast_time.hour / 24)
-                    X_new['hour_cos'] = np.cos(2 * np.pi * forecast_time.hour / 24)
-                
-                try:
-                    prediction = forecaster.predict_with_uncertainty(X_new, pollutant, horizon)
-                    
-                    nowcasts.append({
-                        "time": forecast_time.strftime("%Y-%m-%d %H:%M"),
-                        "hours_ahead": horizon,
-                        "pollutant": pollutant,
-                        "predicted_value": round(prediction['mean'][0], 2),
-                        "confidence_lower": round(prediction['lower_95'][0], 2),
-                        "confidence_upper": round(prediction['upper_95'][0], 2)
-                    })
-                except Exception as e:
-                    print(f"Error predicting {pollutant} at {horizon}h: {e}")
-                    continue
+        for pollutant, result in results.items():
+            for i, horizon in enumerate(result['hours']):
+                forecast_time = result['base_time'] + timedelta(hours=int(horizon))
+                nowcasts.append({
+                    "time": forecast_time.strftime("%Y-%m-%d %H:%M"),
+                    "hours_ahead": int(horizon),
+                    "pollutant": pollutant,
+                    "predicted_value": round(float(result['mean'][i]), 2),
+                    "confidence_lower": round(float(result['lower_95'][i]), 2),
+                    "confidence_upper": round(float(result['upper_95'][i]), 2)
+                })
+        
+        nowcasts.sort(key=lambda n: (n['hours_ahead'], n['pollutant']))
         
         return {
             "city": city,
@@ -2166,21 +2014,13 @@ async def get_combined_weather_aqi_forecast(city: str):
         raise HTTPException(status_code=503, detail="Database not connected")
     
     try:
-        # Get city coordinates
-        city_query = """
-        SELECT DISTINCT latitude, longitude
-        FROM air_quality_data
-        WHERE city ILIKE %s
-        LIMIT 1
-        """
-        
-        city_df = pd.read_sql(city_query, forecaster.conn, params=[f'%{city}%'])
+        snapshot = forecaster.feature_builder.get(city)
         
-        if city_df.empty:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail=f"City {city} not found")
         
-        lat = float(city_df['latitude'].iloc[0])
-        lon = float(city_df['longitude'].iloc[0])
+        lat = snapshot['latitude']
+        lon = snapshot['longitude']
         
         # Get weather data from enhanced_weather_grid_data
         weather_query = """
@@ -2201,34 +2041,6 @@ async def get_combined_weather_aqi_forecast(city: str):
         
         weather_df = pd.read_sql(weather_query, forecaster.conn,
                                 params=[float(lat-0.5), float(lat+0.5), float(lon-0.5), float(lon+0.5)])
-
-        
-        # Get PBLH data
-        pblh_query = """
-        SELECT 
-            timestamp,
-            pbl_height_m
-        FROM pblh_data
-        WHERE latitude BETWEEN %s AND %s
-        AND longitude BETWEEN %s AND %s
-        AND timestamp >= NOW() - INTERVAL '24 hours'
-        ORDER BY timestamp DESC
-        LIMIT 10
-        """
-        
-        pblh_df = pd.read_sql(pblh_query, forecaster.conn,
-                             params=[lat-0.5, lat+0.5, lon-0.5, lon+0.5])
-        
-        # Get current AQI
-        aqi_query = """
-        SELECT parameter_name, value
-        FROM air_quality_data
-        WHERE city ILIKE %s
-        ORDER BY datetime_utc DESC
-        LIMIT 10
-        """
-        
-        aqi_df = pd.read_sql(aqi_query, forecaster.conn, params=[f'%{city}%'])
         
         current_weather = {}
         if not weather_df.empty:
@@ -2240,16 +2052,16 @@ async def get_combined_weather_aqi_forecast(city: str):
                 "precipitation_mm": round(latest_weather['precipitation_mm'], 1) if pd.notna(latest_weather['precipitation_mm']) else None
             }
         
+        # PBLH comes from the shared snapshot; only report it if it is recent
         current_pblh = None
-        if not pblh_df.empty:
-            current_pblh = round(pblh_df.iloc[0]['pbl_height_m'], 1)
+        if snapshot['pblh_time'] is not None and snapshot['pblh_time'] >= datetime.now() - timedelta(hours=24):
+            current_pblh = round(snapshot['pbl_height_m'], 1)
         
         # Calculate current AQI
         pollutants = {}
         for pol in ['PM10', 'PM2.5', 'PM25']:
-            pol_data = aqi_df[aqi_df['parameter_name'] == pol]
-            if not pol_data.empty:
-                pollutants[pol.lower().replace('.', '')] = float(pol_data['value'].mean())
+            if pol in snapshot['pollutants']:
+                pollutants[pol.lower().replace('.', '')] = snapshot['pollutants'][pol]
         
         current_aqi = forecaster.calculate_aqi(pollutants) if pollutants else None
         
@@ -2518,12 +2330,13 @@ async def export_geojson(
             latitude,
             longitude,
             datetime_utc,
+            units,
             AVG(value) as avg_value
         FROM air_quality_data
         WHERE city ILIKE %s
         AND parameter_name = %s
         AND datetime_utc >= %s
-        GROUP BY location_id, location_name, latitude, longitude, datetime_utc
+        GROUP BY location_id, location_name, latitude, longitude, datetime_utc, units
         ORDER BY datetime_utc DESC
         """
         
@@ -2535,16 +2348,14 @@ async def export_geojson(
         # Create GeoJSON
         features = []
         
-        for location_id in df['location_id'].unique():
-            location_data = df[df['location_id'] == location_id]
-            latest = location_data.iloc[0]
-            
-            # Calculate AQI if PM pollutant
-            if pollutant in ['PM25', 'PM2.5', 'PM10']:
-                aqi = forecaster.calculate_aqi({pollutant.lower().replace('.', ''): latest['avg_value']})
-                aqi_value = int(round(aqi)) if aqi else None
-            else:
-                aqi_value = None
+        # Rows are newest first, so the first row per location is its latest
+        latest_df = df.drop_duplicates(subset='location_id', keep='first')
+        aqi_values = pollutant_aqi(
+            pollutant, rows_to_table_units(pollutant, latest_df['avg_value'], latest_df['units'])
+        )
+        
+        for (_, latest), aqi in zip(latest_df.iterrows(), aqi_values):
+            aqi_value = int(aqi) if pd.notna(aqi) else None
             
             feature = {
                 "type": "Feature",
@@ -2557,6 +2368,7 @@ async def export_geojson(
                     "location_name": latest['location_name'],
                     "pollutant": pollutant,
                     "value": round(float(latest['avg_value']), 2),
+                    "units": latest['units'],
                     "aqi": aqi_value,
                     "timestamp": latest['datetime_utc'].strftime("%Y-%m-%d %H:%M:%S"),
                     "city": city
@@ -0,0 +1,242 @@
+"""
+Vectorized US EPA AQI engine
+
+Breakpoint tables are stored as NumPy arrays so whole DataFrame columns
+(or any array of concentrations) are converted in one call with a
+searchsorted over the truncated concentrations.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# (conc_low, conc_high, aqi_low, aqi_high) per EPA Technical Assistance Document.
+# Units: PM in µg/m³, O3/NO2/SO2 in ppb, CO in ppm.
+_BREAKPOINT_TABLES = {
+    'pm25': [
+        (0.0, 12.0, 0, 50),
+        (12.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150),
+        (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300),
+        (250.5, 350.4, 301, 400),
+        (350.5, 500.4, 401, 500)
+    ],
+    'pm10': [
+        (0, 54, 0, 50),
+        (55, 154, 51, 100),
+        (155, 254, 101, 150),
+        (255, 354, 151, 200),
+        (355, 424, 201, 300),
+        (425, 504, 301, 400),
+        (505, 604, 401, 500)
+    ],
+    # 8-hour O3 up to 200 ppb, 1-hour O3 breakpoints above that
+    'o3': [
+        (0, 54, 0, 50),
+        (55, 70, 51, 100),
+        (71, 85, 101, 150),
+        (86, 105, 151, 200),
+        (106, 200, 201, 300),
+        (405, 504, 301, 400),
+        (505, 604, 401, 500)
+    ],
+    'no2': [
+        (0, 53, 0, 50),
+        (54, 100, 51, 100),
+        (101, 360, 101, 150),
+        (361, 649, 151, 200),
+        (650, 1249, 201, 300),
+        (1250, 1649, 301, 400),
+        (1650, 2049, 401, 500)
+    ],
+    'co': [
+        (0.0, 4.4, 0, 50),
+        (4.5, 9.4, 51, 100),
+        (9.5, 12.4, 101, 150),
+        (12.5, 15.4, 151, 200),
+        (15.5, 30.4, 201, 300),
+        (30.5, 40.4, 301, 400),
+        (40.5, 50.4, 401, 500)
+    ],
+    'so2': [
+        (0, 35, 0, 50),
+        (36, 75, 51, 100),
+        (76, 185, 101, 150),
+        (186, 304, 151, 200),
+        (305, 604, 201, 300),
+        (605, 804, 301, 400),
+        (805, 1004, 401, 500)
+    ]
+}
+
+BREAKPOINTS = {
+    pollutant: np.array(rows, dtype=float)
+    for pollutant, rows in _BREAKPOINT_TABLES.items()
+}
+
+# Decimal places kept before the breakpoint lookup (EPA truncation rules)
+TRUNCATION_DECIMALS = {'pm25': 1, 'pm10': 0, 'o3': 0, 'no2': 0, 'co': 1, 'so2': 0}
+
+POLLUTANTS = list(BREAKPOINTS.keys())
+
+# Multiply a value in the given unit to reach the table unit
+_UNIT_FACTORS = {
+    'o3': {'ppm': 1000.0, 'ug/m3': 1 / 1.962},
+    'no2': {'ppm': 1000.0, 'ug/m3': 1 / 1.88},
+    'so2': {'ppm': 1000.0, 'ug/m3': 1 / 2.62},
+    'co': {'ppb': 0.001, 'mg/m3': 1 / 1.145, 'ug/m3': 1 / 1145.0}
+}
+
+_ALIASES = {
+    'pm2.5': 'pm25', 'pm2_5': 'pm25', 'pm25': 'pm25',
+    'pm10': 'pm10',
+    'o3': 'o3', 'ozone': 'o3',
+    'no2': 'no2',
+    'co': 'co',
+    'so2': 'so2'
+}
+
+CATEGORY_EDGES = np.array([50, 100, 150, 200, 300])
+CATEGORY_NAMES = np.array([
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous"
+])
+
+
+def normalize_pollutant(name):
+    """Map parameter names like 'PM2.5', 'PM25' or 'pm2_5' to the engine keys"""
+    if name is None:
+        return None
+    return _ALIASES.get(str(name).strip().lower())
+
+
+def _normalize_units(units):
+    if units is None:
+        return None
+    return str(units).strip().lower().replace('µ', 'u').replace('μ', 'u').replace('³', '3')
+
+
+def to_table_units(pollutant, values, units=None):
+    """Convert concentrations to the unit the breakpoint table expects"""
+    values = np.asarray(values, dtype=float)
+    factor = _UNIT_FACTORS.get(pollutant, {}).get(_normalize_units(units))
+    return values * factor if factor is not None else values
+
+
+def rows_to_table_units(parameters, values, units):
+    """
+    Convert long-format readings row by row, each with its own unit, so rows
+    of one pollutant reported in different units can be averaged together.
+    `parameters` may be a single pollutant name for all rows.
+    """
+    values = np.asarray(values, dtype=float)
+    if np.ndim(parameters) == 0:
+        keys = np.full(len(values), normalize_pollutant(parameters), dtype=object)
+    else:
+        keys = pd.Series(parameters).map(normalize_pollutant).to_numpy()
+    units = pd.Series(units).reset_index(drop=True)
+    normalized = units.map({u: _normalize_units(u) for u in units.dropna().unique()})
+
+    factors = np.ones(len(values))
+    for key, table in _UNIT_FACTORS.items():
+        rows = keys == key
+        if rows.any():
+            factors[rows] = normalized[rows].map(table).fillna(1.0).to_numpy()
+    return values * factors
+
+
+def pollutant_aqi(pollutant, concentrations, units=None):
+    """
+    AQI for an array (or Series, or scalar) of concentrations of one pollutant.
+    Missing, negative or unknown-pollutant inputs come back as NaN; values
+    above the table are capped at 500.
+    """
+    key = normalize_pollutant(pollutant)
+    index = concentrations.index if isinstance(concentrations, pd.Series) else None
+    scalar = np.ndim(concentrations) == 0
+
+    conc = to_table_units(key, np.atleast_1d(np.asarray(concentrations, dtype=float)), units)
+    result = np.full(conc.shape, np.nan)
+
+    if key in BREAKPOINTS:
+        table = BREAKPOINTS[key]
+        scale = 10.0 ** TRUNCATION_DECIMALS[key]
+        # Small epsilon keeps e.g. 12.1 from truncating to 12.0 on float error
+        truncated = np.floor(conc * scale + 1e-6) / scale
+
+        valid = np.isfinite(truncated) & (truncated >= 0)
+        row = np.clip(np.searchsorted(table[:, 0], truncated, side='right') - 1, 0, len(table) - 1)
+        c_lo, c_hi, a_lo, a_hi = table[row].T
+
+        aqi = (a_hi - a_lo) / (c_hi - c_lo) * (truncated - c_lo) + a_lo
+        # Values between tables (e.g. 8-hour to 1-hour O3) stay within their row
+        aqi = np.clip(aqi, a_lo, a_hi)
+        aqi = np.where(truncated > table[-1, 1], 500.0, aqi)
+        result = np.where(valid, np.round(aqi), np.nan)
+
+    if scalar:
+        return float(result[0])
+    if index is not None:
+        return pd.Series(result, index=index)
+    return result
+
+
+def aqi_frame(df, units=None):
+    """
+    Per-pollutant AQI columns for every recognised pollutant column of a
+    DataFrame, plus the overall 'aqi' (max across pollutants) and the
+    'dominant_pollutant' that set it.
+    """
+    units = units or {}
+    columns = {}
+    for col in df.columns:
+        key = normalize_pollutant(col)
+        if key is None or key in columns:
+            continue
+        columns[key] = pollutant_aqi(key, df[col].to_numpy(), units.get(col))
+
+    result = pd.DataFrame(columns, index=df.index)
+    if result.empty or result.shape[1] == 0:
+        result['aqi'] = np.nan
+        result['dominant_pollutant'] = None
+        return result
+
+    values = result.to_numpy()
+    has_any = np.isfinite(values).any(axis=1)
+    filled = np.where(np.isfinite(values), values, -np.inf)
+    dominant = np.array(result.columns)[filled.argmax(axis=1)]
+
+    result['aqi'] = np.where(has_any, filled.max(axis=1), np.nan)
+    result['dominant_pollutant'] = np.where(has_any, dominant, None)
+    return result
+
+
+def composite_aqi(pollutants, units=None):
+    """
+    Overall AQI for a single reading given as {parameter_name: value}.
+    Returns None when no recognised pollutant has a usable value.
+    """
+    units = units or {}
+    values = [
+        pollutant_aqi(name, value, units.get(name))
+        for name, value in pollutants.items()
+        if normalize_pollutant(name) is not None and value is not None
+    ]
+    values = [v for v in values if np.isfinite(v)]
+    return max(values) if values else None
+
+
+def aqi_category(aqi):
+    """EPA category name for an AQI value or array of values"""
+    if np.ndim(aqi) == 0:
+        if aqi is None or not np.isfinite(aqi):
+            return None
+        return str(CATEGORY_NAMES[np.searchsorted(CATEGORY_EDGES, aqi, side='left')])
+    aqi = np.asarray(aqi, dtype=float)
+    names = CATEGORY_NAMES[np.searchsorted(CATEGORY_EDGES, np.nan_to_num(aqi), side='left')]
+    return np.where(np.isfinite(aqi), names, None)
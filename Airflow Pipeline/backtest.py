@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.metrics import mean_squared_error, mean_absolute_error
+
+
+DEFAULT_BACKTEST_DIR = os.getenv('BACKTEST_CACHE_DIR', './data_downloads/backtest_cache')
+
+
+class RollingOriginBacktester:
+    """
+    Rolling-origin evaluation of the forecaster's model families.
+
+    Folds are cut on timestamps (never splitting one hour across train and
+    test) with a gap of `horizon` hours so targets cannot leak. Each fold's
+    matrices are cached on disk, so re-running a backtest or comparing
+    another model family skips the slicing. Models train on unscaled
+    features, as in production. Folds train in parallel threads with the
+    cores split between them; a fold that fails is reported in the results.
+    """
+
+    def __init__(self, forecaster, n_folds=5, max_workers=None, max_train_hours=None,
+                 cache_dir=DEFAULT_BACKTEST_DIR):
+        self.forecaster = forecaster
+        self.n_folds = n_folds
+        self.max_workers = max_workers or min(n_folds, os.cpu_count() or 1)
+        self.max_train_hours = max_train_hours
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def cached_features(self, start_date, end_date):
+        """Engineered feature frame for a period, built once and reused from disk"""
+        path = self.cache_dir / f"features_{start_date:%Y%m%d%H}_{end_date:%Y%m%d%H}.pkl"
+        if path.exists():
+            print(f"✓ Loaded cached features from {path}")
+            return pd.read_pickle(path)
+
+        f = self.forecaster
+        feature_df = f.engineer_features(
+            f.fetch_station_data(start_date, end_date),
+            f.fetch_meteorological_data(start_date, end_date),
+            f.fetch_satellite_data(start_date, end_date),
+            f.fetch_pblh_data(start_date, end_date),
+            f.fetch_fire_data(start_date, end_date)
+        )
+        feature_df.to_pickle(path)
+        return feature_df
+
+    def folds(self, times, horizon):
+        """(train_mask, test_mask) pairs over rows, split on unique timestamps"""
+        times = pd.to_datetime(times).to_numpy()
+        unique_times = np.unique(times)
+        splitter = TimeSeriesSplit(
+            n_splits=self.n_folds,
+            gap=horizon,
+            max_train_size=self.max_train_hours
+        )
+        for train_t, test_t in splitter.split(unique_times):
+            yield (np.isin(times, unique_times[train_t]),
+                   np.isin(times, unique_times[test_t]))
+
+    def _data_key(self, target_name, horizon, values, y, times, feature_cols):
+        """Fingerprint of the backtest inputs (matrix included); fold caches are keyed off it"""
+        digest = hashlib.sha1()
+        digest.update(f"{target_name}|{horizon}|{self.n_folds}|{self.max_train_hours}".encode())
+        digest.update(json.dumps(feature_cols).encode())
+        digest.update(str(values.shape).encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+        digest.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+        digest.update(pd.to_datetime(times).to_numpy().tobytes())
+        return digest.hexdigest()[:16]
+
+    def _fold_data(self, key, values, y, train_mask, test_mask):
+        """Load a fold's matrices from the cache, building them on a miss"""
+        fold_dir = self.cache_dir / f"fold_{key}"
+        if (fold_dir / 'complete').exists():
+            data = {name: np.load(fold_dir / f'{name}.npy', mmap_mode='r')
+                    for name in ('X_train', 'y_train', 'X_test', 'y_test')}
+            data['cached'] = True
+            return data
+
+        data = {
+            'X_train': values[train_mask],
+            'y_train': y[train_mask],
+            'X_test': values[test_mask],
+            'y_test': y[test_mask],
+            'cached': False
+        }
+
+        fold_dir.mkdir(parents=True, exist_ok=True)
+        for name in ('X_train', 'y_train', 'X_test', 'y_test'):
+            np.save(fold_dir / f'{name}.npy', data[name])
+        # Written last: its presence marks the fold cache as complete
+        (fold_dir / 'complete').touch()
+        return data
+
+    def _run_fold(self, fold, key, values, y, train_mask, test_mask, families, n_jobs):
+        start = time.perf_counter()
+        data = self._fold_data(key, values, y, train_mask, test_mask)
+        prepare_s = time.perf_counter() - start
+
+        X_train, y_train = np.asarray(data['X_train']), np.asarray(data['y_train'])
+        X_test, y_test = np.asarray(data['X_test']), np.asarray(data['y_test'])
+
+        rows = []
+        for name, model in self.forecaster.make_estimators(n_jobs=n_jobs).items():
+            if families and name not in families:
+                continue
+
+            start = time.perf_counter()
+            model.fit(X_train, y_train)
+            train_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pred = model.predict(X_test)
+            predict_s = time.perf_counter() - start
+
+            rows.append({
+                'fold': fold,
+                'family': name,
+                'train_rows': len(y_train),
+                'test_rows': len(y_test),
+                'rmse': float(np.sqrt(mean_squared_error(y_test, pred))),
+                'mae': float(mean_absolute_error(y_test, pred)),
+                'train_s': round(train_s, 3),
+                'predict_ms_per_1k': round(predict_s * 1000 / max(len(y_test), 1) * 1000, 3),
+                'prepare_s': round(prepare_s, 3),
+                'cache_hit': data['cached']
+            })
+        return rows
+
+    def run(self, X, y, times, feature_cols, target_name='pm25', horizon=24, families=None):
+        """
+        Backtest one target/horizon. X is the (shared) design matrix, y the
+        target Series and times the row timestamps (both indexed like X).
+        Returns per-fold rows and a per-family summary as DataFrames; a fold
+        that failed appears as a row with family '*' and its `error`, and the
+        summary counts failed folds.
+        """
+        X = X.loc[y.index]
+        times = pd.Series(times).loc[y.index]
+        order = np.argsort(pd.to_datetime(times).to_numpy(), kind='stable')
+        y, times = y.iloc[order], times.iloc[order]
+        # One float32 copy of the matrix shared by every fold
+        values = X.to_numpy(dtype=np.float32)[order]
+        y_values = y.to_numpy(dtype=np.float32)
+
+        n_jobs = max(1, (os.cpu_count() or 1) // self.max_workers)
+        print(f"\n→ Backtesting {target_name}_{horizon}h: {self.n_folds} folds, "
+              f"{self.max_workers} in parallel, {n_jobs} threads each")
+
+        data_key = self._data_key(target_name, horizon, values, y, times, feature_cols)
+        rows = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for fold, (train_mask, test_mask) in enumerate(self.folds(times, horizon)):
+                futures[executor.submit(
+                    self._run_fold, fold, f"{data_key}_{fold}", values, y_values, train_mask, test_mask, families, n_jobs
+                )] = fold
+            for future in as_completed(futures):
+                try:
+                    rows.extend(future.result())
+                except Exception as e:
+                    print(f"  ✗ Fold {futures[future]} failed: {e}")
+                    failed.append({'fold': futures[future], 'family': '*', 'error': str(e)})
+
+        if not rows:
+            return pd.DataFrame(failed), pd.DataFrame()
+
+        folds = pd.DataFrame(rows + failed).sort_values(['fold', 'family']).reset_index(drop=True)
+        if 'error' not in folds:
+            folds['error'] = None
+        completed = folds[folds['error'].isna()]
+        summary = completed.groupby('family').agg(
+            rmse_mean=('rmse', 'mean'),
+            rmse_std=('rmse', 'std'),
+            mae_mean=('mae', 'mean'),
+            train_s_total=('train_s', 'sum'),
+            predict_ms_per_1k=('predict_ms_per_1k', 'mean'),
+            folds_ok=('fold', 'nunique')
+        ).round(3).sort_values('rmse_mean')
+        summary['folds_failed'] = len(failed)
+
+        print(completed[['fold', 'family', 'train_rows', 'test_rows', 'rmse', 'mae',
+                         'train_s', 'predict_ms_per_1k', 'cache_hit']].to_string(index=False))
+        if failed:
+            print(f"  ✗ {len(failed)} of {len(futures)} folds failed; summary covers the rest")
+        print(f"\n  Summary for {target_name}_{horizon}h:")
+        print(summary.to_string())
+        return folds, summary
@@ -0,0 +1,379 @@
+"""
+Forecaster performance benchmark
+
+Runs engineer_features, prepare_training_data, train_models and
+predict_with_uncertainty on synthetic station / MERRA-2 / PBLH / fire data
+at several scales (stations x days), then measures inference latency per
+model family at batch sizes from 1 to 100k rows. GOES extraction is timed
+per synthetic granule file for the old path (per-pixel loops, CSV files,
+iterrows) and the shipped goes_extract.extract_goes_columns. Results can
+be saved as a baseline and later runs are compared against it.
+
+    python benchmark.py --scales 20x14,100x30
+    python benchmark.py --save-baseline
+"""
+
+import argparse
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+from air_quality_forecaster import AirQualityForecaster
+from satellite_cube import SatelliteFeatureCube
+from db_frames import frame_rows
+from goes_extract import extract_goes_columns
+from remote_granule import open_granule
+from remote_granule_check import write_goes_granule
+
+
+DEFAULT_BASELINE = Path(__file__).with_name('benchmark_baseline.json')
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+POLLUTANTS = {'pm25': (12.0, 'µg/m³'), 'pm10': (25.0, 'µg/m³'), 'no2': (15.0, 'ppb'), 'o3': (35.0, 'ppb')}
+MET_VARIABLES = {'T2M': (288.0, 'K'), 'QV2M': (0.008, 'kg kg-1'), 'U10M': (2.0, 'm s-1'),
+                 'V10M': (1.0, 'm s-1'), 'PS': (101000.0, 'Pa'), 'SLP': (101300.0, 'Pa')}
+
+
+def synthetic_sources(n_stations, n_days, seed=42):
+    """
+    Station, meteorology, PBLH and fire frames shaped like the
+    AirQualityForecaster.fetch_* results
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1)
+    times = pd.date_range(start, periods=n_days * 24, freq='h')
+    hours = times.hour.to_numpy()
+
+    # Station coordinates on the 0.1° grid so the met/PBLH merge finds them
+    lats = np.round(rng.uniform(25, 49, n_stations), 1)
+    lons = np.round(rng.uniform(-124, -67, n_stations), 1)
+
+    n_times = len(times)
+    station_idx = np.repeat(np.arange(n_stations), n_times)
+    time_idx = np.tile(np.arange(n_times), n_stations)
+
+    station_frames = []
+    for name, (base, units) in POLLUTANTS.items():
+        diurnal = 1 + 0.3 * np.sin(2 * np.pi * (hours - 8) / 24)
+        values = base * diurnal[time_idx] * rng.lognormal(0, 0.3, len(station_idx))
+        station_frames.append(pd.DataFrame({
+            'datetime_utc': times[time_idx],
+            'latitude': lats[station_idx],
+            'longitude': lons[station_idx],
+            'city': [f'City {i % 50}' for i in station_idx],
+            'parameter_name': name,
+            'value': values,
+            'units': units,
+            'location_name': [f'Station {i}' for i in station_idx],
+            'location_id': station_idx
+        }))
+    station_df = pd.concat(station_frames, ignore_index=True)
+
+    met_frames = []
+    for name, (base, units) in MET_VARIABLES.items():
+        met_frames.append(pd.DataFrame({
+            'datetime': times[time_idx],
+            'latitude': lats[station_idx],
+            'longitude': lons[station_idx],
+            'variable_name': name,
+            'variable_value': base * (1 + 0.05 * rng.standard_normal(len(station_idx))),
+            'variable_units': units
+        }))
+    met_df = pd.concat(met_frames, ignore_index=True)
+
+    pblh_df = pd.DataFrame({
+        'datetime': times[time_idx],
+        'latitude': lats[station_idx],
+        'longitude': lons[station_idx],
+        'pbl_height_m': 300 + 900 * np.clip(np.sin(np.pi * (hours[time_idx] - 6) / 12), 0, None)
+    })
+
+    n_fires = n_days * 200
+    fire_df = pd.DataFrame({
+        'acq_date': (start + pd.to_timedelta(rng.integers(0, n_days, n_fires), unit='D')).date,
+        'latitude': rng.uniform(25, 49, n_fires),
+        'longitude': rng.uniform(-124, -67, n_fires),
+        'frp': rng.gamma(2.0, 10.0, n_fires),
+        'confidence': rng.choice(['h', 'n'], n_fires),
+        'bright_ti4': rng.uniform(300, 360, n_fires),
+        'bright_ti5': rng.uniform(280, 320, n_fires)
+    })
+
+    return station_df, met_df, pblh_df, fire_df
+
+
+class StageTimer:
+    """Wall time, peak traced memory and throughput for one stage"""
+
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.results = {}
+
+    def run(self, name, rows, func, *args, **kwargs):
+        if self.track_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        peak_mb = None
+        if self.track_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+
+        self.results[name] = {
+            'seconds': round(elapsed, 4),
+            'peak_mb': round(peak_mb, 1) if peak_mb is not None else None,
+            'rows': int(rows),
+            'rows_per_s': round(rows / elapsed, 1) if elapsed > 0 else None
+        }
+        print(f"  {name:<26} {elapsed:9.3f}s  "
+              f"{(f'{peak_mb:8.1f} MB' if peak_mb is not None else '       -   ')}  "
+              f"{rows / elapsed if elapsed > 0 else 0:12.0f} rows/s")
+        return result
+
+
+def inference_latency(models, X, batch_sizes=BATCH_SIZES, repeats=5):
+    """Median predict latency (ms) per model family and batch size"""
+    latency = {}
+    base = X.to_numpy()
+    for batch in batch_sizes:
+        reps = int(np.ceil(batch / len(base)))
+        X_batch = pd.DataFrame(np.tile(base, (reps, 1))[:batch], columns=X.columns)
+        n_repeats = repeats if batch <= 10000 else max(1, repeats // 2)
+
+        for name, model in models.items():
+            times = []
+            for _ in range(n_repeats):
+                start = time.perf_counter()
+                model.predict(X_batch)
+                times.append(time.perf_counter() - start)
+            latency.setdefault(name, {})[str(batch)] = round(float(np.median(times)) * 1000, 3)
+
+        print(f"  batch {batch:>6}: " + "  ".join(
+            f"{name}={latency[name][str(batch)]:.2f}ms" for name in models
+        ))
+    return latency
+
+
+def run_scale(n_stations, n_days, track_memory=True, horizon=1):
+    print(f"\n{'='*60}")
+    print(f"Scale: {n_stations} stations x {n_days} days")
+    print(f"{'='*60}")
+
+    station_df, met_df, pblh_df, fire_df = synthetic_sources(n_stations, n_days)
+    timer = StageTimer(track_memory)
+    # Empty throwaway cube so runs neither read nor write ./data_downloads
+    with tempfile.TemporaryDirectory(prefix='bench_cube_') as cube_dir:
+        forecaster = AirQualityForecaster({}, satellite_cube=SatelliteFeatureCube(cube_dir))
+
+        feature_df = timer.run(
+            'engineer_features', len(station_df),
+            forecaster.engineer_features, station_df, met_df, {}, pblh_df, fire_df
+        )
+        X, y_dict, metadata, feature_cols = timer.run(
+            'prepare_training_data', len(feature_df),
+            forecaster.prepare_training_data, feature_df.copy(), 'pm25', [horizon]
+        )
+
+        y = y_dict[horizon]
+        X_h = X.loc[y.index].reset_index(drop=True)
+        y = y.reset_index(drop=True)
+        split = int(len(X_h) * 0.8)
+        models, _ = timer.run(
+            'train_models', split,
+            forecaster.train_models, X_h.iloc[:split], y.iloc[:split],
+            X_h.iloc[split:], y.iloc[split:], horizon, 'pm25'
+        )
+        forecaster.models[f'pm25_{horizon}h'] = models
+
+        timer.run(
+            'predict_with_uncertainty', len(X_h) - split,
+            forecaster.predict_with_uncertainty, X_h.iloc[split:], 'pm25', horizon
+        )
+
+        print("  Inference latency:")
+        latency = inference_latency(models, X_h.iloc[split:])
+        return {'stages': timer.results, 'inference_ms': latency}
+
+
+def goes_baseline(path, out_dir, sample_points):
+    """Previous GOES path: per-pixel dicts, CSV files, then read_csv + iterrows in the loaders"""
+    all_data = []
+    with open_granule(path) as dataset:
+        for name, var in dataset.variables.items():
+            data = var[:]
+            if var.ndim == 0:
+                all_data.append({'variable': name, 'value': float(data), 'type': 'scalar'})
+            elif var.ndim == 1:
+                if len(data) > 100:
+                    data = data[np.linspace(0, len(data) - 1, 100, dtype=int)]
+                for i, val in enumerate(data):
+                    all_data.append({'variable': name, 'index': i, 'type': '1d_array',
+                                     'value': float(val) if not np.ma.is_masked(val) else np.nan})
+            else:
+                rows, cols = var.shape
+                step = int(np.sqrt(rows * cols / sample_points)) if rows * cols > sample_points else 1
+                sampled = data[::step, ::step]
+                for i in range(sampled.shape[0]):
+                    for j in range(sampled.shape[1]):
+                        val = sampled[i, j]
+                        if not np.ma.is_masked(val):
+                            all_data.append({'variable': name, 'row': i * step, 'col': j * step,
+                                             'value': float(val), 'type': '2d_array'})
+
+    df = pd.DataFrame(all_data)
+    imagery = df[df['type'] == '2d_array'][['variable', 'row', 'col', 'value']]
+    data_csv, imagery_csv = out_dir / 'GOES16_CONUS_data.csv', out_dir / 'GOES16_CONUS_data_imagery.csv'
+    df.to_csv(data_csv, index=False)
+    imagery.to_csv(imagery_csv, index=False)
+    for var in imagery['variable'].unique():
+        values = imagery[imagery['variable'] == var]['value']
+        values.min(), values.max(), values.mean(), values.std()
+
+    processed = [(row.get('variable'), row.get('value'), row.get('type'),
+                  row.get('row') if pd.notna(row.get('row')) else None,
+                  row.get('col') if pd.notna(row.get('col')) else None,
+                  row.get('index') if pd.notna(row.get('index')) else None)
+                 for _, row in pd.read_csv(data_csv).iterrows()]
+    imagery_rows = [(row.get('variable'), row.get('row'), row.get('col'), row.get('value'))
+                    for _, row in pd.read_csv(imagery_csv).iterrows()]
+    return len(processed) + len(imagery_rows)
+
+
+def goes_columns(path, sample_points):
+    """Current GOES path: the shipped extractor, then the loaders' row tuples"""
+    frame = extract_goes_columns(str(path), sample_points=sample_points)['frame']
+    imagery = frame[frame['type'] == '2d_array']
+    processed = frame_rows(frame, ['variable', 'value', 'type', 'row', 'col', 'index'])
+    imagery_rows = frame_rows(imagery, ['variable', 'row', 'col', 'value'])
+    return len(processed) + len(imagery_rows)
+
+
+def goes_throughput(n_granules=3, sample_points=10000):
+    """Per-granule seconds and rows/s of the old and column GOES paths"""
+    print(f"\n{'='*60}")
+    print(f"GOES extraction: {n_granules} synthetic granules, {sample_points} sample points")
+    print(f"{'='*60}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_goes_') as tmp:
+        granules = [write_goes_granule(Path(tmp) / f'granule_{seed}.nc', seed=seed) for seed in range(n_granules)]
+        paths = {
+            'baseline': lambda g: goes_baseline(g, Path(tmp), sample_points),
+            'columns': lambda g: goes_columns(g, sample_points)
+        }
+        for name, func in paths.items():
+            seconds, rows = [], 0
+            for granule in granules:
+                start = time.perf_counter()
+                rows = func(granule)
+                seconds.append(time.perf_counter() - start)
+            per_granule = float(np.median(seconds))
+            results[name] = {
+                'seconds_per_granule': round(per_granule, 4),
+                'rows_per_granule': int(rows),
+                'rows_per_s': round(rows / per_granule, 1) if per_granule > 0 else None
+            }
+            print(f"  {name:<10} {per_granule:9.4f}s/granule  {rows:8d} rows  "
+                  f"{rows / per_granule if per_granule > 0 else 0:12.0f} rows/s")
+
+    base, new = results['baseline']['seconds_per_granule'], results['columns']['seconds_per_granule']
+    results['speedup'] = round(base / new, 2) if new > 0 else None
+    print(f"  ✓ Column path {results['speedup']}x faster per granule")
+    return results
+
+
+def compare(current, baseline, tolerance):
+    """Print stage-by-stage ratios against the baseline; return regressions"""
+    regressions = []
+    for scale, result in current['scales'].items():
+        base = baseline.get('scales', {}).get(scale)
+        if not base:
+            print(f"\n⚠ No baseline for scale {scale}")
+            continue
+
+        print(f"\nScale {scale} vs baseline ({baseline.get('created_at', 'unknown')})")
+        pairs = [(f'stage {name}', m['seconds'], base['stages'].get(name, {}).get('seconds'))
+                 for name, m in result['stages'].items()]
+        pairs += [(f'{model} batch {batch}', ms, base['inference_ms'].get(model, {}).get(batch))
+                  for model, by_batch in result['inference_ms'].items()
+                  for batch, ms in by_batch.items()]
+
+        for label, value, reference in pairs:
+            if not reference:
+                continue
+            ratio = value / reference
+            mark = '✗' if ratio > 1 + tolerance else '✓'
+            print(f"  {mark} {label:<32} {ratio:6.2f}x")
+            if ratio > 1 + tolerance:
+                regressions.append((scale, label, ratio))
+
+    value = current.get('goes', {}).get('columns', {}).get('seconds_per_granule')
+    reference = baseline.get('goes', {}).get('columns', {}).get('seconds_per_granule')
+    if value and reference:
+        ratio = value / reference
+        mark = '✗' if ratio > 1 + tolerance else '✓'
+        print(f"\nGOES extraction vs baseline\n  {mark} {'columns per granule':<32} {ratio:6.2f}x")
+        if ratio > 1 + tolerance:
+            regressions.append(('goes', 'columns per granule', ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the air quality forecaster pipeline")
+    parser.add_argument('--scales', default='20x14,100x30',
+                        help="Comma-separated STATIONSxDAYS sizes (default: 20x14,100x30)")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Baseline JSON path")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed slowdown before a stage counts as a regression (default: 0.2)")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Skip tracemalloc (lower overhead, no peak memory)")
+    parser.add_argument('--goes-granules', type=int, default=3,
+                        help="Synthetic GOES granules for the extraction comparison; 0 skips it (default: 3)")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'scales': {}
+    }
+    for scale in args.scales.split(','):
+        n_stations, n_days = (int(v) for v in scale.lower().split('x'))
+        results['scales'][scale] = run_scale(n_stations, n_days, track_memory=not args.no_memory)
+    if args.goes_granules:
+        results['goes'] = goes_throughput(args.goes_granules)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Baseline saved to {baseline_path}")
+        return 0
+
+    if baseline_path.exists():
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+        print("\n✓ No regressions against baseline")
+    else:
+        print(f"\n⚠ No baseline at {baseline_path}; run with --save-baseline to create one")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,43 @@
+"""
+Paged CMR granule search
+
+CMR returns at most page_size entries per request. search_granules()
+follows the CMR-Search-After header from page to page, dropping granules
+the caller has already ingested, until `limit` new granules are
+collected or the results run out. Sorted by ascending start time, a
+search therefore resumes where the last run stopped however far behind
+it is, instead of truncating the window to its newest page.
+"""
+
+import requests
+
+
+CMR_GRANULES_URL = "https://cmr.earthdata.nasa.gov/search/granules.json"
+PAGE_SIZE = 200
+
+
+def search_granules(params, limit=None, keep=None, headers=None, session=None,
+                    page_size=PAGE_SIZE, timeout=30, url=CMR_GRANULES_URL):
+    """
+    Granule entries for a CMR query. `keep(entries)` filters each page
+    (e.g. WatermarkStore.new_granules) and paging stops once `limit`
+    kept entries are collected. Returns (kept entries, entries seen).
+    """
+    session = session or requests.Session()
+    params = dict(params, page_size=page_size)
+    headers = dict(headers or {})
+    kept, seen = [], 0
+
+    while True:
+        response = session.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        entries = response.json().get('feed', {}).get('entry', []) or []
+        seen += len(entries)
+        kept.extend(keep(entries) if keep else entries)
+
+        search_after = response.headers.get('CMR-Search-After')
+        if (limit and len(kept) >= limit) or len(entries) < page_size or not search_after:
+            break
+        headers['CMR-Search-After'] = search_after
+
+    return (kept[:limit] if limit else kept), seen
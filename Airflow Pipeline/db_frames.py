@@ -0,0 +1,31 @@
+"""
+DataFrame bulk loading helpers
+
+Fetchers hand their rows to the insert functions as DataFrames; these
+helpers turn the columns into row tuples column-wise and load them with
+execute_values. Kept apart from insert_records so tools such as
+benchmark.py can use them without importing every fetcher.
+"""
+
+from psycopg2.extras import execute_values
+
+
+def frame_rows(frame, columns):
+    """Row tuples from DataFrame columns, built column-wise; NA and absent columns become None"""
+    frame = frame.reindex(columns=columns)
+    values = [frame[c].astype(object).where(frame[c].notna(), None).tolist() for c in columns]
+    return list(zip(*values))
+
+
+def insert_frame(cursor, query, frame, columns, page_size=5000):
+    """
+    Bulk-insert DataFrame columns with execute_values; `query` has a single
+    VALUES %s placeholder and RETURNING 1 so inserted rows can be counted.
+    Rows are converted a page at a time, so only one page of Python tuples
+    exists at once however large the frame is.
+    """
+    inserted = 0
+    for start in range(0, len(frame), page_size):
+        rows = frame_rows(frame.iloc[start:start + page_size], columns)
+        inserted += len(execute_values(cursor, query, rows, page_size=page_size, fetch=True))
+    return inserted
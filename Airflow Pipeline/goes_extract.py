@@ -0,0 +1,155 @@
+"""
+GOES ABI granule sampling as typed columns
+
+Every variable of a granule is sampled with array operations: scalars as
+one value, 1-D variables as up to 100 evenly spaced samples and 2-D
+imagery strided to about `sample_points` cells (netcdf_subset.
+strided_columns). The result is one DataFrame (variable, type, row, col,
+index, value) that the GOES loaders insert directly, with per-variable
+statistics and a per-granule throughput record. Used by
+fetch_and_process_goes_data and benchmark.py.
+"""
+
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from netcdf_subset import strided_columns
+from remote_granule import open_granule
+from tempo_grid import as_float
+
+
+def extract_goes_columns(nc_file, sample_points=5000, variables=None, transfer=None):
+    """
+    Sampled values of every variable as typed columns (variable, type,
+    row, col, index, value). `nc_file` may be a local path or an object
+    URL read through byte ranges. Returns None when nothing is extracted.
+    """
+    try:
+        print(json.dumps({"action": "reading_netcdf", "file": os.path.basename(nc_file)}))
+        start = time.perf_counter()
+
+        dataset = open_granule(nc_file, stats=transfer)
+
+        # Get dimensions
+        dims = {}
+        for dim_name in dataset.dimensions:
+            dims[dim_name] = len(dataset.dimensions[dim_name])
+
+        # File structure info
+        file_info = {
+            'action': 'file_structure',
+            'file': os.path.basename(nc_file),
+            'dimensions': dims,
+            'variables': list(dataset.variables.keys()),
+            'num_variables': len(dataset.variables.keys())
+        }
+        print(json.dumps(file_info, indent=2))
+
+        # One column batch per variable
+        batches = []
+        variable_info = []
+
+        for var_name in dataset.variables.keys():
+            if variables is not None and var_name not in variables:
+                continue
+            var = dataset.variables[var_name]
+
+            # Get attributes
+            attrs = {}
+            for attr in var.ncattrs():
+                try:
+                    attrs[attr] = var.getncattr(attr)
+                except:
+                    pass
+
+            variable_info.append({
+                'variable': var_name,
+                'shape': list(var.shape),
+                'dimensions': list(var.dimensions),
+                'long_name': str(attrs.get('long_name', 'N/A')),
+                'units': str(attrs.get('units', 'N/A')),
+                'data_type': str(var.dtype)
+            })
+
+            # Extract data based on dimensions
+            try:
+                if len(var.shape) == 0:  # Scalar
+                    values = as_float(var[:]).reshape(1)
+                    batches.append(pd.DataFrame({'variable': var_name, 'type': 'scalar', 'value': values}))
+
+                elif len(var.shape) == 1:  # 1D array, up to 100 evenly spaced samples
+                    n = var.shape[0]
+                    indices = np.linspace(0, n - 1, 100, dtype=int) if n > 100 else np.arange(n)
+                    values = as_float(var[:])[indices]
+                    batches.append(pd.DataFrame({'variable': var_name, 'type': '1d_array',
+                                                 'index': np.arange(len(indices)), 'value': values}))
+
+                elif len(var.shape) == 2:  # 2D array, strided so about sample_points remain
+                    columns, step = strided_columns(var, sample_points)
+                    rows, cols = var.shape
+
+                    print(json.dumps({
+                        'action': 'sampling_2d',
+                        'variable': var_name,
+                        'original_shape': [rows, cols],
+                        'sampling_step': step,
+                        'sampled_shape': [rows//step, cols//step]
+                    }))
+
+                    batches.append(pd.DataFrame({'variable': var_name, 'type': '2d_array', **columns}))
+
+            except Exception as e:
+                print(json.dumps({
+                    'error': str(e),
+                    'variable': var_name,
+                    'action': 'extraction_failed'
+                }))
+
+        dataset.close()
+
+        if not batches:
+            print(json.dumps({'error': 'no_data_extracted'}))
+            return None
+
+        frame = pd.concat(batches, ignore_index=True)
+        for column in ('row', 'col', 'index'):
+            if column not in frame:
+                frame[column] = np.nan
+            frame[column] = frame[column].astype('Int64')
+
+        # Statistics per imagery variable
+        imagery = frame[frame['type'] == '2d_array']
+        statistics = []
+        if len(imagery) > 0:
+            grouped = imagery.groupby('variable')['value'].agg(['min', 'max', 'mean', 'std', 'count'])
+            statistics = [
+                {'variable': name, 'min': float(row['min']), 'max': float(row['max']),
+                 'mean': float(row['mean']), 'std': float(row['std']), 'count': int(row['count'])}
+                for name, row in grouped.iterrows()
+            ]
+            print(json.dumps({'action': 'statistics', 'data': statistics}, indent=2))
+
+        seconds = time.perf_counter() - start
+        throughput = {
+            'granule': os.path.basename(nc_file),
+            'points': len(frame),
+            'seconds': round(seconds, 3),
+            'points_per_s': round(len(frame) / seconds) if seconds > 0 else None
+        }
+        print(json.dumps({'action': 'extracted', **throughput,
+                          'records': frame['type'].value_counts().to_dict()}))
+
+        return {'frame': frame, 'variables': variable_info, 'statistics': statistics,
+                'throughput': throughput}
+
+    except Exception as e:
+        print(json.dumps({
+            'error': str(e),
+            'action': 'extraction_failed',
+            'traceback': str(e)
+        }))
+        return None
@@ -0,0 +1,292 @@
+"""
+Persistent on-disk cache for NetCDF/HDF5 granules
+
+Granules are stored under a directory derived from their granule id and
+keep their original file name. A download goes to a `.part` file that is
+resumed with an HTTP Range request after an interruption, verified
+against the upstream checksum when one is known, and only then renamed
+into place, so a present file is always complete. Per-entry file locks
+make concurrent ingestion processes wait for one download instead of
+repeating it, and the cache is trimmed to a size budget by evicting the
+least recently used granules.
+
+fetch_many() downloads several granules at once under a concurrency cap
+and yields each one as soon as it lands, so callers parse a file while
+the next ones are still downloading.
+"""
+
+import os
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+
+DEFAULT_CACHE_DIR = os.getenv('GRANULE_CACHE_DIR', './data_downloads/granule_cache')
+DEFAULT_MAX_BYTES = int(float(os.getenv('GRANULE_CACHE_MAX_GB', 20)) * 1024 ** 3)
+DEFAULT_DOWNLOAD_WORKERS = int(os.getenv('GRANULE_DOWNLOAD_WORKERS', 4))
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def umm_checksum(umm):
+    """(algorithm, value) from a CMR UMM-G record, or None"""
+    try:
+        for info in umm.get('DataGranule', {}).get('ArchiveAndDistributionInformation', []):
+            checksum = info.get('Checksum')
+            if checksum and checksum.get('Value'):
+                return checksum.get('Algorithm', 'MD5'), checksum['Value']
+    except AttributeError:
+        pass
+    return None
+
+
+def _hasher(algorithm):
+    return hashlib.new(algorithm.lower().replace('-', ''))
+
+
+@contextmanager
+def _locked(path, exclusive=True, blocking=True):
+    """flock on `path`; yields False instead of waiting when non-blocking and busy"""
+    with open(path, 'a+') as handle:
+        flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(handle, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class GranuleCache:
+    def __init__(self, root_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_retries=3):
+        self.root = Path(root_dir)
+        self.objects = self.root / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.stats = {'hits': 0, 'misses': 0, 'resumed': 0, 'bytes_downloaded': 0, 'evicted': 0}
+        self.last_run = None
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def entry_dir(self, granule_id):
+        digest = hashlib.sha256(granule_id.encode()).hexdigest()
+        return self.objects / digest[:2] / digest[:32]
+
+    def _meta(self, entry):
+        try:
+            with open(entry / 'meta.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, granule_id):
+        """Path of a complete cached granule, or None; marks it as recently used"""
+        entry = self.entry_dir(granule_id)
+        meta = self._meta(entry)
+        if meta is None:
+            return None
+        path = entry / meta['filename']
+        if not path.exists():
+            return None
+        os.utime(path)
+        return path
+
+    def fetch(self, granule_id, url, session=None, headers=None, checksum=None, filename=None, timeout=300):
+        """
+        Local path for a granule, downloading it on a miss. `checksum` is an
+        optional (algorithm, value) pair from the granule metadata.
+        """
+        path = self.get(granule_id)
+        if path is not None:
+            self._count('hits')
+            return path
+
+        entry = self.entry_dir(granule_id)
+        entry.mkdir(parents=True, exist_ok=True)
+        filename = filename or url.split('?')[0].rstrip('/').split('/')[-1]
+
+        with _locked(entry / '.lock'):
+            # Another process may have finished it while we waited for the lock
+            path = self.get(granule_id)
+            if path is not None:
+                self._count('hits')
+                return path
+
+            self._count('misses')
+            part = entry / f'{filename}.part'
+            self._download(url, part, session or requests.Session(), headers, timeout)
+
+            algorithm, expected = checksum if checksum else ('SHA256', None)
+            digest = self._digest(part, algorithm)
+            if expected and digest.lower() != expected.lower():
+                part.unlink()
+                raise ValueError(f"Checksum mismatch for {granule_id}: {algorithm} {digest} != {expected}")
+
+            path = entry / filename
+            os.replace(part, path)
+            meta = {
+                'granule_id': granule_id,
+                'filename': filename,
+                'url': url,
+                'size': path.stat().st_size,
+                'checksum': {'algorithm': algorithm, 'value': digest},
+                'cached_at': datetime.utcnow().isoformat()
+            }
+            # Written last: its presence marks the entry as complete
+            tmp_meta = entry / 'meta.json.tmp'
+            with open(tmp_meta, 'w') as f:
+                json.dump(meta, f, indent=2)
+            os.replace(tmp_meta, entry / 'meta.json')
+
+        self.evict()
+        return path
+
+    def fetch_many(self, items, max_workers=DEFAULT_DOWNLOAD_WORKERS):
+        """
+        Fetch granules concurrently. `items` are dicts of fetch() keyword
+        arguments (extra keys are passed through untouched). Yields
+        (item, path, error) in completion order.
+        """
+        fetch_keys = ('granule_id', 'url', 'session', 'headers', 'checksum', 'filename', 'timeout')
+        start = time.perf_counter()
+        bytes_before = self.stats['bytes_downloaded']
+        done = failed = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='granule') as executor:
+            futures = {
+                executor.submit(self.fetch, **{k: item[k] for k in fetch_keys if k in item}): item
+                for item in items
+            }
+            for future in as_completed(futures):
+                try:
+                    path, error = future.result(), None
+                    done += 1
+                except Exception as e:
+                    path, error = None, e
+                    failed += 1
+                yield futures[future], path, error
+
+        elapsed = time.perf_counter() - start
+        downloaded_mb = (self.stats['bytes_downloaded'] - bytes_before) / 1024 ** 2
+        self.last_run = {
+            'granules': done,
+            'failed': failed,
+            'downloaded_mb': round(downloaded_mb, 1),
+            'seconds': round(elapsed, 2),
+            'mb_per_s': round(downloaded_mb / elapsed, 2) if elapsed > 0 else None,
+            'max_workers': max_workers
+        }
+        print(f"✓ {done} granules ready ({failed} failed), {downloaded_mb:.1f} MB downloaded in {elapsed:.1f}s "
+              f"({self.last_run['mb_per_s']} MB/s, up to {max_workers} concurrent downloads)")
+
+    def _download(self, url, part, session, headers, timeout):
+        """Stream into `part`, resuming from its current size after interruptions"""
+        for attempt in range(self.max_retries + 1):
+            offset = part.stat().st_size if part.exists() else 0
+            request_headers = dict(headers or {})
+            if offset:
+                request_headers['Range'] = f'bytes={offset}-'
+                self._count('resumed')
+            try:
+                with session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+                    if offset and response.status_code == 416:
+                        return  # the part file already holds the whole object
+                    response.raise_for_status()
+                    if 'text/html' in response.headers.get('content-type', ''):
+                        raise ValueError(f"Received HTML instead of a data file from {url}")
+                    # A server that ignores Range sends the whole body again
+                    mode = 'ab' if offset and response.status_code == 206 else 'wb'
+                    with open(part, mode) as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            if chunk:
+                                f.write(chunk)
+                                self._count('bytes_downloaded', len(chunk))
+                return
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"⚠ Download interrupted ({e}); resuming {part.name}")
+                time.sleep(2 ** attempt)
+
+    @staticmethod
+    def _digest(path, algorithm):
+        hasher = _hasher(algorithm)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def entries(self):
+        """(last_used, size, entry_dir) for every complete entry"""
+        result = []
+        for meta_path in self.objects.glob('*/*/meta.json'):
+            entry = meta_path.parent
+            meta = self._meta(entry)
+            if meta is None:
+                continue
+            path = entry / meta['filename']
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            result.append((stat.st_mtime, stat.st_size, entry))
+        return result
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Drop least recently used granules until the cache fits max_bytes"""
+        with _locked(self.root / '.evict.lock', blocking=False) as acquired:
+            if not acquired:
+                return  # another process is already trimming
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                # Skip entries another process is downloading into
+                with _locked(entry / '.lock', blocking=False) as free:
+                    if not free:
+                        continue
+                    meta = self._meta(entry)
+                    (entry / 'meta.json').unlink(missing_ok=True)
+                    if meta:
+                        (entry / meta['filename']).unlink(missing_ok=True)
+                total -= size
+                self._count('evicted')
+
+    def summary(self):
+        return {**self.stats, 'size_mb': round(self.size() / 1024 ** 2, 1),
+                'max_mb': round(self.max_bytes / 1024 ** 2, 1)}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_granule_cache():
+    """The process-wide granule cache used by the api_requests fetchers"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = GranuleCache()
+        return _shared
@@ -0,0 +1,161 @@
+import queue
+import asyncio
+import threading
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import Future, InvalidStateError
+
+
+class _Request:
+    __slots__ = ('model_key', 'X', 'future')
+
+    def __init__(self, model_key, X, future):
+        self.model_key = model_key
+        self.X = X
+        self.future = future
+
+
+class InferenceBatcher:
+    """
+    In-process micro-batching for model inference.
+
+    Handlers submit feature frames for a model key; a single worker thread
+    collects requests for up to `max_wait_ms`, runs one predict per model
+    of each key over the concatenated rows, and hands each caller back its
+    own slice. Inference also runs off the event loop this way.
+    """
+
+    def __init__(self, forecaster, max_wait_ms=5, max_batch_rows=4096):
+        self.forecaster = forecaster
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self._queue = queue.Queue()
+        self._worker = None
+        self._running = False
+        self.stats = {'requests': 0, 'batches': 0, 'rows': 0}
+
+    def start(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._running = True
+            self._worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        self._running = False
+        self._queue.put(None)
+        if self._worker:
+            self._worker.join(timeout=5)
+
+    def submit(self, model_key, X):
+        """Queue a frame; the Future resolves to {model_name: predictions}"""
+        future = Future()
+        if model_key not in self.forecaster.models:
+            future.set_exception(ValueError(f"Model for {model_key} not trained"))
+            return future
+        self._queue.put(_Request(model_key, X, future))
+        return future
+
+    async def predict(self, model_key, X):
+        """Awaitable per-model predictions for the rows of X"""
+        return await asyncio.wrap_future(self.submit(model_key, X))
+
+    async def predict_with_uncertainty(self, X, target_name='pm25', horizon=24):
+        """Batched equivalent of AirQualityForecaster.predict_with_uncertainty"""
+        per_model = await self.predict(f'{target_name}_{horizon}h', X)
+        return summarize(per_model)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the wait or row cap runs out"""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        rows = len(first.X)
+        deadline = time.monotonic() + self.max_wait
+
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._running = False
+                break
+            batch.append(request)
+            rows += len(request.X)
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+
+            # One bad batch must not kill the only worker (callers would hang)
+            try:
+                by_key = {}
+                for request in batch:
+                    by_key.setdefault(request.model_key, []).append(request)
+
+                for model_key, requests in by_key.items():
+                    self._predict_group(model_key, requests)
+
+                self.stats['requests'] += len(batch)
+                self.stats['batches'] += 1
+                self.stats['rows'] += sum(len(r.X) for r in batch)
+            except Exception as e:
+                print(f"⚠ Inference batch failed: {e}")
+                for request in batch:
+                    _resolve(request.future, exception=e)
+
+    def _predict_group(self, model_key, requests):
+        # Claim each future; ones cancelled by a disconnected or timed-out caller are skipped
+        requests = [r for r in requests if r.future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        try:
+            X = pd.concat([r.X for r in requests], ignore_index=True) if len(requests) > 1 else requests[0].X
+            models = self.forecaster.models[model_key]
+            predictions = {name: np.asarray(model.predict(X)) for name, model in models.items()}
+        except Exception as e:
+            for request in requests:
+                _resolve(request.future, exception=e)
+            return
+
+        offset = 0
+        for request in requests:
+            n = len(request.X)
+            _resolve(request.future, result={
+                name: pred[offset:offset + n] for name, pred in predictions.items()
+            })
+            offset += n
+
+
+def _resolve(future, result=None, exception=None):
+    """Settle a future unless it is already done"""
+    if future.done():
+        return
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def summarize(per_model):
+    """Mean, spread and 95% band across the ensemble members"""
+    predictions = np.array(list(per_model.values()))
+    mean_pred = predictions.mean(axis=0)
+    std_pred = predictions.std(axis=0)
+    return {
+        'mean': mean_pred,
+        'lower_95': mean_pred - 1.96 * std_pred,
+        'upper_95': mean_pred + 1.96 * std_pred,
+        'std': std_pred
+    }
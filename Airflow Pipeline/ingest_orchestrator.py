@@ -0,0 +1,198 @@
+"""
+Concurrent ingestion cycle
+
+Each source is fetched in its own thread, with a semaphore per upstream
+service (Earthdata, WAQI, Open-Meteo, ...) capping how many of its
+fetchers run at once. As soon as a fetch completes its inserts run on a
+connection borrowed from a shared pool, so a slow download no longer
+holds up the tables behind it. Per-source fetch and insert timings are
+printed and appended to a JSON-lines log. When a watermark store is given,
+a source's staged high-water mark is committed only after all of its
+inserts succeed.
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from psycopg2.pool import ThreadedConnectionPool
+
+
+DEFAULT_TIMINGS_LOG = os.getenv('INGEST_TIMINGS_LOG', './data_downloads/ingest_timings.jsonl')
+
+# Concurrent fetches allowed per upstream service
+UPSTREAM_LIMITS = {
+    'earthdata': int(os.getenv('INGEST_EARTHDATA_LIMIT', 4)),
+    'waqi': 2,
+    'open_meteo': 1,
+    'firms': 1,
+    'default': 4
+}
+
+
+class Source:
+    """One fetcher and the insert functions that consume its result"""
+
+    def __init__(self, name, fetch, inserts, upstream='default'):
+        self.name = name
+        self.fetch = fetch
+        self.inserts = inserts
+        self.upstream = upstream
+
+
+class IngestionOrchestrator:
+    def __init__(self, sources, db_params, setup=None, max_connections=4,
+                 upstream_limits=UPSTREAM_LIMITS, timings_log=DEFAULT_TIMINGS_LOG, watermarks=None):
+        self.sources = sources
+        self.db_params = db_params
+        self.setup = setup
+        self.watermarks = watermarks
+        self.max_connections = max_connections
+        self.upstream_limits = upstream_limits
+        self.timings_log = Path(timings_log) if timings_log else None
+
+        self.results = {}
+        self.timings = []
+        self._pool = None
+        self._db_slots = threading.BoundedSemaphore(max_connections)
+        self._tables_ready = threading.Event()
+        self._setup_error = None
+        self._upstreams = {}
+
+    def _upstream(self, name):
+        if name not in self._upstreams:
+            limit = self.upstream_limits.get(name, self.upstream_limits['default'])
+            self._upstreams[name] = threading.BoundedSemaphore(limit)
+        return self._upstreams[name]
+
+    def _connection(self):
+        """Borrow a pooled connection; the semaphore makes callers wait instead of PoolError"""
+        self._db_slots.acquire()
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._db_slots.release()
+            raise
+
+    def _release(self, conn):
+        try:
+            if not conn.closed:
+                conn.rollback()
+        finally:
+            self._pool.putconn(conn)
+            self._db_slots.release()
+
+    def _run_setup(self):
+        if self.setup is None:
+            self._tables_ready.set()
+            return
+        conn = self._connection()
+        try:
+            self.setup(conn)
+        except Exception as e:
+            self._setup_error = e
+        finally:
+            self._release(conn)
+            self._tables_ready.set()
+
+    def _run_source(self, source):
+        name, data, timing = self._fetch_and_insert(source)
+        if self.watermarks is not None:
+            if timing['status'] == 'ok':
+                self.watermarks.commit(source.name)
+            else:
+                self.watermarks.discard(source.name)
+        return name, data, timing
+
+    def _fetch_and_insert(self, source):
+        timing = {'source': source.name, 'upstream': source.upstream,
+                  'fetch_s': None, 'insert_s': None, 'status': 'ok', 'error': None}
+
+        start = time.perf_counter()
+        try:
+            with self._upstream(source.upstream):
+                data = source.fetch()
+        except Exception as e:
+            timing.update(fetch_s=round(time.perf_counter() - start, 2), status='fetch_failed', error=str(e))
+            return source.name, None, timing
+        timing['fetch_s'] = round(time.perf_counter() - start, 2)
+
+        if not data:
+            timing['status'] = 'empty'
+            return source.name, data, timing
+
+        self._tables_ready.wait()
+        if self._setup_error is not None:
+            timing.update(status='insert_failed', error=f"table setup failed: {self._setup_error}")
+            return source.name, data, timing
+
+        start = time.perf_counter()
+        conn = self._connection()
+        try:
+            for insert in source.inserts:
+                insert(conn, data)
+        except Exception as e:
+            timing.update(status='insert_failed', error=str(e))
+        finally:
+            self._release(conn)
+            timing['insert_s'] = round(time.perf_counter() - start, 2)
+        return source.name, data, timing
+
+    def run(self):
+        """Fetch and insert every source; returns {source name: fetched data}"""
+        cycle_start = time.perf_counter()
+        self._pool = ThreadedConnectionPool(1, self.max_connections, **self.db_params)
+        try:
+            setup_thread = threading.Thread(target=self._run_setup, name='ingest-setup')
+            setup_thread.start()
+
+            with ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix='ingest') as executor:
+                futures = [executor.submit(self._run_source, source) for source in self.sources]
+                for future in as_completed(futures):
+                    name, data, timing = future.result()
+                    self.results[name] = data
+                    self.timings.append(timing)
+                    mark = {'ok': '✓', 'empty': '⚠'}.get(timing['status'], '✗')
+                    print(f"{mark} {name}: fetch {timing['fetch_s']}s, insert {timing['insert_s']}s"
+                          + (f" ({timing['error']})" if timing['error'] else ""))
+
+            setup_thread.join()
+        finally:
+            self._pool.closeall()
+
+        self.cycle_s = round(time.perf_counter() - cycle_start, 2)
+        self.report()
+        return self.results
+
+    def failures(self):
+        return [t for t in self.timings if t['status'] in ('fetch_failed', 'insert_failed')]
+
+    def report(self):
+        timings = sorted(self.timings, key=lambda t: -((t['fetch_s'] or 0) + (t['insert_s'] or 0)))
+        serial_s = sum((t['fetch_s'] or 0) + (t['insert_s'] or 0) for t in timings)
+        slowest = timings[0] if timings else None
+
+        print(f"\n{'='*60}")
+        print(f"Ingestion cycle: {self.cycle_s}s for {len(timings)} sources "
+              f"(serial equivalent {serial_s:.1f}s)")
+        if slowest:
+            print(f"Slowest source: {slowest['source']} "
+                  f"({(slowest['fetch_s'] or 0) + (slowest['insert_s'] or 0):.1f}s)")
+        print(f"{'Source':<24} {'Upstream':<11} {'Fetch s':>8} {'Insert s':>9}  Status")
+        for t in timings:
+            print(f"{t['source']:<24} {t['upstream']:<11} {t['fetch_s'] or 0:>8.1f} "
+                  f"{t['insert_s'] or 0:>9.1f}  {t['status']}")
+        print(f"{'='*60}")
+
+        if self.timings_log:
+            self.timings_log.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.timings_log, 'a') as f:
+                f.write(json.dumps({
+                    'timestamp': datetime.now().isoformat(),
+                    'cycle_s': self.cycle_s,
+                    'serial_s': round(serial_s, 2),
+                    'sources': self.timings
+                }) + '\n')
@@ -1,4 +1,5 @@
 import psycopg2
+from db_frames import frame_rows, insert_frame
 
 # Move imports to the TOP of the file
 from api_requests import (
@@ -27,7 +28,10 @@ from api_requests import (
 
 
 from datetime import datetime, date
-import os
+from satellite_cube import SatelliteFeatureCube
+from waqi_collector import shared_collector
+from ingest_orchestrator import IngestionOrchestrator, Source
+from watermarks import shared_watermarks
 import pandas as pd
 import numpy as np
 import logging
@@ -38,16 +42,19 @@ logger = logging.getLogger(__name__)
 
 
 
+DB_PARAMS = {
+    'host': "localhost",
+    'port': "5000",
+    'dbname': "db",
+    'user': "db_user",
+    'password': "db_password"
+}
+
+
 def connect_to_db():
     print("Connecting to the PostgreSQL database...")
     try:
-        conn = psycopg2.connect(
-            host="localhost",
-            port="5000",
-            dbname="db",
-            user="db_user",
-            password="db_password"
-        )
+        conn = psycopg2.connect(**DB_PARAMS)
         return conn
     except psycopg2.Error as e:
         print(f"Database connection failed: {e}")
@@ -159,6 +166,12 @@ def create_table(conn):
         
         CREATE INDEX IF NOT EXISTS idx_air_quality_city 
         ON air_quality_data(city);
+        
+        CREATE INDEX IF NOT EXISTS idx_air_quality_city_time 
+        ON air_quality_data(city, datetime_utc DESC);
+        
+        CREATE INDEX IF NOT EXISTS idx_air_quality_created 
+        ON air_quality_data(created_at);
         """
 
         # Create Pandora HCHO data table
@@ -710,6 +723,14 @@ def create_table(conn):
         cursor.execute(create_weather_grid_table_query)
         cursor.execute(create_aq_station_forecast_table_query)
         cursor.execute(create_waqi_city_forecast_table_query)
+
+        # Aggregated TEMPO rows (one per grid cell) carry their pixel count and QA pass fraction
+        for table in ('tempo_hcho_data', 'tempo_no2_data', 'no2_pipeline_data'):
+            cursor.execute(f"""
+            ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS pixel_count INTEGER,
+                ADD COLUMN IF NOT EXISTS qa_fraction DOUBLE PRECISION;
+            """)
         
 
 
@@ -720,103 +741,30 @@ def create_table(conn):
         print(f"Failed to create table: {e}")
         raise
 
-def validate_hcho_record(record, metadata):
-    """Validate HCHO record data before insertion"""
-    errors = []
-    
-    # Required fields
-    if record.get('latitude') is None:
-        errors.append("Missing latitude")
-    elif not (-90 <= record.get('latitude') <= 90):
-        errors.append(f"Invalid latitude: {record.get('latitude')}")
-    
-    if record.get('longitude') is None:
-        errors.append("Missing longitude")
-    elif not (-180 <= record.get('longitude') <= 180):
-        errors.append(f"Invalid longitude: {record.get('longitude')}")
-    
-    if record.get('hcho_total_column') is None:
-        errors.append("Missing hcho_total_column")
-    elif not isinstance(record.get('hcho_total_column'), (int, float)):
-        errors.append(f"Invalid hcho_total_column type: {type(record.get('hcho_total_column'))}")
-    
-    if metadata.get('export_date') is None:
-        errors.append("Missing export_date")
-    
-    # Optional but should be valid if present
-    if record.get('hcho_uncertainty') is not None:
-        if not isinstance(record.get('hcho_uncertainty'), (int, float)):
-            errors.append(f"Invalid hcho_uncertainty type")
-        elif record.get('hcho_uncertainty') < 0:
-            errors.append(f"Invalid hcho_uncertainty: must be non-negative")
-    
-    if record.get('quality_flag') is not None:
-        if not isinstance(record.get('quality_flag'), int):
-            errors.append(f"Invalid quality_flag type: must be integer")
-    
-    return errors
-
-def validate_no2_record(record):
-    """Validate NO2 record data before insertion"""
-    errors = []
-    
-    # Required fields
-    if record.get('latitude') is None:
-        errors.append("Missing latitude")
-    elif not (-90 <= record.get('latitude') <= 90):
-        errors.append(f"Invalid latitude: {record.get('latitude')}")
-    
-    if record.get('longitude') is None:
-        errors.append("Missing longitude")
-    elif not (-180 <= record.get('longitude') <= 180):
-        errors.append(f"Invalid longitude: {record.get('longitude')}")
-    
-    if record.get('no2_tropospheric_column') is None:
-        errors.append("Missing no2_tropospheric_column")
-    elif not isinstance(record.get('no2_tropospheric_column'), (int, float)):
-        errors.append(f"Invalid no2_tropospheric_column type")
-    
-    if record.get('observation_datetime') is None:
-        errors.append("Missing observation_datetime")
-    
-    # Optional but should be valid if present
-    if record.get('log_no2') is not None:
-        if not isinstance(record.get('log_no2'), (int, float)):
-            errors.append(f"Invalid log_no2 type")
-    
-    if record.get('hours_old') is not None:
-        if not isinstance(record.get('hours_old'), (int, float)):
-            errors.append(f"Invalid hours_old type")
-        elif record.get('hours_old') < 0:
-            errors.append(f"Invalid hours_old: must be non-negative")
-    
-    return errors
-
-def validate_merra2_record(record, metadata):
-    """Validate a MERRA-2 data record"""
-    errors = []
-    
-    # Check required fields
-    if 'latitude' not in record or record['latitude'] is None:
-        errors.append("Missing latitude")
-    elif not (-90 <= record['latitude'] <= 90):
-        errors.append(f"Invalid latitude: {record['latitude']}")
-    
-    if 'longitude' not in record or record['longitude'] is None:
-        errors.append("Missing longitude")
-    elif not (-180 <= record['longitude'] <= 180):
-        errors.append(f"Invalid longitude: {record['longitude']}")
-    
-    if 'variable' not in record or not record['variable']:
-        errors.append("Missing variable")
-    
-    if 'value' not in record or record['value'] is None:
-        errors.append("Missing value")
-    
-    if 'timestamp' not in record or not record['timestamp']:
-        errors.append("Missing timestamp")
-    
-    return errors
+def validate_hcho_frame(frame):
+    """Mask of valid HCHO rows: coordinates in range, column present, uncertainty non-negative"""
+    uncertainty = frame.get('hcho_uncertainty', pd.Series(np.nan, index=frame.index))
+    return (frame['latitude'].between(-90, 90) &
+            frame['longitude'].between(-180, 180) &
+            frame['hcho_total_column'].notna() &
+            (uncertainty.isna() | (uncertainty >= 0)))
+
+def validate_no2_frame(frame):
+    """Mask of valid TEMPO NO2 rows: coordinates in range, column and time present, age non-negative"""
+    hours_old = frame.get('hours_old', pd.Series(np.nan, index=frame.index))
+    return (frame['latitude'].between(-90, 90) &
+            frame['longitude'].between(-180, 180) &
+            frame['no2_tropospheric_column'].notna() &
+            frame['observation_datetime'].notna() &
+            (hours_old.isna() | (hours_old >= 0)))
+
+def validate_merra2_frame(frame):
+    """Mask of valid MERRA-2 rows: coordinates in range, variable, value and time present"""
+    return (frame['latitude'].between(-90, 90) &
+            frame['longitude'].between(-180, 180) &
+            frame['variable'].notna() &
+            frame['value'].notna() &
+            frame['time'].notna())
 
 def validate_air_quality_record(record, metadata):
     """Validate air quality record data before insertion"""
@@ -868,53 +816,19 @@ def validate_pandora_hcho_record(record, metadata):
     
     return errors
 
-def validate_pblh_record(record, metadata):
-    """Validate PBLH record data before insertion"""
-    errors = []
-    
-    if 'latitude' not in record or record['latitude'] is None:
-        errors.append("Missing latitude")
-    elif not (-90 <= record['latitude'] <= 90):
-        errors.append(f"Invalid latitude: {record['latitude']}")
-    
-    if 'longitude' not in record or record['longitude'] is None:
-        errors.append("Missing longitude")
-    elif not (-180 <= record['longitude'] <= 180):
-        errors.append(f"Invalid longitude: {record['longitude']}")
-    
-    if 'timestamp' not in record or not record['timestamp']:
-        errors.append("Missing timestamp")
-    
-    if 'pbl_height_m' not in record or record['pbl_height_m'] is None:
-        errors.append("Missing pbl_height_m")
-    elif not isinstance(record['pbl_height_m'], (int, float)):
-        errors.append(f"Invalid pbl_height_m type")
-    
-    return errors
+def validate_pblh_frame(frame):
+    """Mask of valid PBLH rows: coordinates in range, timestamp and height present"""
+    return (frame['latitude'].between(-90, 90) &
+            frame['longitude'].between(-180, 180) &
+            frame['timestamp'].notna() &
+            frame['pbl_height_m'].notna())
 
-def validate_no2_pipeline_record(record, metadata):
-    """Validate NO2 pipeline record data before insertion"""
-    errors = []
-    
-    if 'latitude' not in record or record['latitude'] is None:
-        errors.append("Missing latitude")
-    elif not (-90 <= record['latitude'] <= 90):
-        errors.append(f"Invalid latitude: {record['latitude']}")
-    
-    if 'longitude' not in record or record['longitude'] is None:
-        errors.append("Missing longitude")
-    elif not (-180 <= record['longitude'] <= 180):
-        errors.append(f"Invalid longitude: {record['longitude']}")
-    
-    if 'observation_datetime_utc' not in record or not record['observation_datetime_utc']:
-        errors.append("Missing observation_datetime_utc")
-    
-    if 'no2_tropospheric_column' not in record or record['no2_tropospheric_column'] is None:
-        errors.append("Missing no2_tropospheric_column")
-    elif not isinstance(record['no2_tropospheric_column'], (int, float)):
-        errors.append(f"Invalid no2_tropospheric_column type")
-    
-    return errors
+def validate_no2_pipeline_frame(frame):
+    """Mask of valid NO2 pipeline rows: coordinates in range, time and column present"""
+    return (frame['latitude'].between(-90, 90) &
+            frame['longitude'].between(-180, 180) &
+            frame['observation_datetime_utc'].notna() &
+            frame['no2_tropospheric_column'].notna())
 
 def validate_tolnet_record(record, metadata):
     """Validate TOLNet record data before insertion"""
@@ -1121,27 +1035,12 @@ def validate_fire_record(record, metadata):
     
     return errors
 
-def validate_weather_grid_record(record, metadata):
-    """Validate enhanced weather grid record"""
-    errors = []
-    
-    if 'latitude' not in record or record['latitude'] is None:
-        errors.append("Missing latitude")
-    elif not (-90 <= record['latitude'] <= 90):
-        errors.append(f"Invalid latitude: {record['latitude']}")
-    
-    if 'longitude' not in record or record['longitude'] is None:
-        errors.append("Missing longitude")
-    elif not (-180 <= record['longitude'] <= 180):
-        errors.append(f"Invalid longitude: {record['longitude']}")
-    
-    if 'timestamp' not in record or not record['timestamp']:
-        errors.append("Missing timestamp")
-    
-    if 'temperature_c' not in record or record['temperature_c'] is None:
-        errors.append("Missing temperature_c")
-    
-    return errors
+def validate_weather_grid_frame(frame):
+    """Mask of valid enhanced weather grid rows"""
+    return (frame['latitude'].between(-90, 90) &
+            frame['longitude'].between(-180, 180) &
+            frame['timestamp'].notna() &
+            frame['temperature_c'].notna())
 
 
 
@@ -1465,54 +1364,42 @@ def insert_records(conn, data):
         source_file = metadata.get('source_file', 'unknown')
         export_date = metadata.get('export_date', None)
         
-        # Extract data records
-        records = data.get('data', [])
+        # Columns: latitude, longitude, hcho_total_column, hcho_uncertainty, quality_flag,
+        # hcho_units (+ pixel_count, qa_fraction when aggregated)
+        frame = data.get('frame')
         
-        if not records:
+        if frame is None or frame.empty:
             print("No HCHO data records to insert")
             return
         
+        if export_date is None:
+            print("Skipping HCHO data: missing export_date")
+            return
+        
         # Insert query with ON CONFLICT DO NOTHING
         insert_query = """
         INSERT INTO tempo_hcho_data 
         (source_file, export_date, latitude, longitude, hcho_total_column, 
-         hcho_units, hcho_uncertainty, quality_flag)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+         hcho_units, hcho_uncertainty, quality_flag, pixel_count, qa_fraction)
+        VALUES %s
         ON CONFLICT (latitude, longitude, hcho_total_column, export_date) DO NOTHING
+        RETURNING 1
         """
         
-        # Validate and prepare data for batch insert
-        insert_data = []
-        invalid_count = 0
-        
-        for i, record in enumerate(records):
-            # Validate record
-            validation_errors = validate_hcho_record(record, metadata)
-            
-            if validation_errors:
-                invalid_count += 1
-                print(f"Skipping invalid HCHO record {i+1}: {'; '.join(validation_errors)}")
-                continue
-            
-            insert_data.append((
-                source_file,
-                export_date,
-                record.get('latitude'),
-                record.get('longitude'),
-                record.get('hcho_total_column'),
-                record.get('hcho_units'),
-                record.get('hcho_uncertainty'),
-                record.get('quality_flag')
-            ))
+        # Validate whole columns at once
+        valid = validate_hcho_frame(frame)
+        invalid_count = int((~valid).sum())
+        frame = frame[valid].assign(source_file=source_file, export_date=export_date)
         
         # Execute batch insert
-        if insert_data:
-            initial_count = len(insert_data)
-            cursor.executemany(insert_query, insert_data)
-            inserted_count = cursor.rowcount
+        if not frame.empty:
+            inserted_count = insert_frame(cursor, insert_query, frame,
+                                          ['source_file', 'export_date', 'latitude', 'longitude',
+                                           'hcho_total_column', 'hcho_units', 'hcho_uncertainty',
+                                           'quality_flag', 'pixel_count', 'qa_fraction'])
             conn.commit()
             
-            duplicate_count = initial_count - inserted_count
+            duplicate_count = len(frame) - inserted_count
             print(f"HCHO data insertion completed:")
             print(f"  - New records inserted: {inserted_count}")
             print(f"  - Duplicate records skipped: {duplicate_count}")
@@ -1537,10 +1424,11 @@ def insert_no2_records(conn, data1):
             print("No NO2 data available or collection failed")
             return
         
-        # Extract data records
-        records = data1.get('data', [])
+        # Columns: no2_tropospheric_column, latitude, longitude, observation_datetime,
+        # file_name, hours_old, log_no2 (+ pixel_count, qa_fraction when aggregated)
+        frame = data1.get('frame')
         
-        if not records:
+        if frame is None or frame.empty:
             print("No NO2 data records to insert")
             return
         
@@ -1548,42 +1436,26 @@ def insert_no2_records(conn, data1):
         insert_query = """
         INSERT INTO tempo_no2_data 
         (source_file, observation_datetime, latitude, longitude, 
-         no2_tropospheric_column, log_no2, hours_old)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
+         no2_tropospheric_column, log_no2, hours_old, pixel_count, qa_fraction)
+        VALUES %s
         ON CONFLICT (latitude, longitude, no2_tropospheric_column, observation_datetime) DO NOTHING
+        RETURNING 1
         """
         
-        # Validate and prepare data for batch insert
-        insert_data = []
-        invalid_count = 0
-        
-        for i, record in enumerate(records):
-            # Validate record
-            validation_errors = validate_no2_record(record)
-            
-            if validation_errors:
-                invalid_count += 1
-                print(f"Skipping invalid NO2 record {i+1}: {'; '.join(validation_errors)}")
-                continue
-            
-            insert_data.append((
-                record.get('file_name', 'unknown'),
-                record.get('observation_datetime'),
-                record.get('latitude'),
-                record.get('longitude'),
-                record.get('no2_tropospheric_column'),
-                record.get('log_no2'),
-                record.get('hours_old')
-            ))
+        # Validate whole columns at once
+        valid = validate_no2_frame(frame)
+        invalid_count = int((~valid).sum())
+        frame = frame[valid]
         
         # Execute batch insert
-        if insert_data:
-            initial_count = len(insert_data)
-            cursor.executemany(insert_query, insert_data)
-            inserted_count = cursor.rowcount
+        if not frame.empty:
+            inserted_count = insert_frame(cursor, insert_query, frame,
+                                          ['file_name', 'observation_datetime', 'latitude', 'longitude',
+                                           'no2_tropospheric_column', 'log_no2', 'hours_old',
+                                           'pixel_count', 'qa_fraction'])
             conn.commit()
             
-            duplicate_count = initial_count - inserted_count
+            duplicate_count = len(frame) - inserted_count
             print(f"NO2 data insertion completed:")
             print(f"  - New records inserted: {inserted_count}")
             print(f"  - Duplicate records skipped: {duplicate_count}")
@@ -1598,6 +1470,9 @@ def insert_no2_records(conn, data1):
         conn.rollback()
         raise
 
+# Units of the M2T1NXSLV variables
+MERRA2_UNITS = {'T2M': 'K', 'QV2M': 'kg/kg', 'U10M': 'm/s', 'V10M': 'm/s', 'PS': 'Pa', 'SLP': 'Pa'}
+
 def insert_merra2_records(conn, data2):
     print("Inserting MERRA-2 data into the database...")
     try:
@@ -1611,25 +1486,15 @@ def insert_merra2_records(conn, data2):
         version = summary.get('version', '')
         collection_timestamp = summary.get('collection_timestamp', '')
         
-        # Parse granule times from summary
-        granule_time_start = summary.get('granule_time_start')
-        granule_time_end = summary.get('granule_time_end')
-        
-        # Convert ISO timestamps to datetime if needed
-        if granule_time_start and isinstance(granule_time_start, str):
-            granule_time_start = datetime.fromisoformat(granule_time_start.replace('Z', '+00:00'))
-        if granule_time_end and isinstance(granule_time_end, str):
-            granule_time_end = datetime.fromisoformat(granule_time_end.replace('Z', '+00:00'))
-        
-        # Extract data records - try multiple possible keys
-        records = data2.get('records', data2.get('data', data2.get('records_preview', [])))
+        # Columns: time, variable, latitude, longitude, value, granule_time_start/end
+        frame = data2.get('frame')
         
-        if not records:
+        if frame is None or frame.empty:
             print("No MERRA-2 data records to insert")
             print(f"Available keys in data2: {list(data2.keys())}")
             return
         
-        print(f"Found {len(records)} MERRA-2 records to process")
+        print(f"Found {len(frame)} MERRA-2 records to process")
         
         # Insert query with ON CONFLICT DO NOTHING
         insert_query = """
@@ -1638,72 +1503,44 @@ def insert_merra2_records(conn, data2):
          granule_time_start, granule_time_end, latitude, longitude, 
          variable_name, variable_value, variable_units, quality_flag, 
          collection_timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (latitude, longitude, variable_name, granule_time_start, variable_value) 
         DO NOTHING
+        RETURNING 1
         """
         
-        # Validate and prepare data for batch insert
-        insert_data = []
-        invalid_count = 0
-        
-        for i, record in enumerate(records):
-            # Validate record
-            validation_errors = validate_merra2_record(record, summary)
-            
-            if validation_errors:
-                invalid_count += 1
-                if i < 5:  # Only print first 5 errors to avoid spam
-                    print(f"Skipping invalid MERRA-2 record {i+1}: {'; '.join(validation_errors)}")
-                continue
-            
-            # Parse the timestamp from the record
-            record_timestamp = record.get('timestamp')
-            if record_timestamp and isinstance(record_timestamp, str):
-                record_timestamp = datetime.fromisoformat(record_timestamp.replace('Z', ''))
-            
-            # Determine units based on variable name
-            variable_name = record.get('variable')
-            variable_units = ''
-            if variable_name == 'T2M':
-                variable_units = 'K'
-            elif variable_name == 'QV2M':
-                variable_units = 'kg/kg'
-            elif variable_name in ['U10M', 'V10M']:
-                variable_units = 'm/s'
-            elif variable_name in ['PS', 'SLP']:
-                variable_units = 'Pa'
-            
-            insert_data.append((
-                source_file,
-                collection,
-                short_name,
-                version,
-                record_timestamp,  # export_date = timestamp from record
-                granule_time_start,
-                granule_time_end,
-                record.get('latitude'),
-                record.get('longitude'),
-                variable_name,  # variable instead of variable_name
-                record.get('value'),  # value instead of variable_value
-                variable_units,
-                None,  # quality_flag not in this structure
-                collection_timestamp
-            ))
+        # Validate whole columns at once
+        valid = validate_merra2_frame(frame)
+        invalid_count = int((~valid).sum())
+        if invalid_count:
+            print(f"Skipping {invalid_count} invalid MERRA-2 records")
+        
+        # export_date is the record's own time step
+        frame = frame[valid].assign(
+            source_file=source_file,
+            collection=collection,
+            short_name=short_name,
+            version=version,
+            variable_units=frame['variable'].map(MERRA2_UNITS).fillna(''),
+            quality_flag=None,  # quality_flag not in this structure
+            collection_timestamp=collection_timestamp
+        )
         
         # Execute batch insert
-        if insert_data:
-            initial_count = len(insert_data)
-            cursor.executemany(insert_query, insert_data)
-            inserted_count = cursor.rowcount
+        if not frame.empty:
+            inserted_count = insert_frame(cursor, insert_query, frame,
+                                          ['source_file', 'collection', 'short_name', 'version', 'time',
+                                           'granule_time_start', 'granule_time_end', 'latitude', 'longitude',
+                                           'variable', 'value', 'variable_units', 'quality_flag',
+                                           'collection_timestamp'])
             conn.commit()
             
-            duplicate_count = initial_count - inserted_count
+            duplicate_count = len(frame) - inserted_count
             print(f"MERRA-2 data insertion completed:")
             print(f"  - New records inserted: {inserted_count}")
             print(f"  - Duplicate records skipped: {duplicate_count}")
             print(f"  - Invalid records skipped: {invalid_count}")
-            print(f"  - Total records processed: {len(records)}")
+            print(f"  - Total records processed: {len(frame) + invalid_count}")
         else:
             print("No valid MERRA-2 records to insert")
         
@@ -1946,72 +1783,57 @@ def insert_pblh_records(conn, data5):
         collection_version = summary.get('collection_version', '')
         collection_timestamp = summary.get('collection_timestamp', '')
         data_source = summary.get('data_source', 'MERRA-2')
-        variable = summary.get('variable', 'PBLH')
+        unit = summary.get('unit', 'meters')
         
-        # Extract data records
-        records = data5.get('records', data5.get('data', data5.get('records_preview', [])))
+        # Columns: latitude, longitude, timestamp, pbl_height_m
+        frame = data5.get('frame')
         
-        if not records:
+        if frame is None or frame.empty:
             print("No PBLH data records to insert")
             return
         
-        print(f"Found {len(records)} PBLH records to process")
+        print(f"Found {len(frame)} PBLH records to process")
         
         # Insert query with ON CONFLICT DO NOTHING
         insert_query = """
         INSERT INTO pblh_data 
         (latitude, longitude, timestamp, pbl_height_m, data_source, 
          variable, unit, collection, collection_version, collection_timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (latitude, longitude, timestamp, pbl_height_m) 
         DO NOTHING
+        RETURNING 1
         """
         
-        # Validate and prepare data for batch insert
-        insert_data = []
-        invalid_count = 0
-        
-        for i, record in enumerate(records):
-            # Validate record
-            validation_errors = validate_pblh_record(record, summary)
-            
-            if validation_errors:
-                invalid_count += 1
-                if i < 5:
-                    print(f"Skipping invalid PBLH record {i+1}: {'; '.join(validation_errors)}")
-                continue
-            
-            # Parse timestamp
-            timestamp = record.get('timestamp')
-            if timestamp and isinstance(timestamp, str):
-                timestamp = datetime.fromisoformat(timestamp.replace('Z', ''))
-            
-            insert_data.append((
-                record.get('latitude'),
-                record.get('longitude'),
-                timestamp,
-                record.get('pbl_height_m'),
-                record.get('data_source', data_source),
-                record.get('variable', variable),
-                record.get('unit', 'meters'),
-                collection,
-                collection_version,
-                collection_timestamp
-            ))
+        # Validate whole columns at once
+        valid = validate_pblh_frame(frame)
+        invalid_count = int((~valid).sum())
+        if invalid_count:
+            print(f"Skipping {invalid_count} invalid PBLH records")
+        
+        frame = frame[valid].assign(
+            data_source=data_source,
+            variable='PBLH',
+            unit=unit,
+            collection=collection,
+            collection_version=collection_version,
+            collection_timestamp=collection_timestamp
+        )
         
         # Execute batch insert
-        if insert_data:
-            initial_count = len(insert_data)
-            cursor.executemany(insert_query, insert_data)
-            inserted_count = cursor.rowcount
+        if not frame.empty:
+            inserted_count = insert_frame(cursor, insert_query, frame,
+                                          ['latitude', 'longitude', 'timestamp', 'pbl_height_m', 'data_source',
+                                           'variable', 'unit', 'collection', 'collection_version',
+                                           'collection_timestamp'])
             conn.commit()
             
-            duplicate_count = initial_count - inserted_count
+            duplicate_count = len(frame) - inserted_count
             print(f"PBLH data insertion completed:")
             print(f"  - New records inserted: {inserted_count}")
             print(f"  - Duplicate records skipped: {duplicate_count}")
             print(f"  - Invalid records skipped: {invalid_count}")
-            print(f"  - Total records processed: {len(records)}")
+            print(f"  - Total records processed: {len(frame) + invalid_count}")
         else:
             print("No valid PBLH records to insert")
         
@@ -2051,80 +1873,48 @@ def insert_no2_pipeline_records(conn, data6):
         summary = data6.get('summary', {})
         collection_timestamp = summary.get('collection_timestamp', '')
         
-        # Extract data records - try multiple possible keys
-        records = data6.get('records', data6.get('data', data6.get('records_preview', [])))
+        # Columns: no2_tropospheric_column, latitude, longitude, observation_datetime_utc,
+        # file_name, data_source (+ pixel_count, qa_fraction when aggregated)
+        frame = data6.get('frame')
         
-        if not records:
+        if frame is None or frame.empty:
             print("No NO2 Pipeline data records to insert")
             print(f"Data structure received: {list(data6.keys())}")
             return
         
-        print(f"Found {len(records)} NO2 Pipeline records to process")
+        print(f"Found {len(frame)} NO2 Pipeline records to process")
         
         # Insert query with ON CONFLICT DO NOTHING
         insert_query = """
         INSERT INTO no2_pipeline_data 
         (no2_tropospheric_column, longitude, latitude, observation_datetime_utc, 
-         file_name, data_source, collection_timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
+         file_name, data_source, collection_timestamp, pixel_count, qa_fraction)
+        VALUES %s
         ON CONFLICT (latitude, longitude, no2_tropospheric_column, observation_datetime_utc, file_name) 
         DO NOTHING
+        RETURNING 1
         """
         
-        # Validate and prepare data for batch insert
-        insert_data = []
-        invalid_count = 0
-        
-        for i, record in enumerate(records):
-            if not record:  # Skip None or empty dict
-                invalid_count += 1
-                if i < 5:
-                    print(f"Skipping invalid NO2 Pipeline record {i+1}: record is None or empty")
-                continue
-
-            # Validate record
-            validation_errors = validate_no2_pipeline_record(record, summary)
-            
-            if validation_errors:
-                invalid_count += 1
-                if i < 5:
-                    print(f"Skipping invalid NO2 Pipeline record {i+1}: {'; '.join(validation_errors)}")
-                continue
-            
-            # Parse observation datetime
-            observation_datetime = record.get('observation_datetime_utc')
-            if observation_datetime and isinstance(observation_datetime, str):
-                try:
-                    observation_datetime = datetime.fromisoformat(observation_datetime.replace('Z', '+00:00'))
-                except (ValueError, AttributeError) as e:
-                    if i < 5:
-                        print(f"Skipping record {i+1}: Invalid datetime format: {e}")
-                    invalid_count += 1
-                    continue
-            
-            insert_data.append((
-                record.get('no2_tropospheric_column'),
-                record.get('longitude'),
-                record.get('latitude'),
-                observation_datetime,
-                record.get('file_name'),
-                record.get('data_source', 'TEMPO_NO2_L2'),
-                collection_timestamp
-            ))
+        # Validate whole columns at once
+        valid = validate_no2_pipeline_frame(frame)
+        invalid_count = int((~valid).sum())
+        total_count = len(frame)
+        frame = frame[valid].assign(collection_timestamp=collection_timestamp)
         
         # Execute batch insert
-        if insert_data:
-            initial_count = len(insert_data)
-            cursor.executemany(insert_query, insert_data)
-            inserted_count = cursor.rowcount
+        if not frame.empty:
+            inserted_count = insert_frame(cursor, insert_query, frame,
+                                          ['no2_tropospheric_column', 'longitude', 'latitude',
+                                           'observation_datetime_utc', 'file_name', 'data_source',
+                                           'collection_timestamp', 'pixel_count', 'qa_fraction'])
             conn.commit()
             
-            duplicate_count = initial_count - inserted_count
+            duplicate_count = len(frame) - inserted_count
             print(f"NO2 Pipeline data insertion completed:")
             print(f"  - New records inserted: {inserted_count}")
             print(f"  - Duplicate records skipped: {duplicate_count}")
             print(f"  - Invalid records skipped: {invalid_count}")
-            print(f"  - Total records processed: {len(records)}")
+            print(f"  - Total records processed: {total_count}")
         else:
             print("No valid NO2 Pipeline records to insert after validation")
         
@@ -2423,7 +2213,7 @@ def insert_goes_records(conn, data9):
         conn.rollback()
         raise
 def insert_goes_processed_data(conn, data9):
-    """Insert GOES processed data from CSV files"""
+    """Insert the sampled GOES values handed over as typed columns per satellite"""
     print("Inserting GOES processed data into the database...")
     try:
         if data9 is None or not isinstance(data9, dict):
@@ -2433,50 +2223,32 @@ def insert_goes_processed_data(conn, data9):
         cursor = conn.cursor()
         summary = data9.get('summary', {})
         collection_timestamp = summary.get('timestamp', '')
-        csv_files = data9.get('csv_files', {})
+        frames = data9.get('frames', {})
         
         insert_query = """
         INSERT INTO goes_processed_data 
         (satellite, variable, value, data_type, row_index, col_index, index_1d, collection_timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (satellite, variable, row_index, col_index, index_1d, collection_timestamp) 
         DO NOTHING
+        RETURNING 1
         """
         
         for sat in ['GOES18', 'GOES16']:
-            csv_file = csv_files.get(f'{sat}_data')
-            if not csv_file or not os.path.exists(csv_file):
+            frame = frames.get(sat)
+            if frame is None or frame.empty:
                 continue
             
-            print(f"Reading {sat} processed data from {csv_file}")
-            df = pd.read_csv(csv_file)
-            
-            insert_data = []
-            for _, row in df.iterrows():
-                row_idx = row.get('row') if pd.notna(row.get('row')) else None
-                col_idx = row.get('col') if pd.notna(row.get('col')) else None
-                idx_1d = row.get('index') if pd.notna(row.get('index')) else None
-                
-                insert_data.append((
-                    sat,
-                    row.get('variable'),
-                    row.get('value'),
-                    row.get('type'),
-                    row_idx,
-                    col_idx,
-                    idx_1d,
-                    collection_timestamp
-                ))
+            print(f"Loading {len(frame)} {sat} processed values")
+            frame = frame.assign(satellite=sat, collection_timestamp=collection_timestamp)
+            inserted_count = insert_frame(cursor, insert_query, frame,
+                                          ['satellite', 'variable', 'value', 'type', 'row', 'col',
+                                           'index', 'collection_timestamp'])
+            conn.commit()
             
-            if insert_data:
-                initial_count = len(insert_data)
-                cursor.executemany(insert_query, insert_data)
-                inserted_count = cursor.rowcount
-                conn.commit()
-                
-                print(f"{sat} processed data insertion:")
-                print(f"  - New records inserted: {inserted_count}")
-                print(f"  - Duplicate records skipped: {initial_count - inserted_count}")
+            print(f"{sat} processed data insertion:")
+            print(f"  - New records inserted: {inserted_count}")
+            print(f"  - Duplicate records skipped: {len(frame) - inserted_count}")
         
         cursor.close()
         
@@ -2486,7 +2258,7 @@ def insert_goes_processed_data(conn, data9):
         raise
 
 def insert_goes_imagery_data(conn, data9):
-    """Insert GOES imagery data from CSV files"""
+    """Insert the 2-D GOES imagery samples from the per-satellite columns"""
     print("Inserting GOES imagery data into the database...")
     try:
         if data9 is None or not isinstance(data9, dict):
@@ -2496,44 +2268,34 @@ def insert_goes_imagery_data(conn, data9):
         cursor = conn.cursor()
         summary = data9.get('summary', {})
         collection_timestamp = summary.get('timestamp', '')
-        csv_files = data9.get('csv_files', {})
+        frames = data9.get('frames', {})
         
         insert_query = """
         INSERT INTO goes_imagery_data 
         (satellite, variable, row_index, col_index, value, collection_timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (satellite, variable, row_index, col_index, collection_timestamp) 
         DO NOTHING
+        RETURNING 1
         """
         
         for sat in ['GOES18', 'GOES16']:
-            csv_file = csv_files.get(f'{sat}_imagery')
-            if not csv_file or not os.path.exists(csv_file):
+            frame = frames.get(sat)
+            if frame is None or frame.empty:
+                continue
+            imagery = frame[frame['type'] == '2d_array']
+            if imagery.empty:
                 continue
             
-            print(f"Reading {sat} imagery data from {csv_file}")
-            df = pd.read_csv(csv_file)
-            
-            insert_data = []
-            for _, row in df.iterrows():
-                insert_data.append((
-                    sat,
-                    row.get('variable'),
-                    row.get('row'),
-                    row.get('col'),
-                    row.get('value'),
-                    collection_timestamp
-                ))
+            print(f"Loading {len(imagery)} {sat} imagery values")
+            imagery = imagery.assign(satellite=sat, collection_timestamp=collection_timestamp)
+            inserted_count = insert_frame(cursor, insert_query, imagery,
+                                          ['satellite', 'variable', 'row', 'col', 'value', 'collection_timestamp'])
+            conn.commit()
             
-            if insert_data:
-                initial_count = len(insert_data)
-                cursor.executemany(insert_query, insert_data)
-                inserted_count = cursor.rowcount
-                conn.commit()
-                
-                print(f"{sat} imagery data insertion:")
-                print(f"  - New records inserted: {inserted_count}")
-                print(f"  - Duplicate records skipped: {initial_count - inserted_count}")
+            print(f"{sat} imagery data insertion:")
+            print(f"  - New records inserted: {inserted_count}")
+            print(f"  - Duplicate records skipped: {len(imagery) - inserted_count}")
         
         cursor.close()
         
@@ -2890,67 +2652,39 @@ def insert_enhanced_weather_grid_records(conn, data14):
         summary = data14.get('summary', {})
         collection_timestamp = summary.get('execution', {}).get('start_time', '')
         
-        records = data14.get('records', [])
+        frame = data14.get('frame')
         
-        if not records:
+        if frame is None or frame.empty:
             print("No Enhanced Weather Grid records to insert")
             return
         
-        print(f"Found {len(records)} Enhanced Weather Grid records to process")
+        print(f"Found {len(frame)} Enhanced Weather Grid records to process")
         
         insert_query = """
         INSERT INTO enhanced_weather_grid_data 
         (timestamp, latitude, longitude, temperature_c, humidity_percent, 
          precipitation_mm, wind_speed_kmh, pressure_hpa, cloud_cover_percent, 
          collection_timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (timestamp, latitude, longitude) 
         DO NOTHING
+        RETURNING 1
         """
         
-        insert_data = []
-        invalid_count = 0
-        
-        for i, record in enumerate(records):
-            validation_errors = validate_weather_grid_record(record, summary)
-            
-            if validation_errors:
-                invalid_count += 1
-                if i < 5:
-                    print(f"Skipping invalid record {i+1}: {'; '.join(validation_errors)}")
-                continue
-            
-            # Parse timestamp
-            timestamp = record.get('timestamp')
-            if timestamp and isinstance(timestamp, str):
-                try:
-                    timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                except ValueError:
-                    invalid_count += 1
-                    continue
-            
-            insert_data.append((
-                timestamp,
-                record.get('latitude'),
-                record.get('longitude'),
-                record.get('temperature_c'),
-                record.get('humidity_percent'),
-                record.get('precipitation_mm'),
-                record.get('wind_speed_kmh'),
-                record.get('pressure_hpa'),
-                record.get('cloud_cover_percent'),
-                collection_timestamp
-            ))
+        valid = validate_weather_grid_frame(frame)
+        invalid_count = int((~valid).sum())
+        frame = frame[valid].assign(collection_timestamp=collection_timestamp)
         
-        if insert_data:
-            initial_count = len(insert_data)
-            cursor.executemany(insert_query, insert_data)
-            inserted_count = cursor.rowcount
+        if not frame.empty:
+            inserted_count = insert_frame(cursor, insert_query, frame,
+                                          ['timestamp', 'latitude', 'longitude', 'temperature_c',
+                                           'humidity_percent', 'precipitation_mm', 'wind_speed_kmh',
+                                           'pressure_hpa', 'cloud_cover_percent', 'collection_timestamp'])
             conn.commit()
             
             print(f"Enhanced Weather Grid data insertion completed:")
             print(f"  - New records inserted: {inserted_count}")
-            print(f"  - Duplicate records skipped: {initial_count - inserted_count}")
+            print(f"  - Duplicate records skipped: {len(frame) - inserted_count}")
             print(f"  - Invalid records skipped: {invalid_count}")
         else:
             print("No valid Enhanced Weather Grid records to insert")
@@ -3188,122 +2922,123 @@ def insert_pm25_city_records(conn, records):
 
 
 
-def main():
-    conn = None
+def update_satellite_cube(data, data1, data12, cube=None):
+    """
+    Grid the freshly fetched TEMPO HCHO/NO2 and WAQI O3 points into the
+    satellite feature cube used by the forecaster.
+    """
+    print("Updating satellite feature cube...")
     try:
-        # Fetch both HCHO and NO2 data
-        data = fetch_tempo_hcho_data()
-        data1 = collect_tempo_no2_data(hours_back=7, max_files=5)
-        data2 = fetch_merra2_met_data()
-        data3 = fetch_all_air_quality_data()
-        data4 = fetch_and_process_pandora_hcho_data()
-        data5 = fetch_pblh_data()
-        data6 = no2_pipeline()
-        data7 = run_tolnet_fetcher()
-        data8 = fetch_nasa_aerosol_data()
-        data9 = fetch_and_process_goes_data()
-        data10 = fetch_cygnss_data()
-        data11 = run_fetch_tempo_o3()
-        data12 = O3_OZONE_WAQI_DATA()
-        data13 = FIRE_SMOKE_DETECTION_DATA()
-        data14 = ENHANCE_METEROLOGY_DATA()
-        data_so2_wrapper = MISSING_SO2_DATA_WAQI()
-        data_co_wrapper = MISSING_CO_DATA_WAQI()
-        data_pm25_wrapper = MISSING_PM_2_POINT_5_DATA()  # Move this INSIDE main()
-        
-        
-        
-
-        # Connect to database
-        conn = connect_to_db()
-        
-        
-        # Create both tables
-        create_table(conn)
-        
-        # Insert HCHO data (with validation and conflict handling)
-        insert_records(conn, data)
-        
-        # Insert NO2 data (with validation and conflict handling)
-        insert_no2_records(conn, data1)
-
-        # Insert MERRA-2 data (with validation and conflict handling)
-        insert_merra2_records(conn, data2)
-
-        # Insert Air Quality data (with validation and conflict handling)
-        insert_air_quality_records(conn, data3)
-
-        # Insert Pandora HCHO data (with validation and conflict handling)
-        insert_pandora_hcho_records(conn, data4)
-
-        # Insert PBLH data (with validation and conflict handling)
-        insert_pblh_records(conn, data5)
-
-        # Insert NO2 Pipeline data (with validation and conflict handling)
-        insert_no2_pipeline_records(conn, data6)
-
-        # Insert TOLNet data (with validation and conflict handling)
-        insert_tolnet_records(conn, data7)
-
-        # Insert NASA Aerosol data (with validation and conflict handling)
-        insert_aerosol_records(conn, data8)
-
-        # Insert GOES data (with validation and conflict handling)
-        insert_goes_records(conn, data9)  # Insert file metadata
-        insert_goes_processed_data(conn, data9)  # Insert processed data
-        insert_goes_imagery_data(conn, data9)
-
-        # Insert CYGNSS wind data and temporal analysis
-        insert_cygnss_records(conn, data10)
-        insert_cygnss_temporal_analysis(conn, data10)
-
-        # Insert TEMPO O3 data
-        insert_tempo_o3_records(conn, data11)
-
-        # Insert O3 WAQI data
-        insert_o3_waqi_records(conn, data12)
-
-        # Insert Fire Detection data
-        insert_fire_detection_records(conn, data13)
-
-        # Insert Enhanced Meteorology Data
-        insert_enhanced_weather_grid_records(conn, data14)
-
-        # Fetch data
-        data_so2_wrapper = MISSING_SO2_DATA_WAQI()
-        data_co_wrapper = MISSING_CO_DATA_WAQI()
-        data_pm25_wrapper = MISSING_PM_2_POINT_5_DATA()
-        
-        # Extract records
-        data_so2 = data_so2_wrapper.get('records', []) if data_so2_wrapper else []
-        data_co = data_co_wrapper.get('records', []) if data_co_wrapper else []
-        data_pm25 = data_pm25_wrapper.get('records', []) if data_pm25_wrapper else []
-        
-        print(f"SO2 records: {len(data_so2)}")
-        print(f"CO records: {len(data_co)}")
-        print(f"PM2.5 records: {len(data_pm25)}")
-        
-        print("\n=== INSERTING DATA ===")
-        
-        # Insert using the new functions
-        if data_so2:
-            insert_so2_co_station_records(conn, data_so2, 'SO2')
-        
-        if data_co:
-            insert_so2_co_station_records(conn, data_co, 'CO')
-        
-        if data_pm25:
-            insert_pm25_city_records(conn, data_pm25)
-
-
-        print("Main function completed successfully!")
-        return "Success"
+        cube = cube or SatelliteFeatureCube()
+        written = {}
+
+        frame = data.get('frame') if data else None
+        if frame is not None and not frame.empty:
+            export_date = data.get('metadata', {}).get('export_date')
+            flag = frame['quality_flag']
+            frame = frame[flag.isna() | (flag >= 0)]
+            written['hcho'] = cube.add_points(
+                'hcho',
+                [export_date] * len(frame),
+                frame['latitude'].to_numpy(),
+                frame['longitude'].to_numpy(),
+                frame['hcho_total_column'].to_numpy()
+            )
+
+        frame = data1.get('frame') if data1 and data1.get('status') == 'success' else None
+        if frame is not None and not frame.empty:
+            written['no2'] = cube.add_points(
+                'no2',
+                frame['observation_datetime'].to_numpy(),
+                frame['latitude'].to_numpy(),
+                frame['longitude'].to_numpy(),
+                frame['no2_tropospheric_column'].to_numpy()
+            )
+
+        if isinstance(data12, dict) and data12.get('records'):
+            records = data12['records']
+            written['o3'] = cube.add_points(
+                'o3',
+                [r.get('datetime_utc') for r in records],
+                [r.get('latitude') for r in records],
+                [r.get('longitude') for r in records],
+                [r.get('o3_aqi') for r in records]
+            )
+
+        for name, cells in written.items():
+            print(f"  - {name}: {cells} cell-hours updated")
     except Exception as e:
-        raise
-    finally:
-        if conn:
-            conn.close()
-            print("Database connection closed.")
+        # The cube is a derived store; never fail ingestion because of it
+        print(f"Error updating satellite feature cube: {e}")
+
+
+def insert_waqi_station_records(pollutant_type):
+    """Insert function for the SO2/CO wrappers, which return {"records", "summary"}"""
+    def insert(conn, wrapper):
+        records = wrapper.get('records', [])
+        print(f"{pollutant_type} records: {len(records)}")
+        if records:
+            insert_so2_co_station_records(conn, records, pollutant_type)
+    return insert
+
+
+def insert_pm25_wrapper(conn, wrapper):
+    records = wrapper.get('records', [])
+    print(f"PM2.5 records: {len(records)}")
+    if records:
+        insert_pm25_city_records(conn, records)
+
+
+def ingestion_sources():
+    """Every fetcher with its insert functions and the upstream it draws on"""
+    return [
+        Source('tempo_hcho', fetch_tempo_hcho_data, [insert_records], 'earthdata'),
+        Source('tempo_no2', lambda: collect_tempo_no2_data(hours_back=7, max_files=5),
+               [insert_no2_records], 'earthdata'),
+        Source('merra2', fetch_merra2_met_data, [insert_merra2_records], 'earthdata'),
+        Source('air_quality', fetch_all_air_quality_data, [insert_air_quality_records]),
+        Source('pandora_hcho', fetch_and_process_pandora_hcho_data, [insert_pandora_hcho_records]),
+        Source('pblh', fetch_pblh_data, [insert_pblh_records], 'earthdata'),
+        Source('no2_pipeline', no2_pipeline, [insert_no2_pipeline_records], 'earthdata'),
+        Source('tolnet', run_tolnet_fetcher, [insert_tolnet_records], 'earthdata'),
+        Source('aerosol', fetch_nasa_aerosol_data, [insert_aerosol_records], 'earthdata'),
+        Source('goes', fetch_and_process_goes_data,
+               [insert_goes_records, insert_goes_processed_data, insert_goes_imagery_data]),
+        Source('cygnss', fetch_cygnss_data, [insert_cygnss_records, insert_cygnss_temporal_analysis], 'earthdata'),
+        Source('tempo_o3', run_fetch_tempo_o3, [insert_tempo_o3_records], 'earthdata'),
+        Source('waqi_o3', O3_OZONE_WAQI_DATA, [insert_o3_waqi_records], 'waqi'),
+        Source('fire_detection', FIRE_SMOKE_DETECTION_DATA, [insert_fire_detection_records], 'firms'),
+        Source('weather_grid', ENHANCE_METEROLOGY_DATA, [insert_enhanced_weather_grid_records], 'open_meteo'),
+        Source('waqi_so2', MISSING_SO2_DATA_WAQI, [insert_waqi_station_records('SO2')], 'waqi'),
+        Source('waqi_co', MISSING_CO_DATA_WAQI, [insert_waqi_station_records('CO')], 'waqi'),
+        Source('waqi_pm25', MISSING_PM_2_POINT_5_DATA, [insert_pm25_wrapper], 'waqi'),
+    ]
+
+
+def main(max_connections=4):
+    # Sources fetch concurrently; each inserts on a pooled connection as soon as it lands
+    orchestrator = IngestionOrchestrator(
+        ingestion_sources(),
+        DB_PARAMS,
+        setup=create_table,
+        max_connections=max_connections,
+        watermarks=shared_watermarks()
+    )
+    results = orchestrator.run()
+
+    # Grid TEMPO HCHO/NO2 and WAQI O3 for per-station feature lookups
+    update_satellite_cube(results.get('tempo_hcho'), results.get('tempo_no2'), results.get('waqi_o3'))
+
+    print(f"WAQI collection: {shared_collector().summary()}")
+
+    failures = orchestrator.failures()
+    if failures:
+        raise RuntimeError("Ingestion failed for: " + ", ".join(
+            f"{t['source']} ({t['error']})" for t in failures
+        ))
+
+    print("Main function completed successfully!")
+    return "Success"
 
 if __name__ == "__main__":
     main()
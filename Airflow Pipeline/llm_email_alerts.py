@@ -15,6 +15,8 @@ from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content
 from apscheduler.schedulers.background import BackgroundScheduler
 import time
+import numpy as np
+from aqi import aqi_category, composite_aqi, pollutant_aqi
 
 # Load environment variables
 load_dotenv()
@@ -132,9 +134,12 @@ class DatabaseManager:
             
             cursor.close()
             
-            if 'pm25' in data['pollutants']:
-                pm25 = data['pollutants']['pm25']['value']
-                data['aqi'] = self.calculate_aqi_from_pm25(pm25)
+            aqi = composite_aqi(
+                {param: info['value'] for param, info in data['pollutants'].items()},
+                {param: info['units'] for param, info in data['pollutants'].items()}
+            )
+            if aqi is not None:
+                data['aqi'] = (int(aqi), aqi_category(aqi))
             
             return data
             
@@ -144,26 +149,8 @@ class DatabaseManager:
     
     def calculate_aqi_from_pm25(self, pm25: float) -> Tuple[int, str]:
         """Calculate AQI and category from PM2.5 concentration."""
-        if pm25 <= 12.0:
-            aqi = (50 / 12.0) * pm25
-            category = "Good"
-        elif pm25 <= 35.4:
-            aqi = 50 + ((100 - 50) / (35.4 - 12.1)) * (pm25 - 12.1)
-            category = "Moderate"
-        elif pm25 <= 55.4:
-            aqi = 100 + ((150 - 100) / (55.4 - 35.5)) * (pm25 - 35.5)
-            category = "Unhealthy for Sensitive Groups"
-        elif pm25 <= 150.4:
-            aqi = 150 + ((200 - 150) / (150.4 - 55.5)) * (pm25 - 55.5)
-            category = "Unhealthy"
-        elif pm25 <= 250.4:
-            aqi = 200 + ((300 - 200) / (250.4 - 150.5)) * (pm25 - 150.5)
-            category = "Very Unhealthy"
-        else:
-            aqi = 300 + ((500 - 300) / (500.4 - 250.5)) * (pm25 - 250.5)
-            category = "Hazardous"
-        
-        return int(aqi), category
+        aqi = pollutant_aqi('pm25', max(pm25, 0.0))
+        return int(aqi), aqi_category(aqi)
     
     def get_latest_air_quality(self, city: str, country: Optional[str] = None) -> Dict[str, Any]:
         """Get the most recent air quality data for monitoring."""
@@ -350,49 +337,14 @@ class DatabaseManager:
 class AlertGenerator:
     """Detects air quality threshold violations and anomalies."""
     
-    THRESHOLDS = {
-        'pm25': {
-            'good': 12.0,
-            'moderate': 35.4,
-            'unhealthy_sensitive': 55.4,
-            'unhealthy': 150.4,
-            'very_unhealthy': 250.4
-        },
-        'pm10': {
-            'good': 54,
-            'moderate': 154,
-            'unhealthy_sensitive': 254,
-            'unhealthy': 354,
-            'very_unhealthy': 424
-        },
-        'no2': {
-            'good': 53,
-            'moderate': 100,
-            'unhealthy_sensitive': 360,
-            'unhealthy': 649,
-            'very_unhealthy': 1249
-        },
-        'o3': {
-            'good': 54,
-            'moderate': 70,
-            'unhealthy_sensitive': 85,
-            'unhealthy': 105,
-            'very_unhealthy': 200
-        },
-        'co': {
-            'good': 4.4,
-            'moderate': 9.4,
-            'unhealthy_sensitive': 12.4,
-            'unhealthy': 15.4,
-            'very_unhealthy': 30.4
-        },
-        'so2': {
-            'good': 35,
-            'moderate': 75,
-            'unhealthy_sensitive': 185,
-            'unhealthy': 304,
-            'very_unhealthy': 604
-        }
+    # Alert severity by individual pollutant AQI: above 100, 150, 200 and 300
+    SEVERITY_AQI_EDGES = [100, 150, 200, 300]
+    SEVERITY_LEVELS = [None, 'WARNING', 'UNHEALTHY', 'VERY_UNHEALTHY', 'HAZARDOUS']
+    SEVERITY_MESSAGES = {
+        'WARNING': '{name} is elevated ({value:.1f})',
+        'UNHEALTHY': '{name} is unhealthy ({value:.1f})',
+        'VERY_UNHEALTHY': '{name} is very unhealthy ({value:.1f})',
+        'HAZARDOUS': '{name} is at hazardous levels ({value:.1f})!'
     }
     
     def __init__(self, db_manager: DatabaseManager):
@@ -407,26 +359,13 @@ class AlertGenerator:
         
         for pollutant, data in current_data['pollutants'].items():
             value = data['value']
-            threshold = self.THRESHOLDS.get(pollutant)
+            aqi = pollutant_aqi(pollutant, value, data.get('units'))
             
-            if not threshold:
+            if not np.isfinite(aqi):
                 continue
             
-            severity = None
-            message = None
-            
-            if value > threshold.get('very_unhealthy', float('inf')):
-                severity = 'HAZARDOUS'
-                message = f'{pollutant.upper()} is at hazardous levels ({value:.1f})!'
-            elif value > threshold.get('unhealthy', float('inf')):
-                severity = 'VERY_UNHEALTHY'
-                message = f'{pollutant.upper()} is very unhealthy ({value:.1f})'
-            elif value > threshold.get('unhealthy_sensitive', float('inf')):
-                severity = 'UNHEALTHY'
-                message = f'{pollutant.upper()} is unhealthy ({value:.1f})'
-            elif value > threshold.get('moderate', float('inf')):
-                severity = 'WARNING'
-                message = f'{pollutant.upper()} is elevated ({value:.1f})'
+            level = int(np.searchsorted(self.SEVERITY_AQI_EDGES, aqi, side='left'))
+            severity = self.SEVERITY_LEVELS[level]
             
             if severity:
                 alerts.append({
@@ -434,8 +373,9 @@ class AlertGenerator:
                     'pollutant': pollutant,
                     'value': value,
                     'units': data['units'],
+                    'aqi': int(aqi),
                     'severity': severity,
-                    'message': message
+                    'message': self.SEVERITY_MESSAGES[severity].format(name=pollutant.upper(), value=value)
                 })
         
         return alerts
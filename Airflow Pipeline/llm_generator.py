@@ -1977,6 +1977,7 @@ from pydantic import BaseModel, Field
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import json
+from aqi import aqi_category, composite_aqi, pollutant_aqi
 
 # Load environment variables
 load_dotenv()
@@ -2094,9 +2095,12 @@ class DatabaseManager:
             
             cursor.close()
             
-            if 'pm25' in data['pollutants']:
-                pm25 = data['pollutants']['pm25']['value']
-                data['aqi'] = self.calculate_aqi_from_pm25(pm25)
+            aqi = composite_aqi(
+                {param: info['value'] for param, info in data['pollutants'].items()},
+                {param: info['units'] for param, info in data['pollutants'].items()}
+            )
+            if aqi is not None:
+                data['aqi'] = (int(aqi), aqi_category(aqi))
             
             return data
             
@@ -2285,26 +2289,8 @@ class DatabaseManager:
     
     def calculate_aqi_from_pm25(self, pm25: float) -> Tuple[int, str]:
         """Calculate AQI and category from PM2.5 concentration."""
-        if pm25 <= 12.0:
-            aqi = (50 / 12.0) * pm25
-            category = "Good"
-        elif pm25 <= 35.4:
-            aqi = 50 + ((100 - 50) / (35.4 - 12.1)) * (pm25 - 12.1)
-            category = "Moderate"
-        elif pm25 <= 55.4:
-            aqi = 100 + ((150 - 100) / (55.4 - 35.5)) * (pm25 - 35.5)
-            category = "Unhealthy for Sensitive Groups"
-        elif pm25 <= 150.4:
-            aqi = 150 + ((200 - 150) / (150.4 - 55.5)) * (pm25 - 55.5)
-            category = "Unhealthy"
-        elif pm25 <= 250.4:
-            aqi = 200 + ((300 - 200) / (250.4 - 150.5)) * (pm25 - 150.5)
-            category = "Very Unhealthy"
-        else:
-            aqi = 300 + ((500 - 300) / (500.4 - 250.5)) * (pm25 - 250.5)
-            category = "Hazardous"
-        
-        return int(aqi), category
+        aqi = pollutant_aqi('pm25', max(pm25, 0.0))
+        return int(aqi), aqi_category(aqi)
     
     def get_comprehensive_data(self, city: str, country: Optional[str], date: str) -> Dict[str, Any]:
         """Get all available environmental data for a location and date."""
@@ -0,0 +1,149 @@
+"""
+Bounding-box hyperslab reads for gridded NetCDF granules
+
+The TEMPO and MERRA-2 readers only keep North American pixels. Instead of
+loading whole variables and masking them afterwards, the index range of
+the box is worked out from the coordinate variables first and only that
+hyperslab of the wanted variables is read, so I/O and memory per granule
+scale with the region rather than the full grid.
+
+Regular grids (1-D lat/lon vectors: TEMPO L3, MERRA-2) need only the
+coordinate vectors. Swath granules (2-D lat/lon: TEMPO L2) scan their
+coordinates in row bands, so finding the window never holds a full
+coordinate array either. dataarray_columns() turns an xarray window into
+flat time/lat/lon/value columns with index arithmetic.
+"""
+
+import numpy as np
+
+
+NORTH_AMERICA_BBOX = {'min_lat': 15.0, 'max_lat': 72.0, 'min_lon': -168.0, 'max_lon': -52.0}
+
+# Rows of a 2-D coordinate variable scanned at a time
+BAND_ROWS = 256
+
+
+def index_range(coord, lo, hi):
+    """slice covering lo..hi on a monotonic 1-D coordinate vector, or None if it misses"""
+    coord = np.ma.filled(np.ma.asarray(coord, dtype=float), np.nan)
+    hits = np.flatnonzero((coord >= lo) & (coord <= hi))
+    if hits.size == 0:
+        return None
+    return slice(int(hits[0]), int(hits[-1]) + 1)
+
+
+def _index(var, window):
+    """Index tuple for `window` on the trailing axes of var; leading axes take element 0"""
+    return (0,) * (var.ndim - len(window)) + tuple(window)
+
+
+def grid_window(lat_var, lon_var, bbox=NORTH_AMERICA_BBOX):
+    """(lat slice, lon slice) of the box on a regular grid, or None"""
+    rows = index_range(lat_var[:], bbox['min_lat'], bbox['max_lat'])
+    cols = index_range(lon_var[:], bbox['min_lon'], bbox['max_lon'])
+    if rows is None or cols is None:
+        return None
+    return rows, cols
+
+
+def swath_window(lat_var, lon_var, bbox=NORTH_AMERICA_BBOX, band_rows=BAND_ROWS):
+    """(row slice, column slice) bounding every in-box pixel of a 2-D lat/lon swath, or None"""
+    n_rows, n_cols = lat_var.shape[-2:]
+    first_row = last_row = None
+    cols_hit = np.zeros(n_cols, dtype=bool)
+
+    for start in range(0, n_rows, band_rows):
+        band = (slice(start, min(start + band_rows, n_rows)), slice(None))
+        lat = lat_var[_index(lat_var, band)]
+        lon = lon_var[_index(lon_var, band)]
+        inside = np.ma.filled(
+            (lat >= bbox['min_lat']) & (lat <= bbox['max_lat']) &
+            (lon >= bbox['min_lon']) & (lon <= bbox['max_lon']), False)
+        rows_hit = np.flatnonzero(inside.any(axis=1))
+        if rows_hit.size:
+            first_row = start + int(rows_hit[0]) if first_row is None else first_row
+            last_row = start + int(rows_hit[-1])
+            cols_hit |= inside.any(axis=0)
+
+    if first_row is None:
+        return None
+    cols = np.flatnonzero(cols_hit)
+    return slice(first_row, last_row + 1), slice(int(cols[0]), int(cols[-1]) + 1)
+
+
+def find_window(lat_var, lon_var, bbox=NORTH_AMERICA_BBOX):
+    """Window of the box for either a regular grid or a swath"""
+    if lat_var.ndim == 1 and lon_var.ndim == 1:
+        return grid_window(lat_var, lon_var, bbox)
+    return swath_window(lat_var, lon_var, bbox)
+
+
+def read_window(var, window):
+    """Read only the window's hyperslab of a variable"""
+    return var[_index(var, window)]
+
+
+def read_coords(lat_var, lon_var, window):
+    """Latitudes and longitudes inside the window: 1-D vectors for grids, 2-D for swaths"""
+    rows, cols = window
+    if lat_var.ndim == 1 and lon_var.ndim == 1:
+        return lat_var[rows], lon_var[cols]
+    return read_window(lat_var, window), read_window(lon_var, window)
+
+
+def window_fraction(var, window):
+    """Share of the variable's trailing 2-D grid covered by the window"""
+    n_rows, n_cols = var.shape[-2:]
+    rows, cols = window
+    return ((rows.stop - rows.start) * (cols.stop - cols.start)) / float(n_rows * n_cols)
+
+
+def subset_dataset(ds, variables, bbox=NORTH_AMERICA_BBOX):
+    """
+    Lazily subset an xarray dataset with `lat`/`lon` dimension coordinates
+    to the box and the given variables; nothing is read until the values
+    are used. Returns None when the box misses the grid.
+    """
+    rows = index_range(ds['lat'].values, bbox['min_lat'], bbox['max_lat'])
+    cols = index_range(ds['lon'].values, bbox['min_lon'], bbox['max_lon'])
+    if rows is None or cols is None:
+        return None
+    return ds[list(variables)].isel(lat=rows, lon=cols)
+
+
+def dataarray_columns(da, max_points=None, seed=42):
+    """
+    Columns (time, latitude, longitude, value) for the non-NaN cells of a
+    (time, lat, lon) xarray variable, built from index arrays rather than
+    a per-row DataFrame. With max_points, a reproducible random subset of
+    the valid cells is kept. Times stay datetime64.
+    """
+    da = da.transpose('time', 'lat', 'lon')
+    values = np.asarray(da.values)
+    valid = np.flatnonzero(~np.isnan(values.ravel()))
+    if max_points and valid.size > max_points:
+        valid = np.sort(np.random.default_rng(seed).choice(valid, max_points, replace=False))
+    t, r, c = np.unravel_index(valid, values.shape)
+    return {
+        'time': da['time'].values[t],
+        'latitude': da['lat'].values[r].astype(np.float64),
+        'longitude': da['lon'].values[c].astype(np.float64),
+        'value': values.ravel()[valid].astype(np.float64)
+    }
+
+
+def strided_columns(var, sample_points):
+    """
+    Columns (row, col, value) for the unmasked cells of a 2-D variable read
+    with a stride chosen so about `sample_points` cells remain, plus that
+    stride. Rows/cols index the full-resolution grid.
+    """
+    n_rows, n_cols = var.shape
+    step = max(int(np.sqrt(n_rows * n_cols / sample_points)), 1) if n_rows * n_cols > sample_points else 1
+    sampled = np.ma.asarray(var[::step, ::step])
+    r, c = np.nonzero(~np.ma.getmaskarray(sampled))
+    return {
+        'row': r * step,
+        'col': c * step,
+        'value': np.ma.getdata(sampled)[r, c].astype(np.float64)
+    }, step
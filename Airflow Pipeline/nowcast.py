@@ -0,0 +1,229 @@
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+
+class _SeriesState:
+    """Holt level/trend with an additive 24-hour diurnal profile for one station pollutant"""
+
+    __slots__ = ('level', 'trend', 'seasonal', 'variance', 'last_time', 'last_value', 'n_obs')
+
+    def __init__(self, time, value):
+        self.level = value
+        self.trend = 0.0
+        self.seasonal = np.zeros(24)
+        self.variance = 0.0
+        self.last_time = time
+        self.last_value = value
+        self.n_obs = 1
+
+
+class NowcastEngine:
+    """
+    Lightweight incremental nowcaster.
+
+    Keeps per-station state in memory (exponentially weighted level and
+    trend plus a diurnal profile) and updates it one observation at a time,
+    so nowcast requests are answered from memory without touching the
+    database or the tree-ensemble models.
+    """
+
+    def __init__(self, alpha=0.5, beta=0.1, gamma=0.1, phi=0.9,
+                 variance_weight=0.1, max_gap_hours=24, warmup_hours=72,
+                 sync_overlap_minutes=5):
+        self.alpha = alpha            # level smoothing
+        self.beta = beta              # trend smoothing
+        self.gamma = gamma            # diurnal profile smoothing
+        self.phi = phi                # per-hour trend damping
+        self.variance_weight = variance_weight
+        self.max_gap_hours = max_gap_hours
+        self.warmup_hours = warmup_hours
+        self.sync_overlap = timedelta(minutes=sync_overlap_minutes)
+
+        self.states = {}              # location_id -> {parameter_name: _SeriesState}
+        self.stations = {}            # location_id -> station metadata
+        self.city_index = {}          # lower-case city -> set of location_ids
+        self.synced_until = None      # created_at watermark of the last sync
+        self._lookup_cache = {}
+        self._lock = threading.Lock()
+
+    def update(self, location_id, parameter_name, time, value, city=None,
+               location_name=None, latitude=None, longitude=None):
+        """Fold one observation into the station state"""
+        if value is None or not np.isfinite(value):
+            return
+
+        time = pd.Timestamp(time)
+
+        with self._lock:
+            if location_id not in self.stations:
+                self.stations[location_id] = {
+                    'city': city,
+                    'location_name': location_name,
+                    'latitude': latitude,
+                    'longitude': longitude
+                }
+                if city:
+                    self.city_index.setdefault(city.lower(), set()).add(location_id)
+                    self._lookup_cache.clear()
+
+            series = self.states.setdefault(location_id, {})
+            state = series.get(parameter_name)
+            if state is None:
+                series[parameter_name] = _SeriesState(time, float(value))
+                return
+
+            dt = (time - state.last_time).total_seconds() / 3600
+            if dt <= 0:
+                # Late or duplicate reading; state cannot be rewound
+                return
+
+            if dt > self.max_gap_hours:
+                state.trend = 0.0
+                dt = 1.0
+
+            hour = time.hour
+            damped = self._damped_steps(dt)
+            expected = state.level + state.trend * damped + state.seasonal[hour]
+            error = value - expected
+
+            level = self.alpha * (value - state.seasonal[hour]) + \
+                (1 - self.alpha) * (state.level + state.trend * damped)
+            state.trend = self.beta * (level - state.level) / dt + (1 - self.beta) * state.trend * self.phi ** dt
+            state.seasonal[hour] = self.gamma * (value - level) + (1 - self.gamma) * state.seasonal[hour]
+            state.level = level
+            state.variance = (1 - self.variance_weight) * state.variance + self.variance_weight * error ** 2
+            state.last_time = time
+            state.last_value = float(value)
+            state.n_obs += 1
+
+    def _damped_steps(self, steps):
+        """Sum of phi^i for i = 1..steps (trend contribution after `steps` hours)"""
+        if self.phi == 1:
+            return steps
+        return self.phi * (1 - self.phi ** steps) / (1 - self.phi)
+
+    def observe_frame(self, df):
+        """
+        Apply a batch of air_quality_data rows in time order. Expects the
+        columns location_id, parameter_name, datetime_utc and value.
+        """
+        if df.empty:
+            return 0
+
+        df = df.sort_values('datetime_utc')
+        for row in df.itertuples(index=False):
+            self.update(
+                row.location_id, row.parameter_name, row.datetime_utc, row.value,
+                city=getattr(row, 'city', None),
+                location_name=getattr(row, 'location_name', None),
+                latitude=getattr(row, 'latitude', None),
+                longitude=getattr(row, 'longitude', None)
+            )
+        return len(df)
+
+    def sync(self, conn):
+        """
+        Pull rows inserted since the last sync (by created_at) and fold them
+        into the state. The first call warms up from the last `warmup_hours`.
+        """
+        if self.synced_until is None:
+            query = """
+            SELECT location_id, location_name, city, latitude, longitude,
+                   parameter_name, value, datetime_utc, created_at
+            FROM air_quality_data
+            WHERE datetime_utc >= %s
+            ORDER BY datetime_utc
+            """
+            params = [datetime.now() - timedelta(hours=self.warmup_hours)]
+        else:
+            query = """
+            SELECT location_id, location_name, city, latitude, longitude,
+                   parameter_name, value, datetime_utc, created_at
+            FROM air_quality_data
+            WHERE created_at > %s
+            ORDER BY datetime_utc
+            """
+            # Re-read a small overlap for rows committed after their created_at;
+            # readings already applied are skipped by update()
+            params = [self.synced_until - self.sync_overlap]
+
+        try:
+            df = pd.read_sql(query, conn, params=params)
+        except Exception as e:
+            print(f"⚠ Nowcast sync failed: {e}")
+            conn.rollback()
+            return 0
+
+        if df.empty:
+            if self.synced_until is None:
+                self.synced_until = datetime.now()
+            return 0
+
+        count = self.observe_frame(df)
+        latest_insert = df['created_at'].max()
+        self.synced_until = latest_insert if pd.notna(latest_insert) else datetime.now()
+        return count
+
+    def stations_for_city(self, city):
+        """Location ids whose city contains the query (same matching as ILIKE %city%)"""
+        query = city.lower()
+        cached = self._lookup_cache.get(query)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            matches = [
+                location_id
+                for name, ids in self.city_index.items() if query in name
+                for location_id in ids
+            ]
+            self._lookup_cache[query] = matches
+        return matches
+
+    def forecast(self, location_id, parameter_name, hours=(1, 2, 3, 4, 5, 6)):
+        """Point forecasts and 95% bands for the given lead times, or None"""
+        state = self.states.get(location_id, {}).get(parameter_name)
+        if state is None:
+            return None
+
+        lead = np.asarray(hours, dtype=float)
+        target_hours = (state.last_time.hour + lead.astype(int)) % 24
+        damped = self.phi * (1 - self.phi ** lead) / (1 - self.phi) if self.phi != 1 else lead
+
+        mean = np.maximum(state.level + state.trend * damped + state.seasonal[target_hours], 0)
+        spread = 1.96 * np.sqrt(state.variance * lead)
+
+        return {
+            'base_time': state.last_time,
+            'hours': lead.astype(int),
+            'mean': mean,
+            'lower_95': np.maximum(mean - spread, 0),
+            'upper_95': mean + spread,
+            'last_value': state.last_value,
+            'n_obs': state.n_obs
+        }
+
+    def city_nowcast(self, city, pollutants=None, hours=(1, 2, 3, 4, 5, 6)):
+        """
+        Nowcast every station pollutant of a city, using the most recently
+        updated station per pollutant.
+        """
+        best = {}
+        for location_id in self.stations_for_city(city):
+            for parameter_name, state in list(self.states.get(location_id, {}).items()):
+                if pollutants and parameter_name not in pollutants:
+                    continue
+                current = best.get(parameter_name)
+                if current is None or state.last_time > current[1].last_time:
+                    best[parameter_name] = (location_id, state)
+
+        results = {}
+        for parameter_name, (location_id, _) in best.items():
+            results[parameter_name] = dict(
+                self.forecast(location_id, parameter_name, hours),
+                location_id=location_id,
+                **self.stations[location_id]
+            )
+        return results
@@ -0,0 +1,356 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+import xgboost as xgb
+import lightgbm as lgb
+
+
+DEFAULT_STORE_DIR = os.getenv('TRAINING_STORE_DIR', './data_downloads/training_partitions')
+
+# Same exclusions as AirQualityForecaster.prepare_training_data
+META_COLUMNS = ['datetime_utc', 'location_id', 'location_name', 'city', 'latitude', 'longitude']
+
+# Share of the memory ceiling the RandomForest sample may occupy
+RF_MEMORY_SHARE = 0.25
+
+
+def target_name(pollutant, horizon):
+    return f'{pollutant}_{horizon}h'
+
+
+class FeaturePartitionStore:
+    """
+    Engineered training data on disk, one directory per time window:
+    X.npy (float32 features), Y.npy (float32 targets, one column per
+    pollutant/horizon, NaN where unusable) and a manifest.json shared by
+    all partitions. Arrays are memory-mapped on load.
+    """
+
+    def __init__(self, root_dir=DEFAULT_STORE_DIR, pollutants=None, horizons=(1, 6, 24), reset=False):
+        self.root_dir = Path(root_dir)
+        if reset and self.root_dir.exists():
+            shutil.rmtree(self.root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+
+        self.manifest_path = self.root_dir / 'manifest.json'
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {
+                'pollutants': list(pollutants or []),
+                'horizons': list(horizons),
+                'feature_cols': None,
+                'partitions': []
+            }
+
+    @property
+    def feature_cols(self):
+        return self.manifest['feature_cols']
+
+    @property
+    def targets(self):
+        return [
+            target_name(p, h)
+            for p in self.manifest['pollutants']
+            for h in self.manifest['horizons']
+        ]
+
+    @property
+    def partitions(self):
+        return self.manifest['partitions']
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _select_features(self, df):
+        """Numeric, non-metadata columns (the prepare_training_data rule)"""
+        return [
+            col for col in df.columns
+            if col not in META_COLUMNS and '_target_' not in col
+            and df[col].dtype in ['float64', 'int64']
+        ]
+
+    def write_partition(self, feature_df, keep_from=None, keep_until=None):
+        """
+        Compute every pollutant/horizon target for an engineered window and
+        persist the rows inside [keep_from, keep_until). Callers pass a
+        window padded on both sides so lags and future targets near the
+        edges are complete. Returns the number of rows written.
+        """
+        if feature_df.empty:
+            return 0
+
+        if self.feature_cols is None:
+            self.manifest['feature_cols'] = self._select_features(feature_df)
+
+        by_location = feature_df.groupby('location_id')
+        Y = np.full((len(feature_df), len(self.targets)), np.nan, dtype=np.float32)
+        col = 0
+        for pollutant in self.manifest['pollutants']:
+            for h in self.manifest['horizons']:
+                if pollutant in feature_df.columns:
+                    target = by_location[pollutant].shift(-h)
+                    target[feature_df[pollutant].isna()] = np.nan
+                    Y[:, col] = target.to_numpy(dtype=np.float32)
+                col += 1
+
+        times = pd.to_datetime(feature_df['datetime_utc'])
+        keep = np.isfinite(Y).any(axis=1)
+        if keep_from is not None:
+            keep &= (times >= pd.Timestamp(keep_from)).to_numpy()
+        if keep_until is not None:
+            keep &= (times < pd.Timestamp(keep_until)).to_numpy()
+        if not keep.any():
+            return 0
+
+        X = feature_df.loc[keep, :].reindex(columns=self.feature_cols).fillna(0).to_numpy(dtype=np.float32)
+        Y = Y[keep]
+        kept_times = times[keep]
+
+        name = f'part-{len(self.partitions):05d}'
+        part_dir = self.root_dir / name
+        part_dir.mkdir(parents=True, exist_ok=True)
+        np.save(part_dir / 'X.npy', X)
+        np.save(part_dir / 'Y.npy', Y)
+
+        self.partitions.append({
+            'name': name,
+            'rows': int(len(X)),
+            'start': str(kept_times.min()),
+            'end': str(kept_times.max()),
+            'valid': dict(zip(self.targets, np.isfinite(Y).sum(axis=0).astype(int).tolist()))
+        })
+        self._save_manifest()
+        return len(X)
+
+    def load(self, partition):
+        """Memory-mapped (X, Y) for a partition entry"""
+        part_dir = self.root_dir / partition['name']
+        return (np.load(part_dir / 'X.npy', mmap_mode='r'),
+                np.load(part_dir / 'Y.npy', mmap_mode='r'))
+
+    def target_index(self, pollutant, horizon):
+        return self.targets.index(target_name(pollutant, horizon))
+
+
+class BoosterRegressor:
+    """
+    Wraps a native xgboost/lightgbm Booster so it predicts from a
+    DataFrame like the sklearn estimators kept in forecaster.models.
+    """
+
+    def __init__(self, booster, feature_names):
+        self.booster = booster
+        self.feature_names = list(feature_names)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if isinstance(self.booster, xgb.Booster):
+            return self.booster.predict(xgb.DMatrix(X))
+        return self.booster.predict(X)
+
+    @property
+    def feature_importances_(self):
+        if isinstance(self.booster, xgb.Booster):
+            scores = self.booster.get_score(importance_type='weight')
+            return np.array([scores.get(f'f{i}', 0.0) for i in range(len(self.feature_names))])
+        return self.booster.feature_importance()
+
+
+class _PartitionIter(xgb.DataIter):
+    """Feeds partitions one at a time into an external-memory DMatrix"""
+
+    def __init__(self, store, partitions, column, cache_prefix):
+        self.store = store
+        self.partitions = partitions
+        self.column = column
+        self._position = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._position == len(self.partitions):
+            return 0
+        X, Y = self.store.load(self.partitions[self._position])
+        y = np.asarray(Y[:, self.column])
+        mask = np.isfinite(y)
+        input_data(data=np.asarray(X[mask]), label=y[mask])
+        self._position += 1
+        return 1
+
+    def reset(self):
+        self._position = 0
+
+
+class _PartitionSequence(lgb.Sequence):
+    """Row access to one partition's valid rows for lightgbm's streaming Dataset"""
+
+    def __init__(self, store, partition, column, batch_size):
+        self.store = store
+        self.partition = partition
+        # Mapped once; lightgbm samples rows by random index many times
+        self.X, Y = store.load(partition)
+        self.rows = np.flatnonzero(np.isfinite(np.asarray(Y[:, column])))
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        return np.asarray(self.X[self.rows[idx]])
+
+
+class OutOfCoreTrainer:
+    """
+    Trains the RF/XGB/LGBM ensemble for one pollutant/horizon from a
+    FeaturePartitionStore without materialising the full matrix:
+    XGBoost reads through an external-memory iterator, LightGBM bins
+    from partition sequences, and the RandomForest is fit on a uniform
+    row sample sized to the memory ceiling.
+    """
+
+    def __init__(self, store, memory_limit_mb=2048, val_fraction=0.2,
+                 batch_rows=65536, n_estimators=100, random_state=42):
+        self.store = store
+        self.memory_limit_mb = memory_limit_mb
+        self.val_fraction = val_fraction
+        self.batch_rows = batch_rows
+        self.n_estimators = n_estimators
+        self.random_state = random_state
+
+    def split(self, name):
+        """Chronological split: trailing partitions hold ~val_fraction of the rows"""
+        parts = [p for p in sorted(self.store.partitions, key=lambda p: p['start']) if p['valid'].get(name, 0) > 0]
+        total = sum(p['valid'][name] for p in parts)
+        val, val_rows = [], 0
+        while len(parts) > 1 and val_rows < total * self.val_fraction:
+            part = parts.pop()
+            val.insert(0, part)
+            val_rows += part['valid'][name]
+        return parts, val
+
+    def _rf_sample(self, parts, column, n_features, rng):
+        max_rows = int(self.memory_limit_mb * 1024 ** 2 * RF_MEMORY_SHARE / (max(n_features, 1) * 4))
+        total = sum(len(_PartitionSequence(self.store, p, column, self.batch_rows)) for p in parts)
+        rate = min(1.0, max_rows / max(total, 1))
+        if rate < 1.0:
+            print(f"  Subsampling RandomForest to {rate:.1%} of {total} rows")
+
+        X_parts, y_parts = [], []
+        for part in parts:
+            X, Y = self.store.load(part)
+            y = np.asarray(Y[:, column])
+            rows = np.flatnonzero(np.isfinite(y))
+            if rate < 1.0:
+                rows = rows[rng.random(len(rows)) < rate]
+            X_parts.append(np.asarray(X[rows]))
+            y_parts.append(y[rows])
+        return np.concatenate(X_parts), np.concatenate(y_parts)
+
+    def _fit_scaler(self, parts, column):
+        scaler = StandardScaler()
+        for part in parts:
+            X, Y = self.store.load(part)
+            valid = np.flatnonzero(np.isfinite(np.asarray(Y[:, column])))
+            for start in range(0, len(valid), self.batch_rows):
+                scaler.partial_fit(np.asarray(X[valid[start:start + self.batch_rows]]))
+        return scaler
+
+    def _evaluate(self, models, parts, column):
+        """Streaming RMSE/MAE over the validation partitions"""
+        sse = {name: 0.0 for name in models}
+        sae = {name: 0.0 for name in models}
+        count = 0
+        for part in parts:
+            X, Y = self.store.load(part)
+            y = np.asarray(Y[:, column])
+            mask = np.isfinite(y)
+            X_val, y_val = np.asarray(X[mask]), y[mask]
+            for name, model in models.items():
+                err = model.predict(X_val) - y_val
+                sse[name] += float(np.sum(err ** 2))
+                sae[name] += float(np.sum(np.abs(err)))
+            count += len(y_val)
+        return {
+            name: {'rmse': np.sqrt(sse[name] / count), 'mae': sae[name] / count}
+            for name in models
+        }
+
+    def train(self, pollutant, horizon):
+        """Return (models, results, scaler) for one pollutant/horizon, or None"""
+        name = target_name(pollutant, horizon)
+        column = self.store.target_index(pollutant, horizon)
+        features = self.store.feature_cols
+        train_parts, val_parts = self.split(name)
+
+        if not train_parts or not val_parts:
+            print(f"  ⚠ Need at least two partitions with {name} targets. Skipping.")
+            return None
+
+        n_train = sum(p['valid'][name] for p in train_parts)
+        n_val = sum(p['valid'][name] for p in val_parts)
+        print(f"  Training samples: {n_train}, Validation samples: {n_val} "
+              f"({len(train_parts)}+{len(val_parts)} partitions)")
+
+        models = {}
+        rng = np.random.default_rng(self.random_state)
+
+        print(f"  Training Random Forest for {horizon}h horizon...")
+        X_rf, y_rf = self._rf_sample(train_parts, column, len(features), rng)
+        rf = RandomForestRegressor(
+            n_estimators=self.n_estimators,
+            max_depth=20,
+            min_samples_split=10,
+            min_samples_leaf=5,
+            random_state=self.random_state,
+            n_jobs=-1
+        )
+        rf.fit(X_rf, y_rf)
+        models['rf'] = rf
+        del X_rf, y_rf
+
+        print(f"  Training XGBoost for {horizon}h horizon (external memory)...")
+        cache_prefix = str(self.store.root_dir / f'xgb_cache_{name}')
+        dtrain = xgb.DMatrix(_PartitionIter(self.store, train_parts, column, cache_prefix))
+        booster = xgb.train({
+            'objective': 'reg:squarederror',
+            'tree_method': 'hist',
+            'max_depth': 6,
+            'eta': 0.1,
+            'subsample': 0.8,
+            'colsample_bytree': 0.8,
+            'seed': self.random_state
+        }, dtrain, num_boost_round=self.n_estimators)
+        models['xgb'] = BoosterRegressor(booster, features)
+        del dtrain
+
+        print(f"  Training LightGBM for {horizon}h horizon (streamed bins)...")
+        sequences = [_PartitionSequence(self.store, p, column, self.batch_rows) for p in train_parts]
+        labels = np.concatenate([
+            np.asarray(self.store.load(p)[1][:, column])[seq.rows]
+            for p, seq in zip(train_parts, sequences)
+        ])
+        dataset = lgb.Dataset(sequences, label=labels, params={'verbose': -1}, free_raw_data=True)
+        lgb_booster = lgb.train({
+            'objective': 'regression',
+            'max_depth': 6,
+            'learning_rate': 0.1,
+            'num_leaves': 31,
+            'feature_fraction': 0.8,
+            'seed': self.random_state,
+            'verbose': -1
+        }, dataset, num_boost_round=self.n_estimators)
+        models['lgb'] = BoosterRegressor(lgb_booster, features)
+        del dataset, labels
+
+        results = self._evaluate(models, val_parts, column)
+        scaler = self._fit_scaler(train_parts, column)
+        return models, results, scaler
@@ -0,0 +1,311 @@
+"""
+Remote partial reads of NetCDF4/HDF5 granules
+
+Instead of downloading a whole granule to sample a few variables or a
+region, the file is opened in place through HTTP Range requests: h5netcdf
+(h5py) reads the HDF5 metadata and only the chunks of the variables that
+are actually indexed, and RangeReader fetches those byte ranges in blocks
+and counts every byte transferred.
+
+open_granule() hands back something with the netCDF4.Dataset read API for
+either a local path or an http(s) URL, so readers work unchanged in both
+modes. Remote reads are enabled with GRANULE_READ_MODE=remote; a server
+that ignores Range requests makes the granule fall back to a full download
+through the granule cache. S3 buckets can be pointed at a local stand-in
+with GOES_S3_ENDPOINT.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+
+
+DEFAULT_READ_MODE = os.getenv('GRANULE_READ_MODE', 'download')
+S3_ENDPOINT = os.getenv('GOES_S3_ENDPOINT')
+
+BLOCK_SIZE = 512 * 1024
+MAX_BLOCKS = 64
+
+
+def remote_reads_enabled():
+    return DEFAULT_READ_MODE == 'remote'
+
+
+def s3_object_url(bucket, key, endpoint=S3_ENDPOINT):
+    """HTTPS URL of a public S3 object, path-style on a custom endpoint"""
+    if endpoint:
+        return f"{endpoint.rstrip('/')}/{bucket}/{key}"
+    return f"https://{bucket}.s3.amazonaws.com/{key}"
+
+
+class RangeNotSupported(IOError):
+    """The server answered a Range request with the whole object"""
+
+
+class RangeReader:
+    """
+    Read-only, seekable file object over HTTP Range requests. Blocks are
+    cached (LRU) so the many small metadata reads HDF5 makes stay cheap.
+    """
+
+    def __init__(self, url, session=None, headers=None, block_size=BLOCK_SIZE,
+                 max_blocks=MAX_BLOCKS, timeout=60, max_retries=3):
+        self.url = url
+        self.session = session or requests.Session()
+        self.headers = dict(headers or {})
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.position = 0
+        self.bytes_transferred = 0
+        self.requests = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.closed = False
+        self.size = None
+        # The first block also tells us the object size
+        self._fetch(0, 0)
+
+    def _get(self, start, end):
+        headers = dict(self.headers, Range=f'bytes={start}-{end}')
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+                self.requests += 1
+                if response.status_code == 200:
+                    raise RangeNotSupported(f"{self.url} does not support byte ranges")
+                response.raise_for_status()
+                # Skip redirects (e.g. to a signed S3 URL) on later requests;
+                # credentials are not forwarded to another host
+                if response.url and response.url != self.url:
+                    if urlparse(response.url).netloc != urlparse(self.url).netloc:
+                        self.headers.pop('Authorization', None)
+                    self.url = response.url
+                if self.size is None:
+                    self.size = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+                self.bytes_transferred += len(response.content)
+                return response.content
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def _fetch(self, first, last):
+        """Make blocks first..last present, fetching runs of missing blocks in one request"""
+        block = first
+        while block <= last:
+            if block in self._blocks:
+                self._blocks.move_to_end(block)
+                block += 1
+                continue
+            run_end = block
+            while run_end < last and run_end + 1 not in self._blocks:
+                run_end += 1
+            start = block * self.block_size
+            end = (run_end + 1) * self.block_size - 1
+            if self.size is not None:
+                end = min(end, self.size - 1)
+            data = self._get(start, end)
+            for i in range(block, run_end + 1):
+                offset = (i - block) * self.block_size
+                self._blocks[i] = data[offset:offset + self.block_size]
+            block = run_end + 1
+        while len(self._blocks) > max(self.max_blocks, last - first + 1):
+            self._blocks.popitem(last=False)
+
+    def read(self, n=-1):
+        with self._lock:
+            if n is None or n < 0:
+                n = self.size - self.position
+            n = max(0, min(n, self.size - self.position))
+            if n == 0:
+                return b''
+            first = self.position // self.block_size
+            last = (self.position + n - 1) // self.block_size
+            self._fetch(first, last)
+            data = b''.join(self._blocks[i] for i in range(first, last + 1))
+            offset = self.position - first * self.block_size
+            self.position += n
+            return data[offset:offset + n]
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self.position = offset
+        elif whence == os.SEEK_CUR:
+            self.position += offset
+        elif whence == os.SEEK_END:
+            self.position = self.size + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def close(self):
+        self._blocks.clear()
+        self.closed = True
+
+
+class _Variable:
+    """
+    h5netcdf variable decoded like netCDF4: _FillValue, missing_value and
+    valid_range/valid_min/valid_max masked (compared as unsigned when
+    _Unsigned is set), then scale/offset applied
+    """
+
+    def __init__(self, var):
+        self._var = var
+
+    def __getattr__(self, name):
+        if name == '_var':
+            raise AttributeError(name)
+        return getattr(self._var, name)
+
+    def ncattrs(self):
+        return list(self._var.attrs)
+
+    def getncattr(self, name):
+        return self._var.attrs[name]
+
+    def __getitem__(self, index):
+        attrs = self._var.attrs
+        data = np.asarray(self._var[()] if self._var.ndim == 0 else self._var[index])
+
+        unsigned = str(attrs.get('_Unsigned', '')).lower() == 'true' and data.dtype.kind == 'i'
+        if unsigned:
+            data = data.view(data.dtype.str.replace('i', 'u'))
+
+        def raw(name):
+            """Attribute in the stored type, viewed as unsigned like the data"""
+            if name not in attrs:
+                return None
+            value = np.atleast_1d(np.asarray(attrs[name]).astype(self._var.dtype))
+            return value.view(data.dtype) if unsigned else value.astype(data.dtype)
+
+        mask = np.zeros(data.shape, dtype=bool)
+        fill = raw('_FillValue')
+        if fill is not None:
+            mask |= data == fill[0]
+        missing = raw('missing_value')
+        if missing is not None:
+            mask |= np.isin(data, missing)
+        # valid_range takes precedence over valid_min/valid_max, as in netCDF4
+        valid_range = raw('valid_range')
+        valid_min = valid_range[0] if valid_range is not None else raw('valid_min')
+        valid_max = valid_range[1] if valid_range is not None else raw('valid_max')
+        if valid_min is not None:
+            mask |= data < np.min(valid_min)
+        if valid_max is not None:
+            mask |= data > np.max(valid_max)
+
+        if 'scale_factor' in attrs or 'add_offset' in attrs:
+            data = data * attrs.get('scale_factor', 1) + attrs.get('add_offset', 0)
+        return np.ma.masked_array(data, mask=mask)
+
+    def __len__(self):
+        return len(self._var)
+
+
+class _Group:
+    def __init__(self, group):
+        self._group = group
+
+    def __getattr__(self, name):
+        if name == '_group':
+            raise AttributeError(name)
+        return getattr(self._group, name)
+
+    @property
+    def variables(self):
+        return {name: _Variable(var) for name, var in self._group.variables.items()}
+
+    @property
+    def groups(self):
+        return {name: _Group(group) for name, group in self._group.groups.items()}
+
+    def ncattrs(self):
+        return list(self._group.attrs)
+
+    def getncattr(self, name):
+        return self._group.attrs[name]
+
+
+class RemoteDataset(_Group):
+    """Read-only netCDF4-style dataset over a RangeReader"""
+
+    def __init__(self, reader, stats=None):
+        import h5netcdf.legacyapi
+        self.reader = reader
+        self.stats = stats
+        super().__init__(h5netcdf.legacyapi.Dataset(reader, 'r'))
+
+    def close(self):
+        self._group.close()
+        self.reader.close()
+        name = self.reader.url.split('?')[0].rsplit('/', 1)[-1]
+        share = self.reader.bytes_transferred / self.reader.size if self.reader.size else 0
+        print(f"✓ Ranged read of {name}: {self.reader.bytes_transferred / 1024 ** 2:.1f} MB of "
+              f"{self.reader.size / 1024 ** 2:.1f} MB transferred ({share:.0%}, {self.reader.requests} requests)")
+        if self.stats is not None:
+            self.stats['granules'] = self.stats.get('granules', 0) + 1
+            self.stats['bytes_transferred'] = self.stats.get('bytes_transferred', 0) + self.reader.bytes_transferred
+            self.stats['file_bytes'] = self.stats.get('file_bytes', 0) + self.reader.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_granule(location, session=None, headers=None, granule_id=None, stats=None):
+    """
+    netCDF4-style dataset for a local path, or for an http(s) URL read in
+    place through byte ranges. Falls back to a cached full download when
+    the server ignores Range. `stats` accumulates transfer totals.
+    """
+    import netCDF4 as nc
+
+    location = str(location)
+    if not location.startswith(('http://', 'https://')):
+        return nc.Dataset(location, 'r')
+
+    try:
+        return RemoteDataset(RangeReader(location, session=session, headers=headers), stats)
+    except RangeNotSupported as e:
+        from granule_cache import shared_granule_cache
+        print(f"⚠ {e}; downloading the whole granule")
+        path = shared_granule_cache().fetch(granule_id or location, location, session=session, headers=headers)
+        return nc.Dataset(str(path), 'r')
+
+
+def transfer_summary(stats):
+    """Bytes transferred against total granule size for a run's stats dict"""
+    if not stats:
+        return None
+    file_bytes = stats.get('file_bytes', 0)
+    return {
+        'granules': stats.get('granules', 0),
+        'transferred_mb': round(stats.get('bytes_transferred', 0) / 1024 ** 2, 1),
+        'file_mb': round(file_bytes / 1024 ** 2, 1),
+        'fraction': round(stats.get('bytes_transferred', 0) / file_bytes, 4) if file_bytes else None
+    }
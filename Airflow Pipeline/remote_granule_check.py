@@ -0,0 +1,192 @@
+"""
+Local check of remote (byte-range) granule reads
+
+Writes a fixture granule, serves it from a local HTTP server that honours
+Range requests (a stand-in for the S3 bucket, addressed path-style as with
+GOES_S3_ENDPOINT) and checks that:
+
+- open_granule over HTTP decodes every variable like netCDF4 does on the
+  local file (fill, missing_value, valid_range, _Unsigned, scale/offset)
+- extract_goes_columns returns the same frame in remote and download mode
+- RangeReader counts exactly the bytes the server sent, and the stats
+  passed to open_granule add up per granule
+- a server that ignores Range raises RangeNotSupported
+
+    python remote_granule_check.py
+"""
+
+import re
+import sys
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from goes_extract import extract_goes_columns
+from remote_granule import RangeNotSupported, RangeReader, open_granule, s3_object_url
+
+
+def write_goes_granule(path, shape=(1500, 2500), seed=42):
+    """
+    NetCDF file shaped like a CONUS ABI CMIP granule: CMI stored as scaled
+    unsigned counts with a valid_range (some counts fall outside it) and a
+    DQF flag variable with _Unsigned, valid_range and missing_value
+    """
+    import netCDF4 as nc
+
+    rng = np.random.default_rng(seed)
+    n_rows, n_cols = shape
+    yy, xx = np.mgrid[0:n_rows, 0:n_cols]
+    # Off-disk corners hold the fill value, as in the real imagery
+    off_disk = ((yy / n_rows - 0.5) ** 2 + (xx / n_cols - 0.5) ** 2) > 0.3
+    counts = rng.integers(0, 4200, shape).astype(np.int16)
+    counts[off_disk] = -1
+    flags = rng.integers(0, 6, shape).astype(np.int8)
+    flags[off_disk] = -1
+
+    with nc.Dataset(path, 'w') as ds:
+        ds.createDimension('y', n_rows)
+        ds.createDimension('x', n_cols)
+        ds.createDimension('band', 1)
+        cmi = ds.createVariable('CMI', 'i2', ('y', 'x'), fill_value=-1, zlib=True, chunksizes=(250, 250))
+        cmi.setncatts({'_Unsigned': 'true', 'scale_factor': np.float32(0.0002442),
+                       'add_offset': np.float32(0.0), 'valid_range': np.array([0, 4095], dtype=np.int16),
+                       'long_name': 'ABI Cloud and Moisture Imagery reflectance factor', 'units': '1'})
+        cmi.set_auto_maskandscale(False)
+        cmi[:] = counts
+        dqf = ds.createVariable('DQF', 'i1', ('y', 'x'), fill_value=-1, zlib=True, chunksizes=(250, 250))
+        dqf.setncatts({'_Unsigned': 'true', 'valid_range': np.array([0, 4], dtype=np.int8),
+                       'missing_value': np.int8(4), 'long_name': 'ABI L2+ CMI data quality flags'})
+        dqf.set_auto_maskandscale(False)
+        dqf[:] = flags
+        ds.createVariable('x', 'f8', ('x',))[:] = np.linspace(-0.1, 0.1, n_cols)
+        ds.createVariable('y', 'f8', ('y',))[:] = np.linspace(0.13, 0.04, n_rows)
+        ds.createVariable('t', 'f8')[...] = 6.0e8
+        ds.createVariable('band_id', 'i1', ('band',))[:] = [2]
+        ds.createVariable('band_wavelength', 'f4', ('band',))[:] = [0.64]
+    return path
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file server answering `Range: bytes=a-b` with 206 and counting bytes sent"""
+
+    honour_range = True
+    bytes_sent = 0
+
+    def do_GET(self):
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return
+        size = path.stat().st_size
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        start, end = 0, size - 1
+        if match and self.honour_range:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or size - 1), size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        self.wfile.write(body)
+        type(self).bytes_sent += len(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory, honour_range=True):
+    """Start a local server for `directory`; returns (server, base URL, handler class)"""
+    handler = type('Handler', (RangeRequestHandler,), {'honour_range': honour_range, 'bytes_sent': 0})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}', handler
+
+
+def compare_variables(local_path, url):
+    """Names of variables whose remote decoding differs from netCDF4 on the local file"""
+    mismatched = []
+    with open_granule(local_path) as local, open_granule(url) as remote:
+        remote_vars = remote.variables
+        for name, var in local.variables.items():
+            expected, actual = var[:], remote_vars[name][:]
+            same_mask = np.array_equal(np.ma.getmaskarray(expected), np.ma.getmaskarray(actual))
+            same_values = np.allclose(np.ma.filled(np.ma.asarray(expected, dtype=float), np.nan),
+                                      np.ma.filled(np.ma.asarray(actual, dtype=float), np.nan),
+                                      rtol=1e-6, equal_nan=True)
+            if not (same_mask and same_values):
+                mismatched.append(name)
+    return mismatched
+
+
+def run_checks(shape=(600, 1000)):
+    results = []
+
+    def check(label, ok, detail=''):
+        results.append(ok)
+        print(f"  {'✓' if ok else '✗'} {label}{f' ({detail})' if detail else ''}")
+
+    with tempfile.TemporaryDirectory(prefix='remote_granule_check_') as tmp:
+        bucket, key = 'noaa-goes16', 'ABI-L2-CMIPC/2025/001/00/OR_ABI-L2-CMIPC-M6C02_G16_fixture.nc'
+        local_path = Path(tmp) / bucket / key
+        local_path.parent.mkdir(parents=True)
+        write_goes_granule(local_path, shape=shape)
+        file_size = local_path.stat().st_size
+
+        server, base_url, handler = serve(tmp)
+        try:
+            url = s3_object_url(bucket, key, endpoint=base_url)
+            print(f"Serving {local_path.name} ({file_size / 1024:.0f} KB) at {url}")
+
+            mismatched = compare_variables(local_path, url)
+            check("remote decoding matches netCDF4", not mismatched, ', '.join(mismatched))
+
+            local = extract_goes_columns(str(local_path), sample_points=5000)
+            remote = extract_goes_columns(url, sample_points=5000)
+            same = (local is not None and remote is not None)
+            if same:
+                try:
+                    pd.testing.assert_frame_equal(local['frame'], remote['frame'], check_exact=False, rtol=1e-6)
+                except AssertionError:
+                    same = False
+            check("extract_goes_columns frame identical in both modes", same)
+
+            handler.bytes_sent = 0
+            stats = {}
+            with open_granule(url, stats=stats) as ds:
+                ds.variables['x'][:]
+                reader = ds.reader
+            check("RangeReader bytes match server bytes", reader.bytes_transferred == handler.bytes_sent,
+                  f"{reader.bytes_transferred} vs {handler.bytes_sent}")
+            check("partial read transfers less than the file", 0 < reader.bytes_transferred < file_size,
+                  f"{reader.bytes_transferred} of {file_size} bytes")
+            check("stats totals per granule",
+                  stats.get('granules') == 1 and stats.get('bytes_transferred') == reader.bytes_transferred
+                  and stats.get('file_bytes') == file_size)
+        finally:
+            server.shutdown()
+
+        server, base_url, _ = serve(tmp, honour_range=False)
+        try:
+            RangeReader(s3_object_url(bucket, key, endpoint=base_url))
+            check("server ignoring Range raises RangeNotSupported", False)
+        except RangeNotSupported:
+            check("server ignoring Range raises RangeNotSupported", True)
+        finally:
+            server.shutdown()
+
+    print(f"\n{'✓' if all(results) else '✗'} {sum(results)}/{len(results)} remote granule checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
@@ -0,0 +1,274 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections import OrderedDict
+
+
+# Cube variable -> feature column added to the station frame
+FEATURE_COLUMNS = {
+    'no2': 'sat_no2_column',
+    'hcho': 'sat_hcho_column',
+    'o3': 'sat_o3_aqi'
+}
+
+# fetch_satellite_data frame -> (cube variable, value column)
+SOURCE_COLUMNS = {
+    'no2': 'no2_tropospheric_column',
+    'hcho': 'hcho_total_column',
+    'o3': 'o3_aqi'
+}
+
+DEFAULT_CUBE_DIR = os.getenv('SATELLITE_CUBE_DIR', './data_downloads/satellite_cube')
+
+
+def _utc_naive(times):
+    """Timestamps as naive UTC (tz-aware inputs are converted first)"""
+    times = pd.to_datetime(pd.Series(times), errors='coerce', utc=True)
+    return pd.DatetimeIndex(times.dt.tz_localize(None))
+
+
+class SatelliteFeatureCube:
+    """
+    Regular lat/lon/hour grid of satellite columns stored as one
+    memory-mapped .npy file per variable and UTC day, shaped
+    (24, n_lat, n_lon) float32 with NaN for empty cells. A sibling
+    `.count.npy` file holds the number of points behind each cell mean.
+
+    Ingestion folds each batch into the running cell means; feature lookups are plain index
+    arithmetic into the mapped arrays, so sampling a station-hour costs
+    the same regardless of how many satellite pixels were ingested.
+    """
+
+    def __init__(self, root_dir=DEFAULT_CUBE_DIR, resolution=0.25,
+                 lat_range=(15.0, 75.0), lon_range=(-170.0, -50.0), max_open_files=16):
+        self.root_dir = Path(root_dir)
+        self.resolution = float(resolution)
+        self.lat_min, self.lat_max = lat_range
+        self.lon_min, self.lon_max = lon_range
+        self.n_lat = int(round((self.lat_max - self.lat_min) / self.resolution))
+        self.n_lon = int(round((self.lon_max - self.lon_min) / self.resolution))
+        self.max_open_files = max_open_files
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self._check_grid()
+
+    @property
+    def shape(self):
+        return (24, self.n_lat, self.n_lon)
+
+    def _grid_spec(self):
+        return {
+            'resolution': self.resolution,
+            'lat_range': [self.lat_min, self.lat_max],
+            'lon_range': [self.lon_min, self.lon_max]
+        }
+
+    def _check_grid(self):
+        """Refuse to mix files written with a different grid definition"""
+        spec_file = self.root_dir / 'grid.json'
+        if spec_file.exists():
+            with open(spec_file) as f:
+                stored = json.load(f)
+            if stored != self._grid_spec():
+                raise ValueError(f"Satellite cube at {self.root_dir} uses grid {stored}, not {self._grid_spec()}")
+        else:
+            self.root_dir.mkdir(parents=True, exist_ok=True)
+            with open(spec_file, 'w') as f:
+                json.dump(self._grid_spec(), f)
+
+    def cell_index(self, lats, lons):
+        """Row/column of the grid cell for each point, plus an inside-grid mask"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        rows = np.floor((lats - self.lat_min) / self.resolution)
+        cols = np.floor((lons - self.lon_min) / self.resolution)
+        inside = (rows >= 0) & (rows < self.n_lat) & (cols >= 0) & (cols < self.n_lon)
+        rows = np.where(inside, rows, 0).astype(np.int64)
+        cols = np.where(inside, cols, 0).astype(np.int64)
+        return rows, cols, inside
+
+    def _day_path(self, variable, day, kind=''):
+        return self.root_dir / variable / f"{pd.Timestamp(day).strftime('%Y%m%d')}{kind}.npy"
+
+    def _open_day(self, variable, day, create=False, kind=''):
+        """Memory-map one day file (read-write), creating it on demand"""
+        key = (variable, day, kind)
+        with self._lock:
+            mm = self._open.get(key)
+            if mm is not None:
+                self._open.move_to_end(key)
+                return mm
+
+            path = self._day_path(variable, day, kind)
+            if not path.exists():
+                if not create:
+                    return None
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Build under a temporary name so readers never see a partial file
+                tmp_path = path.with_suffix('.tmp.npy')
+                mm = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=self.shape)
+                mm[:] = 0 if kind else np.nan
+                mm.flush()
+                del mm
+                os.replace(tmp_path, path)
+
+            mm = np.load(path, mmap_mode='r+' if create else 'r')
+            self._open[key] = mm
+            while len(self._open) > self.max_open_files:
+                self._open.popitem(last=False)
+            return mm
+
+    def add_points(self, variable, times, lats, lons, values):
+        """
+        Grid a batch of point observations. Each touched cell-hour becomes the
+        mean of all points ingested into it so far, so overlapping batches
+        merge (re-ingesting the same batch double-weights it).
+        Returns the number of cell-hours written.
+        """
+        values = np.asarray(values, dtype=float)
+        times = _utc_naive(times)
+        rows, cols, inside = self.cell_index(lats, lons)
+        valid = inside & np.isfinite(values) & ~times.isna()
+        if not valid.any():
+            return 0
+
+        times = times[valid]
+        rows, cols, values = rows[valid], cols[valid], values[valid]
+        days = times.normalize()
+        flat = (times.hour.to_numpy() * self.n_lat + rows) * self.n_lon + cols
+
+        written = 0
+        for day in days.unique():
+            in_day = (days == day)
+            cells, inverse = np.unique(flat[in_day], return_inverse=True)
+            sums = np.bincount(inverse, weights=values[in_day])
+            counts = np.bincount(inverse)
+
+            mm = self._writable_day(variable, day)
+            mm_count = self._writable_day(variable, day, kind='.count')
+            means, totals = mm.reshape(-1), mm_count.reshape(-1)
+            old_mean = means[cells].astype(float)
+            # Cells written before count files existed carry a weight of one
+            old_count = np.where(np.isfinite(old_mean), np.maximum(totals[cells], 1), 0)
+            new_count = old_count + counts
+            means[cells] = ((np.nan_to_num(old_mean) * old_count + sums) / new_count).astype(np.float32)
+            totals[cells] = new_count
+            mm.flush()
+            mm_count.flush()
+            written += len(cells)
+        return written
+
+    def _writable_day(self, variable, day, kind=''):
+        mm = self._open_day(variable, day, create=True, kind=kind)
+        if mm.mode != 'r+':
+            # File was first opened read-only by a lookup
+            with self._lock:
+                self._open.pop((variable, day, kind), None)
+            mm = self._open_day(variable, day, create=True, kind=kind)
+        return mm
+
+    def add_frame(self, variable, df, value_col, time_col='datetime',
+                  lat_col='latitude', lon_col='longitude'):
+        """Grid a DataFrame of point observations"""
+        if df is None or df.empty or value_col not in df.columns:
+            return 0
+        return self.add_points(
+            variable, df[time_col], df[lat_col].to_numpy(), df[lon_col].to_numpy(),
+            pd.to_numeric(df[value_col], errors='coerce').to_numpy()
+        )
+
+    def ingest(self, sat_data):
+        """Grid the frames returned by AirQualityForecaster.fetch_satellite_data"""
+        written = {}
+        for name, df in (sat_data or {}).items():
+            if name in SOURCE_COLUMNS:
+                written[name] = self.add_frame(name, df, SOURCE_COLUMNS[name])
+        return written
+
+    def lookup(self, variable, times, lats, lons, max_age_hours=0):
+        """
+        Cell values for each (time, lat, lon). When the exact hour is empty,
+        the most recent of the previous `max_age_hours` hours is used.
+        """
+        times = _utc_naive(times)
+        rows, cols, inside = self.cell_index(lats, lons)
+        result = np.full(len(rows), np.nan)
+        cell = rows * self.n_lon + cols
+        base = times.floor('h')
+
+        for age in range(max_age_hours + 1):
+            pending = np.isnan(result) & inside & ~base.isna()
+            if not pending.any():
+                break
+            when = base[pending] - pd.Timedelta(hours=age)
+            days = when.normalize()
+            flat = when.hour.to_numpy() * (self.n_lat * self.n_lon) + cell[pending]
+            idx = np.flatnonzero(pending)
+
+            for day in days.unique():
+                mm = self._open_day(variable, day)
+                if mm is None:
+                    continue
+                in_day = (days == day)
+                result[idx[in_day]] = mm.reshape(-1)[flat[in_day]]
+        return result
+
+    def _hour_keys(self, times, rows, cols):
+        """One integer per (hour, cell), comparable across days"""
+        hours = ((times - pd.Timestamp(0)) // pd.Timedelta(hours=1)).to_numpy(dtype=np.int64)
+        return (hours * self.n_lat + rows) * self.n_lon + cols
+
+    def lookup_frame(self, df, value_col, times, lats, lons, max_age_hours=0,
+                     time_col='datetime', lat_col='latitude', lon_col='longitude'):
+        """
+        Like lookup, but against cell means of a point DataFrame computed in
+        memory; nothing is written to the cube.
+        """
+        values = pd.to_numeric(df[value_col], errors='coerce').to_numpy(dtype=float)
+        point_times = _utc_naive(df[time_col]).floor('h')
+        rows, cols, inside = self.cell_index(df[lat_col].to_numpy(), df[lon_col].to_numpy())
+        valid = inside & np.isfinite(values) & ~point_times.isna()
+        cells = pd.Series(values[valid]).groupby(
+            self._hour_keys(point_times[valid], rows[valid], cols[valid])
+        ).mean()
+
+        base = _utc_naive(times).floor('h')
+        rows, cols, inside = self.cell_index(lats, lons)
+        result = np.full(len(rows), np.nan)
+        for age in range(max_age_hours + 1):
+            pending = np.isnan(result) & inside & ~base.isna()
+            if not pending.any() or cells.empty:
+                break
+            keys = self._hour_keys(base[pending] - pd.Timedelta(hours=age), rows[pending], cols[pending])
+            result[pending] = cells.reindex(keys).to_numpy()
+        return result
+
+    def sample_frame(self, df, time_col='datetime_utc', lat_col='latitude',
+                     lon_col='longitude', max_age_hours=3, fallback=None):
+        """
+        Add one satellite feature column per cube variable to a station frame.
+        Station-hours the cube has no value for are filled from `fallback`
+        (fetch_satellite_data frames) without writing those rows to the cube.
+        """
+        lats, lons = df[lat_col].to_numpy(), df[lon_col].to_numpy()
+        for variable, column in FEATURE_COLUMNS.items():
+            values = self.lookup(variable, df[time_col], lats, lons, max_age_hours=max_age_hours)
+            rows = (fallback or {}).get(variable)
+            missing = np.isnan(values)
+            if missing.any() and rows is not None and not rows.empty and SOURCE_COLUMNS[variable] in rows.columns:
+                values[missing] = self.lookup_frame(
+                    rows, SOURCE_COLUMNS[variable], df[time_col][missing],
+                    lats[missing], lons[missing], max_age_hours=max_age_hours
+                )
+            df[column] = values
+        return df
+
+    def sample_point(self, time, lat, lon, max_age_hours=3):
+        """Satellite features for a single location and hour"""
+        return {
+            column: float(self.lookup(variable, [time], [lat], [lon], max_age_hours)[0])
+            for variable, column in FEATURE_COLUMNS.items()
+        }
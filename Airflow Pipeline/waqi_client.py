@@ -0,0 +1,184 @@
+"""
+Async crawl engine for the WAQI (aqicn.org) API
+
+One aiohttp session per crawl keeps connections alive and pooled and a
+per-host limit caps concurrent sockets. Throttled (429), 5xx and timed-out
+requests are retried with jittered exponential backoff (honouring
+Retry-After); other 4xx responses and undecodable bodies fail only that
+request. Bodies are decoded incrementally from the socket when ijson is
+installed.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import aiohttp
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+WAQI_BASE_URL = "https://api.waqi.info"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AsyncWAQIClient:
+    """Pooled, rate-limited WAQI client; use as an async context manager"""
+
+    def __init__(self, token, per_host_limit=16, max_retries=4, backoff_base=0.5,
+                 backoff_cap=10.0, timeout=20):
+        self.token = token
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.per_host_limit,
+            limit_per_host=self.per_host_limit,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, at least Retry-After when given"""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def _decode(self, response):
+        """Decoded JSON body; malformed bodies (e.g. an HTML error page) raise ValueError"""
+        if ijson is not None:
+            try:
+                async for document in ijson.items_async(response.content, '', use_float=True):
+                    return document
+            except ijson.JSONError as e:
+                raise ValueError(f"invalid JSON body: {e}") from e
+            return None
+        return json.loads(await response.read())
+
+    async def get_json(self, path, params=None):
+        """GET a WAQI endpoint; returns the decoded document or None after retries"""
+        url = f"{WAQI_BASE_URL}/{path.lstrip('/')}"
+        params = dict(params or {}, token=self.token)
+
+        for attempt in range(self.max_retries + 1):
+            self.stats['requests'] += 1
+            try:
+                async with self.session.get(url, params=params) as response:
+                    if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                        self.stats['retries'] += 1
+                        await asyncio.sleep(self._backoff(attempt, response.headers.get('Retry-After')))
+                        continue
+                    if response.status >= 400:
+                        # Client errors (401, 404, ...) will not succeed on retry
+                        self.stats['failures'] += 1
+                        print(f"⚠ WAQI request failed with HTTP {response.status} ({path})")
+                        return None
+                    try:
+                        return await self._decode(response)
+                    except ValueError as e:
+                        # A 200 with a non-JSON body is a per-request failure, not worth retrying
+                        self.stats['failures'] += 1
+                        print(f"⚠ WAQI response could not be decoded ({path}): {e}")
+                        return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    self.stats['failures'] += 1
+                    print(f"⚠ WAQI request failed after {attempt + 1} attempts ({path}): {e}")
+                    return None
+                self.stats['retries'] += 1
+                await asyncio.sleep(self._backoff(attempt))
+        self.stats['failures'] += 1
+        return None
+
+    async def get_data(self, path, params=None):
+        """The 'data' member of an ok response, else None"""
+        document = await self.get_json(path, params)
+        if isinstance(document, dict) and document.get('status') == 'ok':
+            return document.get('data')
+        return None
+
+    async def stations_in_bounds(self, lat1, lng1, lat2, lng2):
+        data = await self.get_data('v2/map/bounds', {'latlng': f"{lat1},{lng1},{lat2},{lng2}"})
+        return data or []
+
+    async def station_feed(self, uid):
+        return await self.get_data(f'feed/@{uid}/')
+
+    async def feeds(self, paths):
+        """Fetch many feed paths concurrently; returns {path: data or None}"""
+        results = await asyncio.gather(*(self.get_data(path) for path in paths))
+        return dict(zip(paths, results))
+
+
+def run_sync(coro):
+    """Run a coroutine from synchronous code, even if a loop is already running"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    result = {}
+
+    def runner():
+        try:
+            result['value'] = asyncio.run(coro)
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+def crawl_stations(token, regions, per_host_limit=16):
+    """
+    Unique stations from the map-bounds endpoint for each region, given as
+    (lat1, lng1, lat2, lng2) tuples. Returns {uid: station}.
+    """
+    async def crawl():
+        async with AsyncWAQIClient(token, per_host_limit=per_host_limit) as client:
+            results = await asyncio.gather(*(client.stations_in_bounds(*bounds) for bounds in regions))
+        stations = {}
+        for region_stations in results:
+            for station in region_stations:
+                uid = station.get('uid')
+                if uid and uid not in stations:
+                    stations[uid] = station
+        return stations
+
+    return run_sync(crawl())
+
+
+def fetch_station_feeds(token, uids, per_host_limit=16):
+    """
+    Fetch /feed/@uid for every station over one pooled session.
+    Returns ({uid: feed data or None}, client stats).
+    """
+    async def crawl():
+        async with AsyncWAQIClient(token, per_host_limit=per_host_limit) as client:
+            feeds = await asyncio.gather(*(client.station_feed(uid) for uid in uids))
+            return dict(zip(uids, feeds)), client.stats
+
+    return run_sync(crawl())
@@ -0,0 +1,266 @@
+"""
+Unified WAQI collection cycle
+
+Every WAQI fetcher in api_requests.py (SO2, CO, PM2.5, O3, vehicle
+emissions, NOx) reads the same /feed/@uid documents. The collector crawls
+the North American bounds once, downloads each station feed once, and
+keeps the result for a short TTL so the per-pollutant functions fan the
+shared `iaqi` payloads out to their own record formats.
+
+The cheap map-bounds response already carries each station's latest
+observation time and AQI. Those are remembered between runs, and only
+stations whose reading changed get their detailed feed downloaded; the
+rest are served from the persisted feed cache.
+"""
+
+import os
+import json
+import asyncio
+import math
+import time
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from waqi_client import AsyncWAQIClient, run_sync
+
+
+DEFAULT_TOKEN = os.getenv('WAQI_TOKEN', '6ce9559b847280301baf94a0e946e403de1e6f75')
+DEFAULT_STATE_DIR = os.getenv('WAQI_STATE_DIR', './data_downloads/waqi_state')
+DEFAULT_TTL_SECONDS = int(os.getenv('WAQI_CYCLE_TTL', 600))
+
+# Union of the boxes the individual fetchers used, as (lat1, lng1, lat2, lng2)
+NORTH_AMERICA_REGIONS = [
+    (40, -170, 70, -50),   # Northern USA & Canada
+    (25, -125, 45, -65),   # Southern USA
+    (10, -120, 30, -80),   # Mexico & Central America
+    (50, -180, 72, -130),  # Alaska
+    (25, -125, 49, -65),   # Continental USA
+    (42, -141, 72, -52),   # Canada
+    (14, -118, 33, -86),   # Mexico
+    (7, -93, 18, -77),     # Central America
+]
+
+
+class WAQICollector:
+    """One crawl of WAQI stations and feeds per cycle, shared by every pollutant"""
+
+    def __init__(self, token=DEFAULT_TOKEN, regions=NORTH_AMERICA_REGIONS, per_host_limit=16,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, state_dir=DEFAULT_STATE_DIR, skip_unchanged=True):
+        self.token = token
+        self.regions = regions
+        self.per_host_limit = per_host_limit
+        self.ttl_seconds = ttl_seconds
+        self.skip_unchanged = skip_unchanged
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+
+        self.stations = {}
+        self.feeds = {}
+        self.extra_feeds = {}
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'unchanged': 0}
+        self.collected_at = None
+        self._lock = threading.Lock()
+
+    def is_fresh(self):
+        return self.collected_at is not None and time.monotonic() - self.collected_at < self.ttl_seconds
+
+    def cycle(self, force=False):
+        """Crawl stations and feeds unless the last cycle is still within its TTL"""
+        with self._lock:
+            if force or not self.is_fresh():
+                self._collect()
+        return self
+
+    @staticmethod
+    def signature(station):
+        """Observation time and AQI from a map-bounds entry; changes when the reading does"""
+        return [station.get('station', {}).get('time'), station.get('aqi')]
+
+    def _load_state(self):
+        """({uid: signature}, {uid: feed}) from the previous run"""
+        path = self.state_dir / 'feed_cache.json'
+        if not self.skip_unchanged or not path.exists():
+            return {}, {}
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Ignoring unreadable WAQI feed cache: {e}")
+            return {}, {}
+        # JSON object keys are strings; uids from the API are ints
+        return ({int(uid): sig for uid, sig in state.get('signatures', {}).items()},
+                {int(uid): feed for uid, feed in state.get('feeds', {}).items()})
+
+    def _save_state(self, signatures, feeds):
+        path = self.state_dir / 'feed_cache.json'
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'signatures': signatures, 'feeds': feeds}, f)
+        os.replace(tmp_path, path)
+
+    async def _crawl(self, changed_since):
+        async with AsyncWAQIClient(self.token, per_host_limit=self.per_host_limit) as client:
+            stations = {}
+            for region_stations in await asyncio.gather(
+                    *(client.stations_in_bounds(*bounds) for bounds in self.regions)):
+                for station in region_stations:
+                    uid = station.get('uid')
+                    if uid and uid not in stations:
+                        stations[uid] = station
+
+            uids = [uid for uid, station in stations.items()
+                    if changed_since.get(uid) != self.signature(station)]
+            feeds = dict(zip(uids, await asyncio.gather(*(client.station_feed(uid) for uid in uids))))
+            return stations, feeds, dict(client.stats)
+
+    def _collect(self):
+        print(f"\nWAQI collection cycle: crawling {len(self.regions)} regions...")
+        start = time.perf_counter()
+        signatures, cached_feeds = self._load_state()
+        # A station without a cached feed has to be fetched whatever its signature
+        changed_since = {uid: sig for uid, sig in signatures.items() if cached_feeds.get(uid)}
+
+        self.stations, fetched, stats = run_sync(self._crawl(changed_since))
+
+        self.feeds = {}
+        new_signatures = {}
+        for uid, station in self.stations.items():
+            if uid in fetched:
+                self.feeds[uid] = fetched[uid]
+                if fetched[uid]:
+                    new_signatures[uid] = self.signature(station)
+            else:
+                self.feeds[uid] = cached_feeds[uid]
+                new_signatures[uid] = changed_since[uid]
+
+        # An empty crawl (bounds calls failed) must not wipe the cache
+        if self.skip_unchanged and self.stations:
+            self._save_state(new_signatures, {uid: feed for uid, feed in self.feeds.items()
+                                              if uid in new_signatures})
+
+        stats['unchanged'] = len(self.stations) - len(fetched)
+        self.extra_feeds = {}
+        self._add_stats(stats)
+        self.collected_at = time.monotonic()
+        print(f"✓ {len(self.stations)} stations, {len(fetched)} changed feeds fetched, "
+              f"{stats['unchanged']} unchanged in {time.perf_counter() - start:.1f}s "
+              f"({stats['requests']} requests, {stats['retries']} retries, {stats['failures']} failures)")
+
+    def _add_stats(self, stats):
+        for key in self.stats:
+            self.stats[key] += stats.get(key, 0)
+
+    def stations_in(self, regions):
+        """Crawled stations inside any of the (lat1, lng1, lat2, lng2) boxes"""
+        selected = {}
+        for uid, station in self.stations.items():
+            lat, lon = station.get('lat'), station.get('lon')
+            if lat is None or lon is None:
+                continue
+            for lat1, lng1, lat2, lng2 in regions:
+                if min(lat1, lat2) <= lat <= max(lat1, lat2) and min(lng1, lng2) <= lon <= max(lng1, lng2):
+                    selected[uid] = station
+                    break
+        return selected
+
+    def fetch_paths(self, paths):
+        """Feeds outside the crawl (city names, geo points), fetched once per cycle"""
+        missing = [path for path in dict.fromkeys(paths) if path not in self.extra_feeds]
+        if missing:
+            async def fetch():
+                async with AsyncWAQIClient(self.token, per_host_limit=self.per_host_limit) as client:
+                    return await client.feeds(missing), dict(client.stats)
+
+            feeds, stats = run_sync(fetch())
+            self.extra_feeds.update(feeds)
+            self._add_stats(stats)
+        return {path: self.extra_feeds.get(path) for path in paths}
+
+    def nearest_station(self, lat, lon, pollutant, max_distance_deg=0.5):
+        """uid of the closest crawled station reporting `pollutant`, or None"""
+        best_uid, best_distance = None, max_distance_deg
+        cos_lat = math.cos(math.radians(lat))
+        for uid, station in self.stations.items():
+            feed = self.feeds.get(uid)
+            if not feed or pollutant not in feed.get('iaqi', {}):
+                continue
+            distance = math.hypot(station['lat'] - lat, (station['lon'] - lon) * cos_lat)
+            if distance <= best_distance:
+                best_uid, best_distance = uid, distance
+        return best_uid
+
+    def point_feeds(self, points, pollutant, max_distance_deg=0.5):
+        """
+        {name: feed} for (name, lat, lon) points: the nearest crawled station
+        with the pollutant, else WAQI's own geo lookup
+        """
+        result, fallback = {}, {}
+        for name, lat, lon in points:
+            uid = self.nearest_station(lat, lon, pollutant, max_distance_deg)
+            if uid is not None:
+                result[name] = self.feeds[uid]
+            else:
+                fallback[name] = f"feed/geo:{lat};{lon}/"
+
+        fetched = self.fetch_paths(list(fallback.values()))
+        for name, path in fallback.items():
+            result[name] = fetched.get(path)
+        return result
+
+    def city_feeds(self, cities):
+        """
+        {city: feed} for WAQI city names. Cities resolve to station uids
+        through a persisted map, so once known they come from the crawl.
+        """
+        map_path = self.state_dir / 'city_uids.json'
+        city_uids = {}
+        if map_path.exists():
+            with open(map_path) as f:
+                city_uids = json.load(f)
+
+        result, unresolved = {}, []
+        for city in dict.fromkeys(cities):
+            feed = self.feeds.get(city_uids.get(city))
+            if feed:
+                result[city] = feed
+            else:
+                unresolved.append(city)
+
+        if unresolved:
+            fetched = self.fetch_paths([f"feed/{city}/" for city in unresolved])
+            for city in unresolved:
+                feed = fetched.get(f"feed/{city}/")
+                result[city] = feed
+                if feed and feed.get('idx') is not None:
+                    city_uids[city] = feed['idx']
+
+            tmp_path = map_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(city_uids, f, indent=2)
+            os.replace(tmp_path, map_path)
+
+        print(f"✓ {len(result) - len(unresolved)}/{len(result)} cities served from the station crawl")
+        return result
+
+    def summary(self):
+        return {
+            'stations': len(self.stations),
+            'feeds': sum(1 for f in self.feeds.values() if f),
+            'extra_feeds': len(self.extra_feeds),
+            **self.stats,
+            'timestamp': datetime.now().isoformat()
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_collector():
+    """The process-wide collector used by the api_requests WAQI functions"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = WAQICollector()
+        return _shared
@@ -0,0 +1,130 @@
+"""
+Per-source ingestion high-water marks
+
+Fetchers stage what they are about to hand over (granule ids, the newest
+observation time) and the ingestion cycle commits the stage only once the
+source's inserts have succeeded. The next run asks upstream only for data
+past the committed mark and skips granules that were already ingested.
+A granule that fails holds the mark at its start time, so the next run
+searches for it again even when newer granules succeeded.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+DEFAULT_WATERMARK_PATH = os.getenv('INGEST_WATERMARKS', './data_downloads/ingest_watermarks.json')
+
+# Granule ids remembered per source; older ids are already behind last_time
+MAX_GRANULE_IDS = 5000
+
+
+def _utc_naive(value):
+    """datetime or ISO string -> naive UTC datetime"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class WatermarkStore:
+    def __init__(self, path=DEFAULT_WATERMARK_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._staged = {}
+        self._marks = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self._marks = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠ Ignoring unreadable watermark file {self.path}: {e}")
+
+    def last_time(self, source):
+        """Newest committed observation/granule time for a source (naive UTC), or None"""
+        with self._lock:
+            return _utc_naive(self._marks.get(source, {}).get('last_time'))
+
+    def since(self, source, default_start):
+        """Start of the next query window: the watermark, or default_start on the first run"""
+        last = self.last_time(source)
+        return max(last, _utc_naive(default_start)) if last else _utc_naive(default_start)
+
+    def is_ingested(self, source, granule_id):
+        with self._lock:
+            return granule_id in self._marks.get(source, {}).get('granules', [])
+
+    def new_granules(self, source, granules, key=lambda g: g.get('title')):
+        """Drop granules whose id has already been committed"""
+        with self._lock:
+            done = set(self._marks.get(source, {}).get('granules', []))
+        return [g for g in granules if key(g) not in done]
+
+    def stage(self, source, granules=(), last_time=None):
+        """Record what this run fetched; takes effect on commit()"""
+        with self._lock:
+            staged = self._staged.setdefault(source, {'granules': [], 'last_time': None, 'hold': None})
+            staged['granules'].extend(g for g in granules if g)
+            last_time = _utc_naive(last_time)
+            if last_time and (staged['last_time'] is None or last_time > staged['last_time']):
+                staged['last_time'] = last_time
+
+    def hold(self, source, before):
+        """
+        Keep the next query window open back to `before`, e.g. the start of
+        a granule that failed this run, however far later granules advance
+        """
+        with self._lock:
+            staged = self._staged.setdefault(source, {'granules': [], 'last_time': None, 'hold': None})
+            before = _utc_naive(before)
+            if before and (staged['hold'] is None or before < staged['hold']):
+                staged['hold'] = before
+
+    def commit(self, source):
+        """Advance the persisted mark with whatever the source staged"""
+        with self._lock:
+            staged = self._staged.pop(source, None)
+            if not staged:
+                return
+            mark = self._marks.setdefault(source, {'granules': [], 'last_time': None})
+            known = set(mark['granules'])
+            mark['granules'].extend(g for g in staged['granules'] if g not in known)
+            mark['granules'] = mark['granules'][-MAX_GRANULE_IDS:]
+            last_time = staged['last_time']
+            if last_time and staged['hold'] and last_time > staged['hold']:
+                last_time = staged['hold']
+            current = _utc_naive(mark.get('last_time'))
+            if last_time and (current is None or last_time > current):
+                mark['last_time'] = last_time.isoformat()
+            mark['updated_at'] = datetime.utcnow().isoformat()
+            self._save()
+
+    def discard(self, source):
+        with self._lock:
+            self._staged.pop(source, None)
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._marks, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_watermarks():
+    """The process-wide store shared by the fetchers and the ingestion cycle"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = WatermarkStore()
+        return _shared